@@ -90,13 +90,12 @@ class StrategyAdmin(admin.ModelAdmin):
 
 @admin.register(MarketData)
 class MarketDataAdmin(admin.ModelAdmin):
-    list_display = ('symbol', 'close_price', 'volume', 'timestamp')
-    list_filter = ('symbol', 'timestamp')
+    list_display = ('symbol', 'interval', 'close_price', 'volume', 'timestamp')
+    list_filter = ('symbol', 'interval', 'timestamp')
     search_fields = ('symbol',)
-    readonly_fields = ('timestamp',)
     fieldsets = (
         ('Market Data', {
-            'fields': ('symbol', 'open_price', 'high_price', 'low_price', 'close_price', 'volume')
+            'fields': ('symbol', 'interval', 'open_price', 'high_price', 'low_price', 'close_price', 'volume')
         }),
         ('Timestamps', {
             'fields': ('timestamp',),
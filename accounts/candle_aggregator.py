@@ -0,0 +1,144 @@
+"""
+Tick-to-candle aggregator.
+
+Builds OHLCV bars in memory for every (instrument, timeframe) a running
+strategy uses, from the single 'tick' stream on the event bus. Bars are
+stamped like stored candles (market_hours.candle_timestamp): intraday bars
+at their session-aligned start, daily bars at midnight IST of their date.
+Ticks outside the session are ignored. When a bar closes, either because a
+tick for the next candle arrives or because close_due() passes its end, a
+'bar_closed' event is published:
+
+    {'instrument_key': ..., 'timeframe': '5m', 'timestamp': <candle start>,
+     'open': ..., 'high': ..., 'low': ..., 'close': ..., 'volume': ...}
+
+Closed bars are appended to the shared ring buffer of each (instrument,
+timeframe), sized for at least the longest lookback any strategy on it
+needs, so the analysis path sees them too. Volume is the sum of last
+traded quantities seen, so it is approximate when the feed samples trades.
+"""
+import threading
+
+from django.utils import timezone
+
+from .candle_store import history_buffer
+from .event_bus import bus as default_bus
+from .indicator_engine import INDICATOR_LOOKBACK
+from .market_hours import candle_timestamp, next_candle_close
+
+# Fewest closed bars kept per (instrument, timeframe)
+MIN_HISTORY = 20
+
+# Forming bar: [start, end, open, high, low, close, volume]
+START, END, OPEN, HIGH, LOW, CLOSE, VOLUME = range(7)
+
+
+class CandleAggregator:
+    def __init__(self, bus=None):
+        self.bus = bus or default_bus
+        self.timeframes = {}  # instrument_key -> tuple of tracked timeframes
+        self.forming = {}     # (instrument_key, timeframe) -> forming bar
+        self.history = {}     # (instrument_key, timeframe) -> CandleRingBuffer of closed bars
+        self.closed = {}      # (instrument_key, timeframe) -> start of the last bar closed here
+        self._lock = threading.Lock()
+        self._unsubscribe = None
+
+    def start(self):
+        """Start consuming ticks from the bus"""
+        if self._unsubscribe is None:
+            self._unsubscribe = self.bus.subscribe('tick', self.on_tick)
+
+    def stop(self):
+        if self._unsubscribe:
+            self._unsubscribe()
+            self._unsubscribe = None
+
+    def track(self, strategies):
+        """Build bars for the (symbol, timeframe) of each strategy and stop building any others"""
+        capacities = {}
+        for strategy in strategies:
+            key = (strategy.setup.symbol, strategy.setup.timeframe)
+            lookback = INDICATOR_LOOKBACK.get(strategy.setup.indicator, MIN_HISTORY)
+            capacities[key] = max(capacities.get(key, MIN_HISTORY), lookback)
+
+        # Buffers may be seeded from stored candles, so look them up before taking the lock
+        buffers = {key: history_buffer(key[0], key[1], capacity) for key, capacity in capacities.items()}
+        with self._lock:
+            self.history = buffers
+            for key in list(self.forming):
+                if key not in buffers:
+                    del self.forming[key]
+                    self.closed.pop(key, None)
+            timeframes = {}
+            for instrument, timeframe in capacities:
+                timeframes.setdefault(instrument, []).append(timeframe)
+            self.timeframes = {instrument: tuple(tfs) for instrument, tfs in timeframes.items()}
+
+    def on_tick(self, tick):
+        """Fold one tick into the forming bar of every tracked timeframe for its instrument"""
+        instrument = tick['instrument_key']
+        price = tick['ltp']
+        quantity = tick.get('ltq', 0)
+        closed = []
+        with self._lock:
+            for timeframe in self.timeframes.get(instrument, ()):
+                start = candle_timestamp(timeframe, tick['timestamp'])
+                if start is None:
+                    continue
+                key = (instrument, timeframe)
+                bar = self.forming.get(key)
+                if bar is None and key in self.closed and start <= self.closed[key]:
+                    continue
+                if bar is None or start > bar[START]:
+                    if bar is not None:
+                        closed.append(self._close(key, bar))
+                    self.forming[key] = [start, next_candle_close(timeframe, start), price, price, price, price, quantity]
+                elif start == bar[START]:
+                    if price > bar[HIGH]:
+                        bar[HIGH] = price
+                    if price < bar[LOW]:
+                        bar[LOW] = price
+                    bar[CLOSE] = price
+                    bar[VOLUME] += quantity
+                # Ticks for a candle that has already closed are dropped
+        self._publish(closed)
+
+    def close_due(self, now=None):
+        """Close forming bars whose candle has ended, even if no later tick arrived"""
+        now = now or timezone.now()
+        closed = []
+        with self._lock:
+            for key, bar in list(self.forming.items()):
+                if bar[END] <= now:
+                    closed.append(self._close(key, bar))
+        self._publish(closed)
+        return len(closed)
+
+    def bars(self, instrument, timeframe):
+        """Closed bars for an (instrument, timeframe) as an OHLCV DataFrame, or None if untracked"""
+        history = self.history.get((instrument, timeframe))
+        return history.frame() if history is not None else None
+
+    def _close(self, key, bar):
+        """Move a forming bar to history; call with the lock held"""
+        del self.forming[key]
+        self.closed[key] = bar[START]
+        event = {
+            'instrument_key': key[0],
+            'timeframe': key[1],
+            'timestamp': bar[START],
+            'open': bar[OPEN],
+            'high': bar[HIGH],
+            'low': bar[LOW],
+            'close': bar[CLOSE],
+            'volume': bar[VOLUME],
+        }
+        history = self.history.get(key)
+        if history is not None:
+            history.append(bar[START], bar[OPEN], bar[HIGH], bar[LOW], bar[CLOSE], bar[VOLUME])
+        return event
+
+    def _publish(self, closed):
+        # Published outside the lock so subscribers can read bars() back
+        for event in closed:
+            self.bus.publish('bar_closed', event)
@@ -0,0 +1,204 @@
+"""
+Columnar on-disk candle cache.
+
+Each (instrument, interval) is a directory holding the history as raw column
+files: int64 timestamps (UTC nanoseconds), float64 open/high/low/close and
+int64 volume. A small CURRENT file names the version directory in use, its
+row count and a generation number, and is only ever replaced atomically:
+
+- write() puts a whole history into a new version directory and switches
+  CURRENT to it.
+- append() writes new and revised rows into the files of the current
+  version in place, touching only the tail. CURRENT gets an odd generation
+  while it does so and the new row count once it is done.
+- load() memory-maps the columns, copies out only the newest rows and
+  starts over if CURRENT changed in the meantime, so timestamps and prices
+  always come from the same write.
+
+Writers in every process take an exclusive flock on the directory's lock
+file, so the web app and the bot can both update the same instrument.
+"""
+import fcntl
+import json
+import os
+import shutil
+import time
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+COLUMNS = {
+    'timestamp': np.int64,
+    'open': np.float64,
+    'high': np.float64,
+    'low': np.float64,
+    'close': np.float64,
+    'volume': np.int64,
+}
+
+CURRENT = 'CURRENT'
+LOCK_FILE = '.lock'
+
+# Reads retried while writers keep changing an instrument, and the pause between them (seconds)
+READ_ATTEMPTS = 5
+READ_RETRY_DELAY = 0.01
+
+
+def _cache_dir(symbol, interval):
+    safe_symbol = symbol.replace('|', '_').replace('/', '_')
+    return os.path.join(settings.CANDLE_CACHE_DIR, safe_symbol, interval)
+
+
+def _column_path(directory, version, name):
+    return os.path.join(directory, version, f'{name}.bin')
+
+
+def _to_columns(frame):
+    """Convert an OHLCV DataFrame indexed by timestamp into contiguous column arrays"""
+    index = pd.DatetimeIndex(frame.index)
+    index = index.tz_localize('UTC') if index.tz is None else index.tz_convert('UTC')
+    columns = {'timestamp': index.as_unit('ns').asi8.astype(np.int64)}
+    for name, dtype in COLUMNS.items():
+        if name != 'timestamp':
+            columns[name] = np.ascontiguousarray(frame[name].to_numpy(dtype=dtype))
+    return columns
+
+
+@contextmanager
+def _locked(directory):
+    """Hold the instrument's cross-process write lock"""
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, LOCK_FILE), 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _read_current(directory):
+    try:
+        with open(os.path.join(directory, CURRENT)) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _write_current(directory, current):
+    tmp_path = os.path.join(directory, f'{CURRENT}.{os.getpid()}.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(current, f)
+    os.replace(tmp_path, os.path.join(directory, CURRENT))
+
+
+def _read_rows(directory, current, start, count, names=COLUMNS):
+    """
+    Rows [start, start + count) of the named columns of the current version.
+    Each column file is memory-mapped and only those rows are copied out:
+    append() rewrites the tail in place, so callers must not keep views
+    into the mapping.
+    """
+    columns = {}
+    for name in names:
+        dtype = np.dtype(COLUMNS[name])
+        if count == 0:
+            columns[name] = np.empty(0, dtype=dtype)
+            continue
+        path = _column_path(directory, current['version'], name)
+        if os.path.getsize(path) < (start + count) * dtype.itemsize:
+            raise ValueError(f'{name} column is short')
+        mapped = np.memmap(path, dtype=dtype, mode='r', offset=start * dtype.itemsize, shape=(count,))
+        columns[name] = np.array(mapped)
+        del mapped  # unmaps the file
+    return columns
+
+
+def _read(directory, limit=None):
+    """The newest `limit` rows from one consistent state of the cache, or None"""
+    for _ in range(READ_ATTEMPTS):
+        current = _read_current(directory)
+        if current is None:
+            return None
+        if current['generation'] % 2 == 0:
+            rows = current['rows']
+            count = min(limit, rows) if limit else rows
+            try:
+                columns = _read_rows(directory, current, rows - count, count)
+            except (FileNotFoundError, ValueError):
+                columns = None  # a newer version replaced this one while we read it
+            if columns is not None and _read_current(directory) == current:
+                return columns
+        time.sleep(READ_RETRY_DELAY)
+    print(f"DEBUG: Candle cache {directory} kept changing while being read")
+    return None
+
+
+def load(symbol, interval, limit=None):
+    """Return the newest `limit` cached candles as a DataFrame, or None"""
+    columns = _read(_cache_dir(symbol, interval), limit)
+    if not columns or len(columns['timestamp']) == 0:
+        return None
+    index = pd.DatetimeIndex(columns.pop('timestamp').view('datetime64[ns]'), name='timestamp').tz_localize('UTC')
+    return pd.DataFrame(columns, index=index, copy=False)
+
+
+def write(symbol, interval, frame):
+    """Replace the cached candles for an instrument with `frame`"""
+    directory = _cache_dir(symbol, interval)
+    columns = _to_columns(frame)
+    with _locked(directory):
+        current = _read_current(directory)
+        version = f"v{int(current['version'][1:]) + 1}" if current else 'v1'
+        os.makedirs(os.path.join(directory, version), exist_ok=True)
+        for name, column in columns.items():
+            column.tofile(_column_path(directory, version, name))
+        _write_current(directory, {
+            'version': version,
+            'rows': len(columns['timestamp']),
+            'generation': (current['generation'] // 2 + 1) * 2 if current else 0,
+        })
+        # Readers still on an old version retry when its files disappear
+        for entry in os.listdir(directory):
+            if entry not in (version, CURRENT, LOCK_FILE):
+                path = os.path.join(directory, entry)
+                if os.path.isdir(path):
+                    shutil.rmtree(path)
+                else:
+                    os.remove(path)
+
+
+def append(symbol, interval, frame):
+    """
+    Merge newer candles into an existing cache in place; rows at or after the
+    first new timestamp are replaced. Does nothing when the instrument is not
+    cached yet, since a lone tail would look like the full history.
+    """
+    if frame is None or len(frame) == 0:
+        return
+    new = _to_columns(frame)
+    directory = _cache_dir(symbol, interval)
+    with _locked(directory):
+        current = _read_current(directory)
+        if current is None or current['generation'] % 2:
+            # Not cached, or a writer died half way; load() fails until write() rebuilds it
+            return
+        rows = current['rows']
+        first = new['timestamp'][0]
+
+        # New candles overlap at most the last few rows, so only the tail is read
+        tail = min(rows, len(new['timestamp']))
+        timestamps = _read_rows(directory, current, rows - tail, tail, ['timestamp'])['timestamp']
+        if tail < rows and timestamps[0] >= first:
+            tail = rows
+            timestamps = _read_rows(directory, current, 0, rows, ['timestamp'])['timestamp']
+        keep = rows - tail + int(np.searchsorted(timestamps, first))
+
+        _write_current(directory, dict(current, generation=current['generation'] + 1))
+        for name, column in new.items():
+            with open(_column_path(directory, current['version'], name), 'r+b') as f:
+                f.seek(keep * column.itemsize)
+                f.write(column.tobytes())
+                # No truncate: readers may have the old tail mapped, and CURRENT's row count bounds every read
+        _write_current(directory, dict(current, rows=keep + len(new['timestamp']), generation=current['generation'] + 2))
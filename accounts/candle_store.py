@@ -0,0 +1,162 @@
+"""
+Local OHLCV candle store backed by the MarketData table.
+
+Candles are keyed by (symbol, interval, timestamp). sync() only asks Upstox
+for the tail after the newest stored candle, and analysis windows are read
+back locally, so steady state is one small delta fetch instead of a 30-day
+download per call. Analysis windows come from a per-instrument ring buffer
+that new candles are appended to in place; it is seeded from the
+on-disk candle_cache, and the ORM is only used to build that cache the
+first time an instrument is read.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+import pandas as pd
+from django.utils import timezone
+
+from . import candle_cache, ring_buffer
+from .market_hours import IST, candle_start
+from .models import MarketData
+
+# Days of history fetched by default the first time an instrument is seen
+INITIAL_BACKFILL_DAYS = 30
+
+# Candles handed to the indicators, and the fewest worth analysing
+ANALYSIS_WINDOW = 200
+MIN_ANALYSIS_CANDLES = 20
+
+CANDLE_FIELDS = ['open_price', 'high_price', 'low_price', 'close_price', 'volume']
+
+
+def history_buffer(symbol, interval, capacity=ANALYSIS_WINDOW):
+    """Shared ring buffer for an instrument, seeded from local history the first time"""
+    return ring_buffer.get_buffer(
+        symbol, interval, capacity,
+        seed=lambda: CandleStore.load_history(symbol, interval, capacity),
+    )
+
+
+def parse_candle_timestamp(value):
+    """Upstox sends ISO-8601 strings; the live-quote fallback sends epoch seconds"""
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value, tz=dt_timezone.utc)
+    timestamp = datetime.fromisoformat(value)
+    if timezone.is_naive(timestamp):
+        timestamp = timezone.make_aware(timestamp)
+    return timestamp
+
+
+def resample_candles(candles, timeframe):
+    """Group ascending raw candles into session-aligned `timeframe` candles; candles outside the session are dropped"""
+    grouped = []
+    start = None
+    for candle in candles:
+        candle_at = candle_start(timeframe, parse_candle_timestamp(candle[0]))
+        if candle_at is None:
+            continue
+        if candle_at != start:
+            start = candle_at
+            grouped.append([start.isoformat(), candle[1], candle[2], candle[3], candle[4], candle[5] or 0])
+        else:
+            row = grouped[-1]
+            row[2] = max(row[2], candle[2])
+            row[3] = min(row[3], candle[3])
+            row[4] = candle[4]
+            row[5] += candle[5] or 0
+    return grouped
+
+
+class CandleStore:
+    def __init__(self, upstox):
+        self.upstox = upstox
+
+    def latest_timestamp(self, symbol, interval):
+        """Timestamp of the newest stored candle, or None"""
+        return MarketData.objects.filter(
+            symbol=symbol, interval=interval
+        ).order_by('-timestamp').values_list('timestamp', flat=True).first()
+
+    def sync(self, symbol, interval, days=INITIAL_BACKFILL_DAYS):
+        """Fetch and store the candles missing since the last stored one; returns how many were written"""
+        last = self.latest_timestamp(symbol, interval)
+        if last:
+            # Upstox takes whole days, so ask from the last stored day
+            from_date = timezone.localtime(last, IST).date()
+        else:
+            from_date = (timezone.now() - timedelta(days=days)).date()
+
+        response = self.upstox.get_market_data(symbol, interval, from_date=from_date)
+        if not response or response.get('source') == 'live_quote':
+            # A single fabricated candle from the live price is not history
+            return 0
+        candles = (response.get('data') or {}).get('candles') or []
+        if last:
+            # Keep only the tail: the last stored candle, which may have been forming, and newer ones
+            candles = [candle for candle in candles if parse_candle_timestamp(candle[0]) >= last]
+        return self.store(symbol, interval, candles)
+
+    def store(self, symbol, interval, candles):
+        """Upsert raw Upstox candles ([timestamp, open, high, low, close, volume, ...])"""
+        rows = [
+            MarketData(
+                symbol=symbol,
+                interval=interval,
+                timestamp=parse_candle_timestamp(candle[0]),
+                open_price=Decimal(str(candle[1])),
+                high_price=Decimal(str(candle[2])),
+                low_price=Decimal(str(candle[3])),
+                close_price=Decimal(str(candle[4])),
+                volume=int(candle[5] or 0),
+            )
+            for candle in candles
+        ]
+        if rows:
+            MarketData.objects.bulk_create(
+                rows,
+                update_conflicts=True,
+                unique_fields=['symbol', 'interval', 'timestamp'],
+                update_fields=CANDLE_FIELDS,
+            )
+            frame = self._to_frame([
+                (row.timestamp, row.open_price, row.high_price, row.low_price, row.close_price, row.volume)
+                for row in sorted(rows, key=lambda row: row.timestamp)
+            ])
+            candle_cache.append(symbol, interval, frame)
+            buffer = ring_buffer.find_buffer(symbol, interval)
+            if buffer is not None:
+                buffer.extend(frame)
+        return len(rows)
+
+    def get_frame(self, symbol, interval, limit=ANALYSIS_WINDOW):
+        """Return the newest `limit` candles as an ascending OHLCV DataFrame, or None"""
+        buffer = history_buffer(symbol, interval, limit)
+        return buffer.frame(limit) if len(buffer) else None
+
+    @staticmethod
+    def load_history(symbol, interval, limit=ANALYSIS_WINDOW):
+        """Read the newest `limit` stored candles from the candle cache, building it from the ORM if needed"""
+        df = candle_cache.load(symbol, interval, limit)
+        if df is not None:
+            return df
+
+        # Cold start: build the cache from the full stored history once
+        rows = list(
+            MarketData.objects.filter(symbol=symbol, interval=interval)
+            .order_by('timestamp')
+            .values_list('timestamp', *CANDLE_FIELDS)
+        )
+        if not rows:
+            return None
+        df = CandleStore._to_frame(rows)
+        candle_cache.write(symbol, interval, df)
+        return df.tail(limit) if limit else df
+
+    @staticmethod
+    def _to_frame(rows):
+        """Build an OHLCV DataFrame from ascending (timestamp, open, high, low, close, volume) rows"""
+        df = pd.DataFrame(rows, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+        df[['open', 'high', 'low', 'close']] = df[['open', 'high', 'low', 'close']].astype(float)
+        df['volume'] = df['volume'].astype('int64')
+        df.set_index('timestamp', inplace=True)
+        return df
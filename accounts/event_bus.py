@@ -0,0 +1,47 @@
+"""
+In-process publish/subscribe bus.
+
+Producers (the market feed, the bot) publish payloads on a topic such as
+'tick'; every callback subscribed to that topic is called synchronously on
+the publisher's thread, so handlers should be quick and hand heavy work off.
+"""
+import threading
+
+
+class EventBus:
+    def __init__(self):
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, topic, callback):
+        """Call `callback(payload)` for everything published on `topic`; returns an unsubscribe function"""
+        with self._lock:
+            # Copy on write so publish() can iterate without holding the lock
+            self._subscribers[topic] = self._subscribers.get(topic, ()) + (callback,)
+        return lambda: self.unsubscribe(topic, callback)
+
+    def unsubscribe(self, topic, callback):
+        with self._lock:
+            callbacks = tuple(c for c in self._subscribers.get(topic, ()) if c is not callback)
+            if callbacks:
+                self._subscribers[topic] = callbacks
+            else:
+                self._subscribers.pop(topic, None)
+
+    def has_subscribers(self, topic):
+        """Whether anything listens on `topic`, so producers can skip building payloads"""
+        return bool(self._subscribers.get(topic))
+
+    def publish(self, topic, payload):
+        """Deliver `payload` to every subscriber of `topic`; returns how many were called"""
+        callbacks = self._subscribers.get(topic, ())
+        for callback in callbacks:
+            try:
+                callback(payload)
+            except Exception as e:
+                print(f"❌ Error in {topic} subscriber {getattr(callback, '__name__', callback)}: {e}")
+        return len(callbacks)
+
+
+# Shared bus for the process
+bus = EventBus()
@@ -0,0 +1,37 @@
+"""
+Cross-process change notices for the event stream.
+
+The event bus only reaches subscribers in the process that publishes, and
+the bot runs in a process of its own. So after writing bot logs or a
+strategy state, producers also call announce(), which bumps a per-user,
+per-topic counter in the shared cache. EventStream reads the counters every
+second or so and, when one moved, picks the new rows up from the database
+or the new states from the state cache.
+"""
+from .shared_cache import shared_cache
+
+
+def sequence_key(user_id, topic):
+    return f'events:{user_id}:{topic}'
+
+
+def announce(user_ids, topic):
+    """Tell every process that `topic` has news for each of `user_ids`"""
+    for user_id in set(user_ids):
+        if user_id is None:
+            continue
+        try:
+            shared_cache.backend.incr(sequence_key(user_id, topic))
+        except Exception as e:
+            print(f"DEBUG: Could not announce {topic} for user {user_id}: {e}")
+
+
+def sequences(user_id, topics):
+    """{topic: counter} for one user; counters never bumped are missing"""
+    keys = {sequence_key(user_id, topic): topic for topic in topics}
+    try:
+        values = shared_cache.backend.get_many(list(keys))
+    except Exception as e:
+        print(f"DEBUG: Could not read event sequences for user {user_id}: {e}")
+        return {}
+    return {keys[key]: value for key, value in values.items()}
@@ -0,0 +1,191 @@
+"""
+Server-Sent Events bridge from the in-process event bus to a browser.
+
+EventStream follows the 'bot_log' and 'strategy_state' topics for one user
+and yields them as SSE frames:
+
+    id: 1234
+    event: bot_log
+    data: {"id": 1234, "log_type": "INFO", ...}
+
+Bus callbacks run on the publisher's thread, so they only hand payloads to
+the stream's event loop. The bot usually runs in another process, whose bus
+this one cannot hear: every POLL_INTERVAL seconds the stream checks the
+counters that process bumps through event_sequence, and fetches new logs
+from the database and new states from the state cache when they moved.
+Logs written while the client was away are caught up on connect, and the
+database is checked again after CATCHUP_INTERVAL seconds of silence, which
+doubles as the keep-alive. Log frames carry the row id, so a reconnecting
+EventSource resumes from Last-Event-ID. A catch-up sends at most
+CATCHUP_LIMIT rows; when older ones had to be skipped it is preceded by a
+'resync' event, and the client starts its list over.
+
+Database reads run with thread_sensitive=False: under ASGI the default
+sends every sync_to_async call to the one thread that serves all sync
+views, and each open stream polls once a second.
+"""
+import asyncio
+import json
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+
+from . import strategy_state
+from .event_bus import bus as default_bus
+from .event_sequence import sequences
+from .log_sink import log_event
+from .models import BotLog, Strategy
+
+TOPICS = ('bot_log', 'strategy_state')
+
+# Events held for a slow client before falling back to a database catch-up
+QUEUE_SIZE = 1000
+
+# Seconds between checks for logs and states announced by other processes
+POLL_INTERVAL = 1
+
+# Seconds of silence before checking the database and sending a keep-alive
+CATCHUP_INTERVAL = 15
+
+# Newest rows sent by one catch-up
+CATCHUP_LIMIT = 100
+
+# Reconnect delay suggested to the browser (milliseconds)
+RETRY_MS = 5000
+
+
+def _in_thread(func, *args):
+    """Run a blocking database call on a worker thread of its own, closing the connection it used"""
+    def call():
+        try:
+            return func(*args)
+        finally:
+            close_old_connections()
+    return sync_to_async(call, thread_sensitive=False)()
+
+
+def format_event(topic, payload, event_id=None):
+    """One SSE frame"""
+    lines = [] if event_id is None else [f'id: {event_id}']
+    lines.append(f'event: {topic}')
+    lines.append(f'data: {json.dumps(payload, default=str)}')
+    return '\n'.join(lines) + '\n\n'
+
+
+class EventStream:
+    def __init__(self, user_id, since_id=0, bus=None):
+        self.user_id = user_id
+        self.last_id = since_id or 0  # newest log id sent
+        self.bus = bus or default_bus
+        self.sequences = {}   # topic -> last counter seen from event_sequence
+        self.state_sent = {}  # strategy id -> updated_at of the last state sent
+        self.loop = None
+        self.queue = None
+        self.overflowed = False
+
+    async def events(self):
+        """Yield SSE frames until the client goes away"""
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        # Subscribe before the first catch-up so nothing falls in between
+        unsubscribes = [self.bus.subscribe(topic, partial(self._receive, topic)) for topic in TOPICS]
+        try:
+            yield f'retry: {RETRY_MS}\n\n'
+            self.sequences = await _in_thread(sequences, self.user_id, TOPICS)
+            for frame in await self._catch_up():
+                yield frame
+            last_frame = self.loop.time()
+            next_poll = last_frame + POLL_INTERVAL
+            while True:
+                try:
+                    # Poll on time even while local events keep arriving
+                    topic, payload = await asyncio.wait_for(self.queue.get(), max(next_poll - self.loop.time(), 0))
+                except asyncio.TimeoutError:
+                    next_poll = self.loop.time() + POLL_INTERVAL
+                    frames = await _in_thread(self._announced)
+                    if not frames and self.loop.time() - last_frame >= CATCHUP_INTERVAL:
+                        frames = await self._catch_up() + [': keep-alive\n\n']
+                    if frames:
+                        last_frame = self.loop.time()
+                    for frame in frames:
+                        yield frame
+                    continue
+                last_frame = self.loop.time()
+                if self.overflowed:
+                    # Some events were dropped; the database has every log
+                    self.overflowed = False
+                    for frame in await self._catch_up():
+                        yield frame
+                if topic == 'bot_log':
+                    if payload['id'] is None or payload['id'] <= self.last_id:
+                        continue
+                    self.last_id = payload['id']
+                    yield format_event(topic, payload, payload['id'])
+                elif self._is_new_state(payload):
+                    yield format_event(topic, payload)
+        finally:
+            for unsubscribe in unsubscribes:
+                unsubscribe()
+
+    def _receive(self, topic, payload):
+        """Bus callback, on the publisher's thread"""
+        if payload.get('user_id') != self.user_id:
+            return
+        try:
+            self.loop.call_soon_threadsafe(self._put, topic, payload)
+        except RuntimeError:
+            pass  # the stream's loop has closed
+
+    def _put(self, topic, payload):
+        try:
+            self.queue.put_nowait((topic, payload))
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    async def _catch_up(self):
+        """Frames for logs stored after the last one sent"""
+        return await _in_thread(self._log_frames)
+
+    def _announced(self):
+        """Frames for the logs and states other processes announced since the last check"""
+        current = sequences(self.user_id, TOPICS)
+        changed = {topic for topic in TOPICS if current.get(topic) != self.sequences.get(topic)}
+        self.sequences = current
+        frames = []
+        if 'bot_log' in changed:
+            frames += self._log_frames()
+        if 'strategy_state' in changed:
+            frames += self._state_frames()
+        return frames
+
+    def _log_frames(self):
+        logs, truncated = self._newer_logs()
+        frames = []
+        if truncated:
+            # Rows between the last one sent and these were skipped
+            frames.append(format_event('resync', {'skipped_after': self.last_id}))
+        if logs:
+            self.last_id = logs[-1]['id']
+        return frames + [format_event('bot_log', log, log['id']) for log in logs]
+
+    def _newer_logs(self):
+        """(up to CATCHUP_LIMIT newest logs after the last one sent, oldest first; whether older ones were left out)"""
+        logs = list(
+            BotLog.objects.filter(user_id=self.user_id, id__gt=self.last_id)
+            .select_related('strategy').order_by('-id')[:CATCHUP_LIMIT + 1]
+        )
+        truncated = len(logs) > CATCHUP_LIMIT
+        return [log_event(log) for log in reversed(logs[:CATCHUP_LIMIT])], truncated
+
+    def _state_frames(self):
+        strategy_ids = list(Strategy.objects.filter(user_id=self.user_id).values_list('id', flat=True))
+        states = strategy_state.snapshot(strategy_ids)
+        return [format_event('strategy_state', state) for state in states.values() if self._is_new_state(state)]
+
+    def _is_new_state(self, state):
+        """Whether `state` is newer than the last one sent for its strategy, noting it as sent"""
+        if state['updated_at'] <= self.state_sent.get(state['strategy_id'], 0):
+            return False
+        self.state_sent[state['strategy_id']] = state['updated_at']
+        return True
@@ -0,0 +1,191 @@
+"""
+Shared indicator engine.
+
+Signal generation in both bots and the monitoring API need the same
+indicator for the same candles. get_indicator() computes it once and
+memoizes the result per (symbol, timeframe, indicator, params, last candle),
+so every consumer in the process reads the same IndicatorResult.
+
+The real-time bot keeps one streaming indicator per (symbol, timeframe,
+indicator) here, fed through stream_indicator() and push_candle(). When that
+stream has already seen the last candle of the data get_indicator() is
+asked about, its value and signal are served instead of recomputing.
+"""
+import math
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from .streaming_indicators import create_streaming_indicator
+from .indicators import (
+    calculate_rsi, calculate_macd, calculate_moving_average, calculate_vwap,
+    calculate_adx, calculate_supertrend,
+    rsi_decision, macd_decision, moving_average_decision, vwap_decision,
+    adx_decision, supertrend_decision
+)
+
+INDICATORS = ['RSI', 'MACD', 'Moving Average', 'VWAP', 'ADX', 'Supertrend']
+
+# Candles each indicator needs before it produces a value with the default parameters
+INDICATOR_LOOKBACK = {
+    'RSI': 15,
+    'MACD': 35,
+    'Moving Average': 20,
+    'VWAP': 1,
+    'ADX': 28,
+    'Supertrend': 11,
+}
+
+# Number of results kept in the per-process memo
+CACHE_SIZE = 512
+
+
+class IndicatorResult:
+    """Indicator value series plus the signal derived from it"""
+    __slots__ = ('indicator', 'values', 'signal', 'timestamp')
+
+    def __init__(self, indicator, values, signal, timestamp=None):
+        self.indicator = indicator
+        self.values = values
+        self.signal = signal
+        self.timestamp = timestamp
+
+    @property
+    def value(self):
+        """Latest indicator value, or None while it is still warming up"""
+        if len(self.values) == 0:
+            return None
+        latest = float(self.values[-1])
+        return None if math.isnan(latest) else latest
+
+
+def _column(data, name):
+    return data[name] if name in data.columns else data[name.capitalize()]
+
+
+def compute_indicator(indicator, data, params=None) -> IndicatorResult:
+    """Compute an indicator over an OHLCV DataFrame without memoization"""
+    params = params or {}
+    close = _column(data, 'close')
+    if indicator == 'RSI':
+        rsi = calculate_rsi(close, **params)
+        values, signal = rsi, rsi_decision(rsi)
+    elif indicator == 'MACD':
+        macd, signal_line = calculate_macd(close, **params)
+        values, signal = macd, macd_decision(macd, signal_line)
+    elif indicator == 'Moving Average':
+        ma = calculate_moving_average(close, **params)
+        values, signal = ma, moving_average_decision(close, ma)
+    elif indicator == 'VWAP':
+        vwap = calculate_vwap(close, _column(data, 'volume'))
+        values, signal = vwap, vwap_decision(close, vwap)
+    elif indicator == 'ADX':
+        plus_di, minus_di, adx = calculate_adx(_column(data, 'high'), _column(data, 'low'), close, **params)
+        values, signal = adx, adx_decision(plus_di, minus_di)
+    elif indicator == 'Supertrend':
+        supertrend, _ = calculate_supertrend(_column(data, 'high'), _column(data, 'low'), close, **params)
+        values, signal = supertrend, supertrend_decision(close, supertrend)
+    else:
+        raise ValueError(f"Unknown indicator: {indicator}")
+
+    if hasattr(values, 'to_numpy'):
+        values = values.to_numpy()
+    return IndicatorResult(indicator, values, signal, data.index[-1] if len(data) else None)
+
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def get_indicator(symbol, timeframe, indicator, data, params=None) -> IndicatorResult:
+    """
+    Return the memoized IndicatorResult for these candles, computing it on first use.
+
+    The key includes the last close as well as its timestamp so a forming
+    candle whose price moved is not served from a stale entry.
+    """
+    if len(data):
+        last_candle = (data.index[-1], float(_column(data, 'close').iloc[-1]))
+    else:
+        last_candle = None
+    key = (symbol, timeframe, indicator, tuple(sorted((params or {}).items())), last_candle)
+
+    with _cache_lock:
+        result = _cache.get(key)
+        if result is not None:
+            _cache.move_to_end(key)
+            return result
+
+    result = _streamed(symbol, timeframe, indicator, last_candle) if not params else None
+    if result is None:
+        result = compute_indicator(indicator, data, params)
+
+    with _cache_lock:
+        _cache[key] = result
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return result
+
+
+_streams = {}
+_streams_lock = threading.Lock()  # streams are fed from both the feed and scheduler threads
+
+
+def stream_indicator(symbol, timeframe, indicator, data):
+    """
+    Feed the candles of `data` not seen yet to the shared streaming indicator
+    of (symbol, timeframe, indicator); returns its IndicatorResult, holding
+    only the latest value, or None for an unknown indicator.
+    """
+    if not len(data):
+        return None
+    with _streams_lock:
+        stream = _stream(symbol, timeframe, indicator, data.index[-1])
+        if stream is None:
+            return None
+        stream.prime(data)
+        return _result(indicator, stream)
+
+
+def push_candle(symbol, timeframe, indicator, timestamp, candle):
+    """Feed one closed candle, e.g. a bar built from the feed, to the shared streaming indicator"""
+    with _streams_lock:
+        stream = _stream(symbol, timeframe, indicator, timestamp)
+        if stream is not None:
+            stream.push(timestamp, candle)
+
+
+def _stream(symbol, timeframe, indicator, timestamp):
+    """The stream for a key, created on first use; call with _streams_lock held. A stream fed
+    on naive timestamps is started over when timezone-aware ones arrive, and vice versa,
+    since the two cannot be compared."""
+    key = (symbol, timeframe, indicator)
+    stream = _streams.get(key)
+    if (stream is not None and stream.last_timestamp is not None
+            and (stream.last_timestamp.tzinfo is None) != (timestamp.tzinfo is None)):
+        print(f"DEBUG: Timestamps for {symbol} ({timeframe}) changed timezone kind; restarting its {indicator}")
+        stream = None
+    if stream is None:
+        stream = create_streaming_indicator(indicator)
+        if stream is not None:
+            _streams[key] = stream
+    return stream
+
+
+def _streamed(symbol, timeframe, indicator, last_candle):
+    """The stream's result if it has seen exactly `last_candle` (timestamp, close) last"""
+    if last_candle is None:
+        return None
+    with _streams_lock:
+        stream = _streams.get((symbol, timeframe, indicator))
+        if (stream is None or stream.last_timestamp is None
+                or (stream.last_timestamp.tzinfo is None) != (last_candle[0].tzinfo is None)
+                or stream.last_timestamp != last_candle[0]
+                or stream.last_candle.get('close') != last_candle[1]):
+            return None
+        return _result(indicator, stream)
+
+
+def _result(indicator, stream):
+    return IndicatorResult(indicator, np.array([stream.value], dtype=float), stream.signal, stream.last_timestamp)
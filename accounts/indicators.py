@@ -1,3 +1,5 @@
+from collections import deque
+
 import numpy as np
 import pandas as pd
 
@@ -8,11 +10,19 @@ def rsi_signal(prices: pd.Series, period: int = 14) -> str:
     - Buy: RSI rises above 60
     - Sell: RSI falls below 40
     """
+    return rsi_decision(calculate_rsi(prices, period))
+
+
+def calculate_rsi(prices: pd.Series, period: int = 14) -> pd.Series:
+    """Calculate Relative Strength Index"""
     delta = prices.diff()
     gain = (delta.where(delta > 0, 0)).rolling(window=period).mean()
     loss = (-delta.where(delta < 0, 0)).rolling(window=period).mean()
     rs = gain / loss
-    rsi = 100 - (100 / (1 + rs))
+    return 100 - (100 / (1 + rs))
+
+
+def rsi_decision(rsi: pd.Series) -> str:
     latest_rsi = rsi.iloc[-1]
     if latest_rsi > 60:
         return 'buy'
@@ -28,10 +38,19 @@ def macd_signal(prices: pd.Series, fast: int = 12, slow: int = 26, signal: int =
     - Buy: MACD crosses above signal line
     - Sell: MACD crosses below signal line
     """
+    return macd_decision(*calculate_macd(prices, fast, slow, signal))
+
+
+def calculate_macd(prices: pd.Series, fast: int = 12, slow: int = 26, signal: int = 9):
+    """Calculate MACD line and signal line"""
     ema_fast = prices.ewm(span=fast, adjust=False).mean()
     ema_slow = prices.ewm(span=slow, adjust=False).mean()
     macd = ema_fast - ema_slow
     signal_line = macd.ewm(span=signal, adjust=False).mean()
+    return macd, signal_line
+
+
+def macd_decision(macd: pd.Series, signal_line: pd.Series) -> str:
     if macd.iloc[-2] < signal_line.iloc[-2] and macd.iloc[-1] > signal_line.iloc[-1]:
         return 'buy'
     elif macd.iloc[-2] > signal_line.iloc[-2] and macd.iloc[-1] < signal_line.iloc[-1]:
@@ -46,7 +65,15 @@ def moving_average_signal(prices: pd.Series, window: int = 20) -> str:
     - Buy: Price crosses above MA
     - Sell: Price crosses below MA
     """
-    ma = prices.rolling(window=window).mean()
+    return moving_average_decision(prices, calculate_moving_average(prices, window))
+
+
+def calculate_moving_average(prices: pd.Series, window: int = 20) -> pd.Series:
+    """Calculate Simple Moving Average"""
+    return prices.rolling(window=window).mean()
+
+
+def moving_average_decision(prices: pd.Series, ma: pd.Series) -> str:
     if prices.iloc[-2] < ma.iloc[-2] and prices.iloc[-1] > ma.iloc[-1]:
         return 'buy'
     elif prices.iloc[-2] > ma.iloc[-2] and prices.iloc[-1] < ma.iloc[-1]:
@@ -61,7 +88,15 @@ def vwap_signal(prices: pd.Series, volumes: pd.Series) -> str:
     - Buy: Price above VWAP
     - Sell: Price below VWAP
     """
-    vwap = (prices * volumes).cumsum() / volumes.cumsum()
+    return vwap_decision(prices, calculate_vwap(prices, volumes))
+
+
+def calculate_vwap(prices: pd.Series, volumes: pd.Series) -> pd.Series:
+    """Calculate Volume Weighted Average Price"""
+    return (prices * volumes).cumsum() / volumes.cumsum()
+
+
+def vwap_decision(prices: pd.Series, vwap: pd.Series) -> str:
     if prices.iloc[-1] > vwap.iloc[-1]:
         return 'buy'
     elif prices.iloc[-1] < vwap.iloc[-1]:
@@ -76,17 +111,24 @@ def adx_signal(high: pd.Series, low: pd.Series, close: pd.Series, period: int =
     - Buy: +DI crosses above -DI
     - Sell: -DI crosses above +DI
     """
+    plus_di, minus_di, _ = calculate_adx(high, low, close, period)
+    return adx_decision(plus_di, minus_di)
+
+
+def calculate_adx(high: pd.Series, low: pd.Series, close: pd.Series, period: int = 14):
+    """Calculate +DI, -DI and the directional index"""
     plus_dm = high.diff()
     minus_dm = low.diff().abs()
     plus_dm[plus_dm < 0] = 0
     minus_dm[minus_dm < 0] = 0
-    tr1 = high - low
-    tr2 = (high - close.shift()).abs()
-    tr3 = (low - close.shift()).abs()
-    tr = pd.concat([tr1, tr2, tr3], axis=1).max(axis=1)
-    atr = tr.rolling(window=period).mean()
+    atr = calculate_atr(high, low, close, period)
     plus_di = 100 * (plus_dm.rolling(window=period).sum() / atr)
     minus_di = 100 * (minus_dm.rolling(window=period).sum() / atr)
+    adx = ((plus_di - minus_di).abs() / (plus_di + minus_di)) * 100
+    return plus_di, minus_di, adx
+
+
+def adx_decision(plus_di: pd.Series, minus_di: pd.Series) -> str:
     if plus_di.iloc[-2] < minus_di.iloc[-2] and plus_di.iloc[-1] > minus_di.iloc[-1]:
         return 'buy'
     elif minus_di.iloc[-2] < plus_di.iloc[-2] and minus_di.iloc[-1] > plus_di.iloc[-1]:
@@ -101,39 +143,130 @@ def supertrend_signal(high: pd.Series, low: pd.Series, close: pd.Series, period:
     - Buy: Price above SuperTrend
     - Sell: Price below SuperTrend
     """
-    atr = calculate_atr(high, low, close, period)
-    upper_band = ((high + low) / 2) + (multiplier * atr)
-    lower_band = ((high + low) / 2) - (multiplier * atr)
-    
-    supertrend = pd.Series(index=close.index, dtype=float)
-    direction = pd.Series(index=close.index, dtype=int)
-    
-    for i in range(period, len(close)):
-        if close.iloc[i] > upper_band.iloc[i-1]:
-            direction.iloc[i] = 1
-        elif close.iloc[i] < lower_band.iloc[i-1]:
-            direction.iloc[i] = -1
-        else:
-            direction.iloc[i] = direction.iloc[i-1]
-            
-        if direction.iloc[i] == 1 and lower_band.iloc[i] < lower_band.iloc[i-1]:
-            lower_band.iloc[i] = lower_band.iloc[i-1]
-        if direction.iloc[i] == -1 and upper_band.iloc[i] > upper_band.iloc[i-1]:
-            upper_band.iloc[i] = upper_band.iloc[i-1]
-            
-        if direction.iloc[i] == 1:
-            supertrend.iloc[i] = lower_band.iloc[i]
-        else:
-            supertrend.iloc[i] = upper_band.iloc[i]
-    
-    if close.iloc[-1] > supertrend.iloc[-1]:
+    supertrend, _ = calculate_supertrend(high, low, close, period, multiplier)
+    return supertrend_decision(close, supertrend)
+
+
+def supertrend_decision(close: pd.Series, supertrend: np.ndarray) -> str:
+    if close.iloc[-1] > supertrend[-1]:
         return 'buy'
-    elif close.iloc[-1] < supertrend.iloc[-1]:
+    elif close.iloc[-1] < supertrend[-1]:
         return 'sell'
     else:
         return 'hold'
 
 
+def calculate_supertrend(high: pd.Series, low: pd.Series, close: pd.Series, period: int = 10, multiplier: float = 3.0):
+    """
+    Calculate SuperTrend line and direction as float64 arrays.
+
+    Bands are built vectorised; the trailing-band recursion then runs in a
+    single pass over plain floats. Direction is 1 (up), -1 (down) or 0 while
+    no band has been crossed yet.
+    """
+    atr = calculate_atr(high, low, close, period).to_numpy(dtype=np.float64)
+    hl2 = ((high + low) / 2).to_numpy(dtype=np.float64)
+    return supertrend_kernel(hl2 + multiplier * atr, hl2 - multiplier * atr,
+                             close.to_numpy(dtype=np.float64), period)
+
+
+def supertrend_kernel(upper_band: np.ndarray, lower_band: np.ndarray, close: np.ndarray, period: int):
+    """Run the SuperTrend band recursion over contiguous arrays"""
+    n = len(close)
+    supertrend = np.full(n, np.nan)
+    direction = np.zeros(n, dtype=np.int8)
+    upper = upper_band.tolist()
+    lower = lower_band.tolist()
+    closes = close.tolist()
+    st = supertrend.tolist()
+    d = 0
+    for i in range(period, n):
+        c = closes[i]
+        if c > upper[i - 1]:
+            d = 1
+        elif c < lower[i - 1]:
+            d = -1
+        if d == 1 and lower[i] < lower[i - 1]:
+            lower[i] = lower[i - 1]
+        if d == -1 and upper[i] > upper[i - 1]:
+            upper[i] = upper[i - 1]
+        st[i] = lower[i] if d == 1 else upper[i]
+        direction[i] = d
+    supertrend[:] = st
+    return supertrend, direction
+
+
+class SupertrendState:
+    """
+    Incremental SuperTrend: feeds one candle at a time and keeps only the
+    rolling true-range window and the previous bands, so each update is O(1).
+    Produces the same values as calculate_supertrend over the same candles.
+    """
+    __slots__ = ('period', 'multiplier', 'count', 'prev_close', 'tr_window', 'tr_sum',
+                 'upper', 'lower', 'direction', 'value')
+
+    def __init__(self, period: int = 10, multiplier: float = 3.0):
+        self.period = period
+        self.multiplier = multiplier
+        self.count = 0
+        self.prev_close = None
+        self.tr_window = deque(maxlen=period)
+        self.tr_sum = 0.0
+        self.upper = np.nan
+        self.lower = np.nan
+        self.direction = 0
+        self.value = np.nan
+
+    @classmethod
+    def from_history(cls, high: pd.Series, low: pd.Series, close: pd.Series, period: int = 10, multiplier: float = 3.0):
+        """Warm up state from a batch of candles"""
+        state = cls(period, multiplier)
+        for h, l, c in zip(high.tolist(), low.tolist(), close.tolist()):
+            state.update(h, l, c)
+        return state
+
+    def update(self, high: float, low: float, close: float):
+        """Add one closed candle and return (supertrend, direction)"""
+        if self.prev_close is None:
+            tr = high - low
+        else:
+            tr = max(high - low, abs(high - self.prev_close), abs(low - self.prev_close))
+        if len(self.tr_window) == self.period:
+            self.tr_sum -= self.tr_window[0]
+        self.tr_window.append(tr)
+        self.tr_sum += tr
+        self.prev_close = close
+        self.count += 1
+
+        if self.count < self.period:
+            return self.value, self.direction
+        atr = self.tr_sum / self.period
+        hl2 = (high + low) / 2
+        upper = hl2 + self.multiplier * atr
+        lower = hl2 - self.multiplier * atr
+        if self.count > self.period:
+            if close > self.upper:
+                self.direction = 1
+            elif close < self.lower:
+                self.direction = -1
+            if self.direction == 1 and lower < self.lower:
+                lower = self.lower
+            if self.direction == -1 and upper > self.upper:
+                upper = self.upper
+            self.value = lower if self.direction == 1 else upper
+        self.upper = upper
+        self.lower = lower
+        return self.value, self.direction
+
+    def signal(self, close: float) -> str:
+        """Return buy/sell/hold for a close against the current SuperTrend"""
+        if close > self.value:
+            return 'buy'
+        elif close < self.value:
+            return 'sell'
+        return 'hold'
+
+
 def calculate_atr(high: pd.Series, low: pd.Series, close: pd.Series, period: int = 14) -> pd.Series:
     """Calculate Average True Range"""
     tr1 = high - low
@@ -0,0 +1,143 @@
+"""
+BotLog retention.
+
+Rows stay in the live table for the number of days configured per log type
+in settings.BOT_LOG_RETENTION_DAYS. compact() moves older rows into one
+gzip-compressed JSON-lines archive per day (BOT_LOG_ARCHIVE_DIR/YYYY-MM-DD.jsonl.gz)
+and deletes them with a single range delete per retention group. New rows are
+written to a copy of the archive that replaces it by rename before the
+delete, and rows whose id the archive already holds are skipped, so a run
+that stops at any point loses nothing and a rerun does not archive a row
+twice. Each day's archive is a partition: once it is older than
+BOT_LOG_ARCHIVE_DAYS, drop_expired_archives() removes the whole file.
+"""
+import gzip
+import json
+import os
+import shutil
+from datetime import date, datetime, time, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import BotLog
+
+ARCHIVE_SUFFIX = '.jsonl.gz'
+
+# Rows read per query while archiving
+CHUNK_SIZE = 2000
+
+
+def archive_path(day):
+    return os.path.join(settings.BOT_LOG_ARCHIVE_DIR, f'{day.isoformat()}{ARCHIVE_SUFFIX}')
+
+
+def temp_archive_path(day):
+    return archive_path(day) + '.tmp'
+
+
+def _open_temp_archive(day):
+    """Open a copy of the day's archive to append to; it replaces the archive once complete"""
+    os.makedirs(settings.BOT_LOG_ARCHIVE_DIR, exist_ok=True)
+    path, temp = archive_path(day), temp_archive_path(day)
+    if os.path.exists(path):
+        shutil.copyfile(path, temp)
+    else:
+        open(temp, 'wb').close()
+    # Appending adds a new gzip member; readers see one continuous file
+    return gzip.open(temp, 'at', encoding='utf-8')
+
+
+def retention_cutoffs(today=None):
+    """{cutoff datetime: [log types]}; rows of those types logged before the cutoff are archived"""
+    today = today or timezone.localdate()
+    retention = getattr(settings, 'BOT_LOG_RETENTION_DAYS', {})
+    groups = {}
+    for log_type, _ in BotLog.LOG_TYPES:
+        days = retention.get(log_type, retention.get('default', 30))
+        cutoff = timezone.make_aware(datetime.combine(today - timedelta(days=days), time.min))
+        groups.setdefault(cutoff, []).append(log_type)
+    return groups
+
+
+def compact(today=None, dry_run=False):
+    """Archive and delete rows past their retention; returns {day: rows archived}"""
+    archived = {}
+    for cutoff, log_types in sorted(retention_cutoffs(today).items()):
+        expired = BotLog.objects.filter(log_type__in=log_types, timestamp__lt=cutoff)
+        max_id = expired.aggregate(max_id=Max('id'))['max_id']
+        if max_id is None:
+            continue
+        expired = expired.filter(id__lte=max_id)
+
+        if dry_run:
+            for day in expired.datetimes('timestamp', 'day'):
+                day = timezone.localtime(day).date()
+                archived[day] = archived.get(day, 0) + expired.filter(timestamp__date=day).count()
+            continue
+
+        files = {}
+        archived_ids = {}
+        try:
+            rows = expired.order_by('id').values(
+                'id', 'user_id', 'strategy_id', 'log_type', 'message', 'details', 'timestamp'
+            ).iterator(chunk_size=CHUNK_SIZE)
+            for row in rows:
+                day = timezone.localtime(row['timestamp']).date()
+                archive = files.get(day)
+                if archive is None:
+                    archived_ids[day] = {logged['id'] for logged in read_archive(day)}
+                    archive = files[day] = _open_temp_archive(day)
+                # Already archived by a run that stopped before its delete
+                if row['id'] in archived_ids[day]:
+                    continue
+                row['timestamp'] = row['timestamp'].isoformat()
+                archive.write(json.dumps(row, ensure_ascii=False) + '\n')
+                archived[day] = archived.get(day, 0) + 1
+        except BaseException:
+            for day, archive in files.items():
+                archive.close()
+                os.remove(temp_archive_path(day))
+            raise
+        for day, archive in files.items():
+            archive.close()
+            os.replace(temp_archive_path(day), archive_path(day))
+
+        # Everything read above is on disk; drop it in one statement
+        with transaction.atomic():
+            expired.delete()
+    return archived
+
+
+def drop_expired_archives(today=None, dry_run=False):
+    """Delete whole day archives older than BOT_LOG_ARCHIVE_DAYS; returns the days removed"""
+    today = today or timezone.localdate()
+    oldest = today - timedelta(days=getattr(settings, 'BOT_LOG_ARCHIVE_DAYS', 90))
+    directory = settings.BOT_LOG_ARCHIVE_DIR
+    if not os.path.isdir(directory):
+        return []
+    dropped = []
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(ARCHIVE_SUFFIX):
+            continue
+        try:
+            day = date.fromisoformat(name[:-len(ARCHIVE_SUFFIX)])
+        except ValueError:
+            continue
+        if day < oldest:
+            if not dry_run:
+                os.remove(os.path.join(directory, name))
+            dropped.append(day)
+    return dropped
+
+
+def read_archive(day):
+    """Yield the archived rows of one day"""
+    path = archive_path(day)
+    if not os.path.exists(path):
+        return
+    with gzip.open(path, 'rt', encoding='utf-8') as archive:
+        for line in archive:
+            yield json.loads(line)
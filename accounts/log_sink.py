@@ -0,0 +1,253 @@
+"""
+Batched, asynchronous BotLog writer.
+
+bot_log() queues a BotLog row in memory and returns immediately; a
+background thread writes queued rows with bulk_create once FLUSH_SIZE are
+waiting or FLUSH_INTERVAL seconds after the oldest one arrived. The queue
+is bounded: when it is full new rows are dropped and counted rather than
+blocking the trading thread. Rows keep the time they were logged, not the
+time they were written.
+
+Routine log types are thinned according to settings.BOT_LOG_LEVELS: a
+sampled row carries how many similar rows were skipped before it, and every
+BOT_LOG_SUMMARY_SECONDS one INFO row per user sums up what was skipped.
+Rows about orders and trade decisions are never thinned, whatever their type.
+
+Each row written is also published on the event bus as 'bot_log' (see
+log_event) for live viewers such as the monitoring page's event stream, and
+announced to streams in other processes (see event_sequence).
+"""
+import atexit
+import queue
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .event_bus import bus
+from .event_sequence import announce
+from .models import BotLog
+
+# Rows held in memory before new ones are dropped
+QUEUE_SIZE = 10000
+
+# Write when this many rows are waiting, or this many seconds after the oldest one
+FLUSH_SIZE = 200
+FLUSH_INTERVAL = 1.0
+
+# Kept in full whatever BOT_LOG_LEVELS says
+ALWAYS_LOGGED = {'SIGNAL_GENERATED', 'TRADE_EXECUTED', 'TRADE_FAILED', 'ERROR'}
+
+# Rows whose details carry one of these keys are about orders (take profit, stop loss)
+# or trade decisions (direction skips) and are kept in full too
+ALWAYS_LOGGED_DETAILS = ('order_type', 'trade_direction')
+
+
+class LogSink:
+    def __init__(self, queue_size=QUEUE_SIZE, flush_size=FLUSH_SIZE, flush_interval=FLUSH_INTERVAL):
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.dropped = 0  # rejected because the queue was full
+        self.failed = 0   # could not be written
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self.suppressed = Counter()  # (user_id, log_type) -> rows skipped since the last summary
+        self._samples = {}           # sample key -> [last kept at, skipped since]
+        self._sample_lock = threading.Lock()
+        self._last_summary = time.monotonic()
+
+    def log(self, **fields):
+        """Queue a BotLog row built from `fields`; returns False if it was filtered out or dropped"""
+        if not self._admit(fields):
+            return False
+        fields.setdefault('timestamp', timezone.now())
+        return self._enqueue(BotLog(**fields))
+
+    def flush(self):
+        """Write everything queued so far on the calling thread"""
+        batch = []
+        while True:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        self._write(batch)
+
+    def close(self):
+        """Stop the writer thread after it has written what is queued"""
+        self._stopped.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+        self._summarize(force=True)
+        self.flush()
+
+    def stats(self):
+        return {
+            'queued': self.queue.qsize(),
+            'written': self.written,
+            'dropped': self.dropped,
+            'failed': self.failed,
+            'suppressed': sum(self.suppressed.values()),
+        }
+
+    def _enqueue(self, log):
+        self._ensure_started()
+        try:
+            self.queue.put_nowait(log)
+        except queue.Full:
+            self.dropped += 1
+            return False
+        return True
+
+    def _admit(self, fields):
+        """Apply the verbosity level of the row's log type, noting what is skipped"""
+        log_type = fields.get('log_type')
+        if log_type in ALWAYS_LOGGED:
+            return True
+        details = fields.get('details') or {}
+        if any(key in details for key in ALWAYS_LOGGED_DETAILS):
+            return True
+        level = getattr(settings, 'BOT_LOG_LEVELS', {}).get(log_type, 'all')
+        if level == 'all':
+            return True
+
+        user = fields.get('user')
+        user_id = user.id if user is not None else fields.get('user_id')
+        if level == 'off':
+            with self._sample_lock:
+                self.suppressed[(user_id, log_type)] += 1
+            return False
+
+        strategy = fields.get('strategy')
+        key = (
+            log_type,
+            user_id,
+            strategy.id if strategy is not None else fields.get('strategy_id'),
+            details.get('symbol'),
+        )
+        now = time.monotonic()
+        with self._sample_lock:
+            sample = self._samples.get(key)
+            if sample is not None and now - sample[0] < getattr(settings, 'BOT_LOG_SAMPLE_SECONDS', 60):
+                sample[1] += 1
+                self.suppressed[(user_id, log_type)] += 1
+                return False
+            skipped = sample[1] if sample is not None else 0
+            self._samples[key] = [now, 0]
+        if skipped:
+            fields['details'] = dict(fields.get('details') or {}, skipped_since_last=skipped)
+        return True
+
+    def _summarize(self, force=False):
+        """Queue one INFO row per user counting the rows skipped since the last summary"""
+        now = time.monotonic()
+        window = now - self._last_summary
+        if not force and window < getattr(settings, 'BOT_LOG_SUMMARY_SECONDS', 300):
+            return
+        sample_seconds = getattr(settings, 'BOT_LOG_SAMPLE_SECONDS', 60)
+        with self._sample_lock:
+            suppressed, self.suppressed = self.suppressed, Counter()
+            self._last_summary = now
+            # Forget sample keys that have gone quiet
+            self._samples = {
+                key: sample for key, sample in self._samples.items()
+                if now - sample[0] < sample_seconds or sample[1]
+            }
+        by_user = {}
+        for (user_id, log_type), count in suppressed.items():
+            by_user.setdefault(user_id, {})[log_type] = count
+        for user_id, counts in by_user.items():
+            summary = ', '.join(f'{log_type} {count}' for log_type, count in sorted(counts.items()))
+            self._enqueue(BotLog(
+                user_id=user_id,
+                log_type='INFO',
+                message=f'📊 Routine logs skipped in the last {window / 60:.1f} min: {summary}',
+                details={'suppressed': counts, 'window_seconds': round(window)},
+                timestamp=timezone.now(),
+            ))
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='bot-log-sink', daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._summarize()
+            try:
+                batch = [self.queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.flush_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._write(batch)
+
+    def _write(self, batch):
+        if not batch:
+            return
+        with self._write_lock:
+            close_old_connections()
+            written = batch
+            try:
+                with transaction.atomic():
+                    BotLog.objects.bulk_create(batch)
+                self.written += len(batch)
+            except Exception as e:
+                # One bad row (e.g. a strategy deleted meanwhile) should not lose the batch
+                print(f"❌ Bulk log write failed, retrying rows one by one: {e}")
+                written = []
+                for log in batch:
+                    try:
+                        log.pk = None
+                        log.save()
+                        self.written += 1
+                        written.append(log)
+                    except Exception:
+                        self.failed += 1
+            finally:
+                close_old_connections()
+            if bus.has_subscribers('bot_log'):
+                for log in written:
+                    bus.publish('bot_log', log_event(log))
+            # Event streams in other processes pick the rows up from the database
+            announce([log.user_id for log in written], 'bot_log')
+
+
+def log_event(log):
+    """JSON-ready form of a BotLog row, as served to the monitoring page"""
+    return {
+        'id': log.id,
+        'user_id': log.user_id,
+        'log_type': log.log_type,
+        'message': log.message,
+        'details': log.details,
+        'timestamp': log.timestamp.strftime('%Y-%m-%d %H:%M:%S'),
+        'strategy_name': log.strategy.name if log.strategy_id else None
+    }
+
+
+# Shared sink for the process
+log_sink = LogSink()
+
+
+def bot_log(**fields):
+    """Queue a BotLog row on the shared sink"""
+    return log_sink.log(**fields)
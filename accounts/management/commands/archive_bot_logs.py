@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from accounts.log_retention import compact, drop_expired_archives
+import logging
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = ('Move bot logs past their retention into daily compressed archives and delete '
+            'expired archives. Run daily, e.g. from cron.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report what would be archived and dropped without changing anything'
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        prefix = '[dry run] ' if dry_run else ''
+
+        try:
+            archived = compact(dry_run=dry_run)
+            for day, count in sorted(archived.items()):
+                self.stdout.write(f'{prefix}Archived {count} logs from {day}')
+
+            dropped = drop_expired_archives(dry_run=dry_run)
+            for day in dropped:
+                self.stdout.write(f'{prefix}Dropped archive for {day}')
+
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f'{prefix}{sum(archived.values())} logs archived, {len(dropped)} expired archives dropped'
+                )
+            )
+        except Exception as e:
+            logger.error(f'Error archiving bot logs: {str(e)}')
+            self.stdout.write(self.style.ERROR(f'Error archiving bot logs: {str(e)}'))
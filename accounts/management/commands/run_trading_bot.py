@@ -2,7 +2,9 @@ from django.core.management.base import BaseCommand
 from django.contrib.auth.models import User
 from accounts.models import Strategy
 from accounts.upstox_api import TradingBot
-import time
+from accounts.scheduler import StrategyScheduler
+from accounts.market_hours import closed_candles
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
@@ -15,7 +17,13 @@ class Command(BaseCommand):
             '--interval',
             type=int,
             default=60,
-            help='Interval in seconds between strategy checks (default: 60)'
+            help='Seconds between reloads of running strategies, and the candle length for unknown timeframes (default: 60)'
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=8,
+            help='Maximum strategy groups checked at once (default: 8)'
         )
         parser.add_argument(
             '--user',
@@ -31,52 +39,76 @@ class Command(BaseCommand):
             self.style.SUCCESS(f'Starting trading bot with {interval}s interval...')
         )
         
-        bot = TradingBot()
+        bots = {}  # One TradingBot per user so each uses its own Upstox tokens
         
-        while True:
-            try:
-                # Get running strategies
-                strategies = Strategy.objects.filter(status='RUNNING')
-                
-                if user_filter:
-                    strategies = strategies.filter(user__username=user_filter)
-                
-                if not strategies.exists():
-                    self.stdout.write('No running strategies found.')
-                    time.sleep(interval)
-                    continue
-                
-                self.stdout.write(f'Checking {strategies.count()} running strategies...')
-                
-                for strategy in strategies:
-                    try:
-                        # Set user for the bot
-                        bot.user = strategy.user
-                        
-                        # Run the strategy
-                        bot.run_strategy(strategy)
-                        
-                        self.stdout.write(
-                            f'Strategy "{strategy.name}" checked - Signal: {strategy.last_signal or "None"}'
-                        )
-                        
-                    except Exception as e:
-                        logger.error(f'Error running strategy {strategy.name}: {str(e)}')
-                        self.stdout.write(
-                            self.style.ERROR(f'Error running strategy {strategy.name}: {str(e)}')
-                        )
-                
-                # Wait before next check
-                time.sleep(interval)
-                
-            except KeyboardInterrupt:
-                self.stdout.write(
-                    self.style.WARNING('\nTrading bot stopped by user.')
-                )
-                break
-            except Exception as e:
-                logger.error(f'Unexpected error in trading bot: {str(e)}')
+        def load_strategies():
+            strategies = Strategy.objects.filter(status='RUNNING').select_related('setup', 'user')
+            if user_filter:
+                strategies = strategies.filter(user__username=user_filter)
+            return strategies
+        
+        def price_groups(keys):
+            # Price every due symbol with bulk quotes using the first account that has a token
+            users = {strategy.user for key in keys for strategy in scheduler.groups.get(key, [])}
+            price_bot = next(
+                (b for b in (self._get_bot(bots, user) for user in users) if b.upstox.access_token),
+                None
+            )
+            return price_bot.get_live_prices([symbol for symbol, _ in keys]) if price_bot else {}
+        
+        def check_group(key, group, prices):
+            symbol, timeframe = key
+            # Any group member with an Upstox token can fetch for the whole group
+            group_bots = [self._get_bot(bots, strategy.user) for strategy in group]
+            fetch_bot = next((b for b in group_bots if b.upstox.access_token), group_bots[0])
+            data = fetch_bot.get_market_data_for_analysis(
+                symbol, timeframe, current_price=(prices or {}).get(symbol)
+            )
+            if data is not None:
+                # Decide on the candle that just closed, not one that opened a moment ago
+                data = closed_candles(data, timeframe)
+            if data is None or data.empty:
                 self.stdout.write(
-                    self.style.ERROR(f'Unexpected error: {str(e)}')
+                    self.style.WARNING(f'No market data for {symbol} ({timeframe}), skipping {len(group)} strategies')
                 )
-                time.sleep(interval) 
\ No newline at end of file
+                return
+            
+            for strategy in group:
+                try:
+                    # Run the strategy on the shared data
+                    self._get_bot(bots, strategy.user).run_strategy(strategy, data, price=(prices or {}).get(symbol))
+                    
+                    self.stdout.write(
+                        f'Strategy "{strategy.name}" checked - Signal: {strategy.last_signal or "None"}'
+                    )
+                    
+                except Exception as e:
+                    logger.error(f'Error running strategy {strategy.name}: {str(e)}')
+                    self.stdout.write(
+                        self.style.ERROR(f'Error running strategy {strategy.name}: {str(e)}')
+                    )
+        
+        # Each (symbol, timeframe) group runs when its candle closes in the NSE session; --interval sets how often
+        # running strategies are reloaded and the candle length for unrecognised timeframes
+        scheduler = StrategyScheduler(
+            load_strategies,
+            check_group,
+            prefetch=price_groups,
+            max_concurrency=options['concurrency'],
+            refresh_interval=interval,
+            default_period=interval,
+        )
+        
+        try:
+            asyncio.run(scheduler.run())
+        except KeyboardInterrupt:
+            self.stdout.write(
+                self.style.WARNING('\nTrading bot stopped by user.')
+            )
+
+    def _get_bot(self, bots, user):
+        """Return the cached TradingBot for a user"""
+        key = user.id if user else None
+        if key not in bots:
+            bots[key] = TradingBot(user)
+        return bots[key]
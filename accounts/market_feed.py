@@ -0,0 +1,232 @@
+"""
+Upstox market data feed client.
+
+Keeps a websocket to the Upstox market data feed subscribed to the
+instruments of running strategies and publishes every price update on the
+event bus as a 'tick':
+
+    {'instrument_key': 'NSE_EQ|INE002A01018', 'ltp': 2950.5, 'ltq': 10,
+     'close_price': 2940.0, 'timestamp': <aware datetime>}
+
+Upstox sends protobuf frames, decoded with the generated classes shipped in
+upstox-python-sdk; JSON frames (as sent by the local replay server used in
+test_market_feed.py) are decoded directly. Both websocket-client and the SDK
+are optional: without them the bot simply keeps pricing over REST.
+"""
+import json
+import threading
+import uuid
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .event_bus import bus as default_bus
+from .models import Strategy
+
+try:
+    import websocket
+except ImportError:
+    websocket = None
+
+try:
+    from google.protobuf.json_format import MessageToDict
+    from upstox_client.feeder.proto import MarketDataFeed_pb2
+except ImportError:
+    MarketDataFeed_pb2 = None
+
+# Feed mode requested for every instrument: last traded price, time, quantity and close
+FEED_MODE = 'ltpc'
+
+# How often the subscription list is reconciled with running strategies (seconds)
+SUBSCRIPTION_REFRESH_SECONDS = 30
+
+# Reconnect backoff bounds (seconds)
+RECONNECT_DELAY = 1
+MAX_RECONNECT_DELAY = 60
+
+
+def decode_feed_message(message):
+    """Decode one feed frame into a dict, or None if it cannot be decoded"""
+    if isinstance(message, str):
+        message = message.encode()
+    if message[:1] == b'{':
+        try:
+            return json.loads(message)
+        except ValueError:
+            return None
+    if MarketDataFeed_pb2 is None:
+        return None
+    feed = MarketDataFeed_pb2.FeedResponse()
+    try:
+        feed.ParseFromString(message)
+    except Exception:
+        return None
+    return MessageToDict(feed)
+
+
+def parse_ticks(message):
+    """Flatten a decoded feed message into tick dicts"""
+    ticks = []
+    for instrument_key, feed in ((message or {}).get('feeds') or {}).items():
+        full_feed = feed.get('ff') or {}
+        ltpc = (
+            feed.get('ltpc')
+            or (full_feed.get('marketFF') or {}).get('ltpc')
+            or (full_feed.get('indexFF') or {}).get('ltpc')
+        )
+        if not ltpc or ltpc.get('ltp') is None:
+            continue
+        # ltt is the last trade time in epoch milliseconds (a string in protobuf JSON)
+        ltt = ltpc.get('ltt')
+        ticks.append({
+            'instrument_key': instrument_key,
+            'ltp': float(ltpc['ltp']),
+            'ltq': int(ltpc.get('ltq') or 0),
+            'close_price': float(ltpc.get('cp') or 0),
+            'timestamp': datetime.fromtimestamp(int(ltt) / 1000, tz=dt_timezone.utc) if ltt else timezone.now(),
+        })
+    return ticks
+
+
+class MarketFeedClient:
+    def __init__(self, upstox, user=None, bus=None, url=None, mode=FEED_MODE, follow_strategies=True):
+        """
+        upstox: UpstoxAPI used to authorize the feed; url skips authorization
+        (e.g. a local replay server). user limits subscriptions to that user's
+        strategies; with follow_strategies=False only sync_subscriptions() changes them.
+        """
+        self.upstox = upstox
+        self.user = user
+        self.bus = bus or default_bus
+        self.url = url
+        self.mode = mode
+        self.follow_strategies = follow_strategies
+
+        self.instruments = set()
+        self.ticks_received = 0
+        self.last_tick_at = None
+        self.connected = threading.Event()
+        self._ws = None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._threads = []
+
+    def start(self):
+        """Connect in the background and keep subscriptions in step with running strategies"""
+        if websocket is None:
+            print("⚠️ websocket-client is not installed; market feed disabled")
+            return False
+        self._stopped.clear()
+        self._threads = [threading.Thread(target=self._run, daemon=True)]
+        if self.follow_strategies:
+            self._threads.append(threading.Thread(target=self._sync_loop, daemon=True))
+        for thread in self._threads:
+            thread.start()
+        return True
+
+    def stop(self):
+        self._stopped.set()
+        ws = self._ws
+        if ws:
+            ws.close()
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self.connected.clear()
+
+    def running_instruments(self):
+        """Instrument keys of every running strategy (of self.user, if set)"""
+        strategies = Strategy.objects.filter(status='RUNNING')
+        if self.user:
+            strategies = strategies.filter(user=self.user)
+        return set(strategies.values_list('setup__symbol', flat=True).distinct())
+
+    def sync_subscriptions(self, instruments=None):
+        """Subscribe to newly needed instruments and drop ones no strategy uses any more"""
+        if instruments is None:
+            instruments = self.running_instruments()
+        instruments = set(instruments)
+        with self._lock:
+            added = instruments - self.instruments
+            removed = self.instruments - instruments
+            self.instruments = instruments
+        if removed:
+            self._send('unsub', removed)
+        if added:
+            self._send('sub', added)
+        return added, removed
+
+    def _send(self, method, instruments):
+        """Send a subscription request; skipped while disconnected since on_open resubscribes everything"""
+        ws = self._ws
+        if not instruments or ws is None or not self.connected.is_set():
+            return False
+        request = {
+            'guid': uuid.uuid4().hex,
+            'method': method,
+            'data': {'instrumentKeys': sorted(instruments)},
+        }
+        if method == 'sub':
+            request['data']['mode'] = self.mode
+        try:
+            ws.send(json.dumps(request).encode(), opcode=websocket.ABNF.OPCODE_BINARY)
+        except Exception as e:
+            print(f"❌ Market feed {method} failed: {e}")
+            return False
+        return True
+
+    def _sync_loop(self):
+        while not self._stopped.is_set():
+            close_old_connections()
+            try:
+                self.sync_subscriptions()
+            except Exception as e:
+                print(f"❌ Market feed subscription sync failed: {e}")
+            finally:
+                close_old_connections()
+            self._stopped.wait(SUBSCRIPTION_REFRESH_SECONDS)
+
+    def _run(self):
+        delay = RECONNECT_DELAY
+        while not self._stopped.is_set():
+            url = self.url or self.upstox.get_market_feed_url()
+            if url:
+                self._ws = websocket.WebSocketApp(
+                    url,
+                    on_open=self._on_open,
+                    on_message=self._on_message,
+                    on_error=self._on_error,
+                    on_close=self._on_close,
+                )
+                connected_before = self.ticks_received
+                self._ws.run_forever(ping_interval=30, ping_timeout=10)
+                if self.ticks_received > connected_before:
+                    delay = RECONNECT_DELAY
+            else:
+                print("⚠️ Could not authorize the market data feed")
+            self._ws = None
+            self.connected.clear()
+            if self._stopped.wait(delay):
+                break
+            delay = min(delay * 2, MAX_RECONNECT_DELAY)
+
+    def _on_open(self, ws):
+        self.connected.set()
+        print("📡 Market feed connected")
+        with self._lock:
+            instruments = set(self.instruments)
+        self._send('sub', instruments)
+
+    def _on_message(self, ws, message):
+        for tick in parse_ticks(decode_feed_message(message)):
+            self.ticks_received += 1
+            self.last_tick_at = tick['timestamp']
+            self.bus.publish('tick', tick)
+
+    def _on_error(self, ws, error):
+        print(f"❌ Market feed error: {error}")
+
+    def _on_close(self, ws, status_code, reason):
+        self.connected.clear()
+        if not self._stopped.is_set():
+            print(f"⚠️ Market feed closed ({status_code}); reconnecting")
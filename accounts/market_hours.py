@@ -0,0 +1,139 @@
+"""
+NSE session calendar.
+
+The cash session runs 09:15-15:30 IST on weekdays that are not listed in
+settings.MARKET_HOLIDAYS. Intraday candles are aligned to the 09:15 open,
+so a 1h strategy closes candles at 10:15, 11:15, ... and the last, shorter
+candle at 15:30; daily candles close with the session.
+"""
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from functools import lru_cache
+
+from django.conf import settings
+from django.utils import timezone
+
+# India has no daylight saving, so a fixed offset is exact
+IST = dt_timezone(timedelta(hours=5, minutes=30), 'IST')
+
+SESSION_OPEN = time(9, 15)
+SESSION_CLOSE = time(15, 30)
+
+# Candle length in minutes per timeframe; None closes with the session
+TIMEFRAME_MINUTES = {
+    '1m': 1,
+    '5m': 5,
+    '15m': 15,
+    '30m': 30,
+    '1h': 60,
+    '1d': None,
+    '1D': None,
+}
+
+
+def holidays():
+    """Exchange holidays from settings, as dates"""
+    return _parse_holidays(tuple(getattr(settings, 'MARKET_HOLIDAYS', [])))
+
+
+@lru_cache(maxsize=4)
+def _parse_holidays(days):
+    return frozenset(day if isinstance(day, date) else date.fromisoformat(day) for day in days)
+
+
+def is_trading_day(day, holiday_dates=None):
+    if holiday_dates is None:
+        holiday_dates = holidays()
+    return day.weekday() < 5 and day not in holiday_dates
+
+
+def session_bounds(day):
+    """(open, close) of the session on `day` as aware IST datetimes"""
+    return (
+        datetime.combine(day, SESSION_OPEN, tzinfo=IST),
+        datetime.combine(day, SESSION_CLOSE, tzinfo=IST),
+    )
+
+
+def is_market_open(now=None):
+    now = (now or timezone.now()).astimezone(IST)
+    if not is_trading_day(now.date()):
+        return False
+    open_at, close_at = session_bounds(now.date())
+    return open_at <= now < close_at
+
+
+def candle_start(timeframe, timestamp, default_minutes=None):
+    """Start of the session-aligned candle containing `timestamp`, or None outside the session"""
+    timestamp = timestamp.astimezone(IST)
+    if not is_trading_day(timestamp.date()):
+        return None
+    open_at, close_at = session_bounds(timestamp.date())
+    if not open_at <= timestamp < close_at:
+        return None
+    minutes = TIMEFRAME_MINUTES.get(timeframe, default_minutes)
+    if not minutes:
+        return open_at
+    step = timedelta(minutes=minutes)
+    return open_at + (timestamp - open_at) // step * step
+
+
+def candle_timestamp(timeframe, timestamp, default_minutes=None):
+    """
+    Timestamp the candle containing `timestamp` is stored under: its start
+    for intraday candles, and midnight IST of its date for daily candles,
+    as Upstox and the candle store stamp them. None outside the session.
+    """
+    start = candle_start(timeframe, timestamp, default_minutes)
+    if start is None or TIMEFRAME_MINUTES.get(timeframe, default_minutes):
+        return start
+    return datetime.combine(start.date(), time.min, tzinfo=IST)
+
+
+def is_current_candle(timeframe, timestamp, now=None):
+    """Whether a candle starting at `timestamp` is the one forming now; False outside the session"""
+    start = candle_start(timeframe, now or timezone.now())
+    if start is None:
+        return False
+    if not TIMEFRAME_MINUTES.get(timeframe):
+        # Daily candles are stamped with their date, not the session open
+        return timestamp.astimezone(IST).date() >= start.date()
+    return timestamp >= start
+
+
+def closed_candles(data, timeframe, now=None):
+    """
+    `data` without the candle forming at `now`. A check just after a close
+    can already see the candle that opened seconds ago, and must decide on
+    the one that closed. Frames on naive timestamps are returned unchanged.
+    """
+    start = candle_timestamp(timeframe, now or timezone.now())
+    if start is None or len(data) == 0 or data.index.tz is None:
+        return data
+    return data[data.index < start]
+
+
+def next_candle_close(timeframe, now=None, default_minutes=None):
+    """
+    First candle close strictly after `now` for a timeframe, skipping
+    weekends and holidays. Unknown timeframes use default_minutes, or close
+    with the session when that is None.
+    """
+    now = (now or timezone.now()).astimezone(IST)
+    minutes = TIMEFRAME_MINUTES.get(timeframe, default_minutes)
+    holiday_dates = holidays()
+
+    day = now.date()
+    for _ in range(366):
+        if is_trading_day(day, holiday_dates):
+            open_at, close_at = session_bounds(day)
+            if minutes:
+                step = timedelta(minutes=minutes)
+                candles = (now - open_at) // step + 1 if now >= open_at else 1
+                candidate = min(open_at + candles * step, close_at)
+            else:
+                candidate = close_at
+            if candidate > now:
+                return candidate
+        day += timedelta(days=1)
+        now = datetime.combine(day, time.min, tzinfo=IST)
+    return None
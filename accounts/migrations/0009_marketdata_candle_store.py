@@ -0,0 +1,28 @@
+# Generated by Django 4.1.5 on 2026-10-18 13:22
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0008_strategy_stop_loss_percentage_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='marketdata',
+            name='interval',
+            field=models.CharField(default='1D', max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='marketdata',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddConstraint(
+            model_name='marketdata',
+            constraint=models.UniqueConstraint(fields=('symbol', 'interval', 'timestamp'), name='unique_candle'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.1.5 on 2026-10-18 14:05
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0009_marketdata_candle_store'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='botlog',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
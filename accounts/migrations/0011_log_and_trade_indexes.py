@@ -0,0 +1,27 @@
+# Generated by Django 4.1.5 on 2026-10-18 15:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0010_botlog_timestamp_default'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='botlog',
+            index=models.Index(fields=['user', '-timestamp'], name='botlog_user_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='botlog',
+            index=models.Index(fields=['strategy', '-timestamp'], name='botlog_strategy_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trade',
+            index=models.Index(fields=['user', 'status', 'created_at'], name='trade_user_status_created_idx'),
+        ),
+    ]
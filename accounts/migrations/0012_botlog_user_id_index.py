@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:17
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0011_log_and_trade_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='botlog',
+            index=models.Index(fields=['user', '-id'], name='botlog_user_id_idx'),
+        ),
+    ]
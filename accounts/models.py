@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import User
 
 class SignIn(models.Model):
@@ -76,6 +77,11 @@ class Trade(models.Model):
     executed_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'status', 'created_at'], name='trade_user_status_created_idx'),
+        ]
+
     def __str__(self):
         return f"{self.trade_type} {self.quantity} {self.symbol} at {self.price}"
 
@@ -101,15 +107,19 @@ class Strategy(models.Model):
 
 class MarketData(models.Model):
     symbol = models.CharField(max_length=50)
+    interval = models.CharField(max_length=10, default='1D')
     open_price = models.DecimalField(max_digits=10, decimal_places=2)
     high_price = models.DecimalField(max_digits=10, decimal_places=2)
     low_price = models.DecimalField(max_digits=10, decimal_places=2)
     close_price = models.DecimalField(max_digits=10, decimal_places=2)
     volume = models.BigIntegerField()
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(default=timezone.now)
 
     class Meta:
         ordering = ['-timestamp']
+        constraints = [
+            models.UniqueConstraint(fields=['symbol', 'interval', 'timestamp'], name='unique_candle'),
+        ]
 
     def __str__(self):
         return f"{self.symbol} - {self.close_price} at {self.timestamp}"
@@ -132,10 +142,16 @@ class BotLog(models.Model):
     log_type = models.CharField(max_length=20, choices=LOG_TYPES)
     message = models.TextField()
     details = models.JSONField(null=True, blank=True)  # Store additional data like prices, signals, etc.
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(default=timezone.now)  # Set when logged, not when a batch is written
 
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['user', '-timestamp'], name='botlog_user_time_idx'),
+            # The log poll, its since_id/after_id pages and the event stream catch-up order by id
+            models.Index(fields=['user', '-id'], name='botlog_user_id_idx'),
+            models.Index(fields=['strategy', '-timestamp'], name='botlog_strategy_time_idx'),
+        ]
 
     def __str__(self):
         return f"{self.log_type}: {self.message[:50]} at {self.timestamp}"
\ No newline at end of file
@@ -0,0 +1,194 @@
+"""
+Client-side rate limiting for the Upstox API.
+
+Every request is counted against each window of its group ('order' for the
+order endpoints, 'data' for everything else) before it is sent, with the
+per-second and per-minute allowance from settings.UPSTOX_RATE_LIMITS. The
+windows slide: each is split into SLOTS slots, and a request is admitted
+only if the slots covering the last window, plus the one it started in,
+hold fewer requests than the limit. So no span of one window ever sees more
+than the limit, where fixed windows let up to twice through across a window
+edge. Slot counts live in the shared cache (incr with an expiry), so every
+thread and process using the same account draws from the same allowance.
+
+Order placement and cancellation run in a priority lane:
+- reads of the order group (status, history) may only use the part of each
+  order window outside UPSTOX_ORDER_RESERVE;
+- while a priority request waits in a process, the same account's other
+  requests of that group in the process hold back, waiting on a condition
+  until it has gone.
+
+A 429 from Upstox blocks the group for the account until its Retry-After
+has passed. A caller with a deadline is turned away at once when it could
+not be admitted in time, rather than sleeping past it. stats() reports time
+spent waiting on the limiter, the 429s seen and the requests given up.
+"""
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+
+from .shared_cache import shared_cache
+
+WINDOWS = {'second': 1, 'minute': 60}
+
+# Slots each window is split into; a window admits up to 1/SLOTS less than its limit at worst
+SLOTS = 10
+
+# Longest single sleep while waiting for a slot, so blocks lifted early are noticed (seconds)
+MAX_SLEEP = 0.25
+
+# Wait applied after a 429 that carried no usable Retry-After (seconds)
+DEFAULT_RETRY_AFTER = 1.0
+
+
+class RateLimiter:
+    def __init__(self, backend, limits, order_reserve=0.0):
+        self.backend = backend
+        self.limits = {
+            group: {WINDOWS[name]: limit for name, limit in windows.items()}
+            for group, windows in limits.items()
+        }
+        self.order_reserve = order_reserve
+        self.requests = Counter()      # group -> requests admitted
+        self.waits = Counter()         # group -> requests that had to wait
+        self.wait_seconds = Counter()  # group -> total time spent waiting
+        self.max_wait = Counter()      # group -> longest single wait
+        self.throttled = Counter()     # group -> 429 responses
+        self.expired = Counter()       # group -> requests given up at their deadline
+        self._priority_waiting = Counter()  # (account, group) -> priority requests waiting in this process
+        self._lock = threading.Lock()
+        self._priority_done = threading.Condition(self._lock)
+
+    def acquire(self, account, group, priority=False, deadline=None):
+        """
+        Block until a request of `group` may be sent for `account`; returns the
+        seconds waited, or None without waiting when it could not be sent
+        before `deadline` (a time.time() value).
+        """
+        if group not in self.limits:
+            return 0.0
+        started = time.monotonic()
+        slept = False
+        lane = (account, group)
+        if priority:
+            with self._lock:
+                self._priority_waiting[lane] += 1
+        try:
+            while True:
+                if not priority:
+                    with self._priority_done:
+                        while self._priority_waiting[lane]:
+                            if deadline is not None and time.time() >= deadline:
+                                self.expired[group] += 1
+                                return None
+                            slept = True
+                            self._priority_done.wait(None if deadline is None else deadline - time.time())
+                delay = self._take(account, group, priority)
+                if delay <= 0:
+                    break
+                if deadline is not None and time.time() + delay > deadline:
+                    with self._lock:
+                        self.expired[group] += 1
+                    return None
+                time.sleep(min(delay, MAX_SLEEP))
+                slept = True
+        finally:
+            if priority:
+                with self._lock:
+                    self._priority_waiting[lane] -= 1
+                    if not self._priority_waiting[lane]:
+                        del self._priority_waiting[lane]
+                        self._priority_done.notify_all()
+
+        waited = time.monotonic() - started if slept else 0.0
+        with self._lock:
+            self.requests[group] += 1
+            if slept:
+                self.waits[group] += 1
+                self.wait_seconds[group] += waited
+                self.max_wait[group] = max(self.max_wait[group], waited)
+        return waited
+
+    def throttle(self, account, group, retry_after=None):
+        """Record a 429 and hold back `group` for `account` in every process until Retry-After passes"""
+        try:
+            retry_after = float(retry_after)
+        except (TypeError, ValueError):
+            retry_after = DEFAULT_RETRY_AFTER
+        retry_after = max(retry_after, 0.0) or DEFAULT_RETRY_AFTER
+        with self._lock:
+            self.throttled[group] += 1
+        try:
+            self.backend.set(self._key(account, group, 'blocked'), time.time() + retry_after, retry_after)
+        except Exception as e:
+            print(f"DEBUG: Could not share rate limit block: {e}")
+        return retry_after
+
+    def stats(self):
+        """Requests, waits, 429s and expired requests per group in this process"""
+        with self._lock:
+            return {
+                group: {
+                    'requests': self.requests[group],
+                    'waits': self.waits[group],
+                    'wait_seconds': round(self.wait_seconds[group], 3),
+                    'max_wait': round(self.max_wait[group], 3),
+                    'throttled': self.throttled[group],
+                    'expired': self.expired[group],
+                }
+                for group in self.limits
+            }
+
+    def _take(self, account, group, priority):
+        """Count a request in every window of `group`; 0 on success, else seconds until one has room"""
+        now = time.time()
+        try:
+            blocked_until = self.backend.get(self._key(account, group, 'blocked'))
+            if blocked_until and blocked_until > now:
+                return blocked_until - now
+            taken = []
+            for window, limit in self.limits[group].items():
+                if group == 'order' and not priority:
+                    limit = int(limit * (1 - self.order_reserve))
+                slot = window / SLOTS
+                current = int(now * SLOTS // window)  # not now // slot, which float error can put in the slot before
+                # Earlier slots only change when a request gives its count back, so read them first
+                earlier = [self._key(account, group, window, index) for index in range(current - SLOTS, current)]
+                counts = self.backend.get_many(earlier)
+                key = self._key(account, group, window, current)
+                taken.append((key, window))
+                total = sum(counts.values()) + self.backend.incr(key, 1, window + 2 * slot)
+                if total > limit:
+                    # Give back what was taken so the counts only hold requests actually sent
+                    for taken_key, taken_window in taken:
+                        self.backend.incr(taken_key, -1, taken_window + 2 * taken_window / SLOTS)
+                    return self._room_at(earlier, counts, total - limit, current, slot) - now
+        except Exception as e:
+            # Without the shared counts, let the request through rather than stall trading
+            print(f"DEBUG: Rate limiter unavailable: {e}")
+        return 0
+
+    @staticmethod
+    def _room_at(earlier, counts, excess, current, slot):
+        """When enough of the oldest slots have slid out of the window to make room for one more"""
+        for offset, key in enumerate(earlier):
+            excess -= counts.get(key, 0)
+            if excess <= 0:
+                # Slot current - SLOTS + offset leaves the window when slot current + offset + 1 begins
+                return (current + offset + 1) * slot
+        # The current slot alone is over the limit
+        return (current + SLOTS + 1) * slot
+
+    @staticmethod
+    def _key(account, group, *parts):
+        return ':'.join(['rate', str(account), group, *map(str, parts)])
+
+
+# Shared limiter for the process
+rate_limiter = RateLimiter(
+    shared_cache.backend,
+    getattr(settings, 'UPSTOX_RATE_LIMITS', {}),
+    getattr(settings, 'UPSTOX_ORDER_RESERVE', 0.0),
+)
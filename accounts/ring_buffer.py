@@ -0,0 +1,157 @@
+"""
+Fixed-capacity OHLCV ring buffers, one per (instrument, timeframe).
+
+Every row is written twice, at i and i + capacity, so the newest `size` rows
+are always one contiguous slice of each column: views() hands indicators
+plain NumPy views with no wrap-around handling, and appending never
+allocates. Memory per instrument is fixed however long the bot runs.
+
+A buffer asked for with a larger capacity grows in place, so everyone
+holding it keeps appending to the same object. Seeding history from disk
+happens under the buffer's own grow_lock, never the registry lock, so a
+slow seed only holds up callers of that one instrument.
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+
+FIELDS = ('open', 'high', 'low', 'close', 'volume')
+
+_buffers = {}
+_buffers_lock = threading.Lock()
+
+
+def _to_ns(timestamp):
+    if isinstance(timestamp, (int, np.integer)):
+        return int(timestamp)
+    return pd.Timestamp(timestamp).as_unit('ns').value
+
+
+class CandleRingBuffer:
+    __slots__ = ('capacity', 'timestamps', 'columns', 'written', 'size', 'lock', 'seeded', 'grow_lock')
+
+    def __init__(self, capacity):
+        self._allocate(capacity)
+        self.lock = threading.Lock()
+        self.seeded = 0  # capacity history was last seeded for
+        self.grow_lock = threading.Lock()
+
+    def _allocate(self, capacity):
+        self.capacity = capacity
+        self.timestamps = np.zeros(2 * capacity, dtype=np.int64)  # UTC nanoseconds
+        self.columns = np.zeros((len(FIELDS), 2 * capacity), dtype=np.float64)
+        self.written = 0  # rows ever appended
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def last_timestamp(self):
+        """UTC nanoseconds of the newest row, or None when empty"""
+        if not self.size:
+            return None
+        return int(self.timestamps[(self.written - 1) % self.capacity])
+
+    def append(self, timestamp, open, high, low, close, volume):
+        """
+        Add a candle. A candle with the newest timestamp replaces that row and
+        older candles are ignored, so overlapping fetches can be appended as-is.
+        """
+        with self.lock:
+            return self._append(_to_ns(timestamp), (open, high, low, close, volume))
+
+    def grow(self, capacity, history=None):
+        """
+        Resize in place to hold at least `capacity` rows. Rows of `history`, an
+        OHLCV DataFrame, go in below the rows already buffered.
+        """
+        with self.lock:
+            timestamps, columns = self.views()
+            rows = [(int(ts), tuple(columns[field][row] for field in FIELDS)) for row, ts in enumerate(timestamps)]
+            self._allocate(max(capacity, self.capacity))
+            if history is not None:
+                for timestamp, row in zip(history.index, history[list(FIELDS)].itertuples(index=False)):
+                    self._append(_to_ns(timestamp), tuple(row))
+            for ts, row in rows:
+                self._append(ts, row)
+
+    def _append(self, ts, row):
+        """append() with the lock held"""
+        last = self.last_timestamp
+        if last is not None and ts < last:
+            return False
+        if last is not None and ts == last:
+            self._write((self.written - 1) % self.capacity, ts, row)
+            return True
+        self._write(self.written % self.capacity, ts, row)
+        self.written += 1
+        self.size = min(self.size + 1, self.capacity)
+        return True
+
+    def update_last(self, high=None, low=None, close=None, volume=None):
+        """Update the newest candle in place, e.g. while it is still forming"""
+        with self.lock:
+            if not self.size:
+                return False
+            i = (self.written - 1) % self.capacity
+            for field, value in (('high', high), ('low', low), ('close', close), ('volume', volume)):
+                if value is not None:
+                    column = self.columns[FIELDS.index(field)]
+                    column[i] = column[i + self.capacity] = value
+            return True
+
+    def extend(self, frame):
+        """Append the rows of an ascending OHLCV DataFrame indexed by timestamp"""
+        for timestamp, row in zip(frame.index, frame[list(FIELDS)].itertuples(index=False)):
+            self.append(timestamp, *row)
+
+    def views(self, limit=None):
+        """Contiguous (timestamps, {field: column}) views of the newest `limit` rows, oldest first"""
+        size = min(limit or self.size, self.size)
+        end = (self.written - 1) % self.capacity + self.capacity + 1 if self.size else 0
+        start = end - size
+        return self.timestamps[start:end], {field: self.columns[i, start:end] for i, field in enumerate(FIELDS)}
+
+    def frame(self, limit=None):
+        """
+        OHLCV DataFrame of the newest `limit` rows. The columns are copied, one
+        contiguous block each, so later appends cannot change it under a caller.
+        """
+        with self.lock:
+            timestamps, columns = self.views(limit)
+            index = pd.DatetimeIndex(timestamps.copy().view('datetime64[ns]'), name='timestamp').tz_localize('UTC')
+            data = {field: column.copy() for field, column in columns.items()}
+        return pd.DataFrame(data, index=index, copy=False)
+
+    def _write(self, i, ts, row):
+        self.timestamps[i] = self.timestamps[i + self.capacity] = ts
+        self.columns[:, i] = self.columns[:, i + self.capacity] = row
+
+
+def get_buffer(symbol, timeframe, capacity, seed=None):
+    """
+    The shared buffer for (symbol, timeframe), holding at least `capacity` rows.
+    When the buffer is created or has to grow, seed() may return an OHLCV
+    DataFrame of older history to fill it; rows already buffered are kept on top.
+    The same buffer object is returned for a key every time.
+    """
+    key = (symbol, timeframe)
+    with _buffers_lock:
+        buffer = _buffers.get(key)
+        if buffer is None:
+            buffer = _buffers[key] = CandleRingBuffer(capacity)
+    if buffer.seeded >= capacity:
+        return buffer
+    with buffer.grow_lock:
+        if buffer.seeded < capacity:
+            history = seed() if seed else None
+            buffer.grow(capacity, history)
+            buffer.seeded = capacity
+    return buffer
+
+
+def find_buffer(symbol, timeframe):
+    """The shared buffer for (symbol, timeframe) if one exists"""
+    return _buffers.get((symbol, timeframe))
@@ -0,0 +1,186 @@
+"""
+Asyncio strategy scheduler.
+
+Running strategies are grouped by (symbol, timeframe) and each group is
+checked when its candle closes in the NSE session (see market_hours), so
+nothing runs outside market hours or on holidays and a daily strategy is
+evaluated once a day. Checks run concurrently, at most
+max_concurrency at a time, so one slow Upstox call no longer holds up every
+other strategy. The Django ORM and the pooled Upstox session are blocking, so
+each check runs in a worker thread via asyncio.to_thread.
+
+Upstox calls made by a check give up rate limit waits and retries that would
+run past the group's next deadline (upstox_api.request_deadline), so a
+worker thread does not hold its slot through the check after it.
+
+Every check records how late it started against its deadline; stats()
+returns the figures and a summary line is printed every report_interval.
+"""
+import asyncio
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import close_old_connections
+
+from .market_hours import next_candle_close
+from .upstox_api import group_strategies_by_instrument, request_deadline
+
+# Seconds after a candle closes before checking, so the broker has published it
+CLOSE_GRACE_SECONDS = 2
+
+# Checks starting later than this are reported individually
+LATE_WARNING_SECONDS = 1.0
+
+
+class StrategyScheduler:
+    def __init__(self, load_strategies, check_group, prefetch=None, max_concurrency=8,
+                 refresh_interval=30, default_period=60, report_interval=300):
+        """
+        load_strategies() -> iterable of running Strategy rows
+        prefetch(keys) -> context shared by every group due at the same moment (e.g. bulk prices)
+        check_group((symbol, timeframe), strategies, context) runs one group's checks
+        """
+        self.load_strategies = load_strategies
+        self.check_group = check_group
+        self.prefetch = prefetch
+        self.max_concurrency = max_concurrency
+        self.refresh_interval = refresh_interval
+        self.default_period = default_period
+        self.report_interval = report_interval
+
+        self.groups = {}
+        self.deadlines = {}
+        self.running = set()
+        self.lateness = {}
+        self._tasks = set()
+        self._loop = None
+        self._stopping = None
+        self._stop_requested = False
+
+    def next_deadline(self, timeframe, now):
+        """Epoch seconds of the first check after `now`: the next candle close plus a grace period"""
+        close_at = next_candle_close(
+            timeframe,
+            datetime.fromtimestamp(now, tz=dt_timezone.utc),
+            default_minutes=max(1, self.default_period // 60),
+        )
+        return close_at.timestamp() + CLOSE_GRACE_SECONDS
+
+    def stop(self):
+        """Ask the scheduler to finish; safe to call from any thread"""
+        self._stop_requested = True
+        if self._loop and self._stopping:
+            self._loop.call_soon_threadsafe(self._stopping.set)
+
+    def stats(self):
+        """Lateness per group: runs, overruns (skipped because still running), last/max/avg seconds late"""
+        return {
+            key: dict(stat, avg=stat['total'] / stat['runs'] if stat['runs'] else 0.0)
+            for key, stat in self.lateness.items()
+        }
+
+    async def run(self):
+        self._loop = asyncio.get_running_loop()
+        self._stopping = asyncio.Event()
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        next_refresh = 0
+        next_report = time.time() + self.report_interval
+
+        while not (self._stop_requested or self._stopping.is_set()):
+            now = time.time()
+            if now >= next_refresh:
+                await self._refresh(now)
+                next_refresh = now + self.refresh_interval
+            if now >= next_report:
+                self._report()
+                next_report = now + self.report_interval
+
+            due = [key for key, deadline in self.deadlines.items() if deadline <= now]
+            startable = []
+            for key in due:
+                deadline = self.deadlines[key]
+                self.deadlines[key] = self.next_deadline(key[1], now)
+                if key in self.running:
+                    self._stat(key)['overruns'] += 1
+                else:
+                    startable.append((key, deadline))
+
+            if startable:
+                context = None
+                if self.prefetch:
+                    try:
+                        context = await self._in_thread(self.prefetch, [key for key, _ in startable])
+                    except Exception as e:
+                        print(f"❌ Scheduler prefetch failed: {e}")
+                for key, deadline in startable:
+                    self.running.add(key)
+                    task = asyncio.create_task(self._run_group(semaphore, key, deadline, context))
+                    self._tasks.add(task)
+                    task.add_done_callback(self._tasks.discard)
+
+            wake_at = min([next_refresh, next_report, *self.deadlines.values()])
+            try:
+                await asyncio.wait_for(self._stopping.wait(), max(0.0, wake_at - time.time()))
+            except asyncio.TimeoutError:
+                pass
+
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def _refresh(self, now):
+        """Reload running strategies, scheduling new groups at their next candle close and dropping stopped ones"""
+        try:
+            strategies = await self._in_thread(lambda: list(self.load_strategies()))
+        except Exception as e:
+            print(f"❌ Scheduler could not load strategies: {e}")
+            return
+        self.groups = group_strategies_by_instrument(strategies)
+        for key in self.groups:
+            if key not in self.deadlines:
+                self.deadlines[key] = self.next_deadline(key[1], now)
+        for key in list(self.deadlines):
+            if key not in self.groups:
+                del self.deadlines[key]
+
+    async def _run_group(self, semaphore, key, deadline, context):
+        try:
+            async with semaphore:
+                late = time.time() - deadline
+                stat = self._stat(key)
+                stat['runs'] += 1
+                stat['last'] = late
+                stat['max'] = max(stat['max'], late)
+                stat['total'] += late
+                if late > LATE_WARNING_SECONDS:
+                    print(f"⏱️ {key[0]} ({key[1]}) check started {late:.2f}s after its deadline")
+
+                strategies = self.groups.get(key, [])
+                if strategies:
+                    # Upstox waits and retries stop at the group's next check (copied into the thread)
+                    request_deadline.set(self.deadlines.get(key))
+                    await self._in_thread(self.check_group, key, strategies, context)
+        except Exception as e:
+            print(f"❌ Error checking {key[0]} ({key[1]}): {e}")
+        finally:
+            self.running.discard(key)
+
+    async def _in_thread(self, func, *args):
+        def call():
+            close_old_connections()
+            try:
+                return func(*args)
+            finally:
+                close_old_connections()
+        return await asyncio.to_thread(call)
+
+    def _stat(self, key):
+        return self.lateness.setdefault(key, {'runs': 0, 'overruns': 0, 'last': 0.0, 'max': 0.0, 'total': 0.0})
+
+    def _report(self):
+        stats = self.stats()
+        if not stats:
+            return
+        runs = sum(stat['runs'] for stat in stats.values())
+        overruns = sum(stat['overruns'] for stat in stats.values())
+        worst = max(stat['max'] for stat in stats.values())
+        print(f"📊 Scheduler: {len(self.groups)} groups, {runs} checks, {overruns} overruns, "
+              f"worst start {worst:.2f}s late")
@@ -0,0 +1,385 @@
+"""
+Cross-process cache for broker reads.
+
+The web workers and the bot processes ask Upstox for the same quotes,
+holdings and profiles; every UpstoxAPI read goes through shared_cache so
+one answer serves them all for a short while. Entries are keyed by endpoint
+and instrument (or user, for account data):
+
+    shared_cache.fetch('ltp', 'NSE_EQ|INE002A01018', load_quote)
+
+How long each endpoint's answers are reused comes from
+settings.SHARED_CACHE_TTLS. Failed reads (None) are never cached.
+
+Two backends share a small Redis-style interface (get, get_many, set, add,
+incr, delete): SQLiteBackend keeps entries in one local SQLite file and is
+the default; RedisBackend needs the optional redis package. Values are
+stored as JSON. Hits and misses are counted per endpoint in each process;
+see SharedCache.stats().
+
+Misses are coalesced: threads of one process asking for the same key at
+the same time share a single broker read, and across processes the first
+to take the key's lock (an add() on 'lock:<key>') reads while the others
+poll the cache for its answer. Asyncio code reaches the broker through
+threads (asyncio.to_thread), so it is covered by the same mechanism. Keys
+hold the endpoint and its parameters, and the user for account data, so
+only identical reads are merged.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+# Seconds SQLite waits for another process's write before giving up
+SQLITE_TIMEOUT = 1.0
+
+# Expired SQLite rows are purged once every this many writes
+PURGE_EVERY = 500
+
+# Longest a caller waits for another thread's read of the same key (seconds)
+FLIGHT_TIMEOUT = 20
+
+# Longest a process holds, or waits on another process's, lock on a key being read (seconds)
+LOCK_TIMEOUT = 10
+LOCK_POLL_INTERVAL = 0.02
+
+
+class SQLiteBackend:
+    """Entries in a local SQLite file, shared by every process on the machine"""
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._local = threading.local()
+        self._writes = 0
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            # Autocommit; writes that must be atomic open their own transaction
+            connection = sqlite3.connect(self.path, timeout=SQLITE_TIMEOUT, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS cache '
+                '(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL)'
+            )
+            self._local.connection = connection
+        return connection
+
+    def get(self, key):
+        row = self._connection().execute(
+            'SELECT value FROM cache WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (key, time.time()),
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_many(self, keys):
+        keys = list(keys)
+        if not keys:
+            return {}
+        placeholders = ','.join('?' * len(keys))
+        rows = self._connection().execute(
+            f'SELECT key, value FROM cache WHERE key IN ({placeholders}) AND (expires IS NULL OR expires > ?)',
+            (*keys, time.time()),
+        ).fetchall()
+        return {key: json.loads(value) for key, value in rows}
+
+    def set(self, key, value, ex=None):
+        self._connection().execute(
+            'INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)',
+            (key, json.dumps(value), time.time() + ex if ex else None),
+        )
+        self._wrote()
+        return True
+
+    def add(self, key, value, ex=None):
+        """Set `key` only if it is missing or expired; returns whether it was set"""
+        now = time.time()
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.execute('DELETE FROM cache WHERE key = ? AND expires <= ?', (key, now))
+            cursor = connection.execute(
+                'INSERT OR IGNORE INTO cache (key, value, expires) VALUES (?, ?, ?)',
+                (key, json.dumps(value), now + ex if ex else None),
+            )
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+        self._wrote()
+        return cursor.rowcount == 1
+
+    def incr(self, key, amount=1, ex=None):
+        """Add `amount` to a counter, creating it (expiring after `ex` seconds) if missing"""
+        now = time.time()
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute(
+                'SELECT value, expires FROM cache WHERE key = ? AND (expires IS NULL OR expires > ?)',
+                (key, now),
+            ).fetchone()
+            if row:
+                value, expires = json.loads(row[0]) + amount, row[1]
+            else:
+                value, expires = amount, now + ex if ex else None
+            connection.execute(
+                'INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)',
+                (key, json.dumps(value), expires),
+            )
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+        self._wrote()
+        return value
+
+    def delete(self, *keys):
+        if not keys:
+            return 0
+        placeholders = ','.join('?' * len(keys))
+        return self._connection().execute(f'DELETE FROM cache WHERE key IN ({placeholders})', keys).rowcount
+
+    def _wrote(self):
+        self._writes += 1
+        if self._writes % PURGE_EVERY == 0:
+            self._connection().execute('DELETE FROM cache WHERE expires <= ?', (time.time(),))
+
+
+class RedisBackend:
+    """Entries in Redis, shared by every process that can reach the server"""
+
+    def __init__(self, url):
+        if redis is None:
+            raise ImportError("The 'redis' package is required for the redis shared cache backend")
+        self.client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        value = self.client.get(key)
+        return json.loads(value) if value is not None else None
+
+    def get_many(self, keys):
+        keys = list(keys)
+        if not keys:
+            return {}
+        return {key: json.loads(value) for key, value in zip(keys, self.client.mget(keys)) if value is not None}
+
+    def set(self, key, value, ex=None):
+        return bool(self.client.set(key, json.dumps(value), px=int(ex * 1000) if ex else None))
+
+    def add(self, key, value, ex=None):
+        return bool(self.client.set(key, json.dumps(value), px=int(ex * 1000) if ex else None, nx=True))
+
+    def incr(self, key, amount=1, ex=None):
+        value = self.client.incrby(key, amount)
+        if ex and value == amount:
+            # Like SQLiteBackend, only a new counter gets the expiry
+            self.client.pexpire(key, int(ex * 1000))
+        return value
+
+    def delete(self, *keys):
+        return self.client.delete(*keys) if keys else 0
+
+
+BACKENDS = {
+    'sqlite': SQLiteBackend,
+    'redis': RedisBackend,
+}
+
+
+class _Flight:
+    """One in-progress broker read that concurrent callers wait on"""
+    __slots__ = ('done', 'value', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SharedCache:
+    def __init__(self, backend, ttls=None):
+        self.backend = backend
+        self.ttls = ttls or {}
+        self.hits = Counter()       # endpoint -> reads answered from the cache
+        self.misses = Counter()     # endpoint -> reads that went to the broker
+        self.coalesced = Counter()  # endpoint -> misses answered by another caller's read
+        self._lock = threading.Lock()
+        self._flights = {}          # full key -> _Flight in progress in this process
+
+    def fetch(self, endpoint, key, loader, ttl=None):
+        """Cached value of `endpoint` for `key`, calling `loader()` and caching its result on a miss"""
+        ttl = self.ttls.get(endpoint, 0) if ttl is None else ttl
+        full_key = f'{endpoint}:{key}'
+        if not ttl:
+            return self._single_flight(endpoint, full_key, loader)
+        value = self._backend_call(self.backend.get, full_key)
+        self._count(endpoint, hit=value is not None)
+        if value is not None:
+            return value
+        return self._single_flight(endpoint, full_key, lambda: self._load(endpoint, full_key, loader, ttl))
+
+    def fetch_many(self, endpoint, keys, loader, ttl=None):
+        """{key: value} for `keys`, calling `loader(missing_keys)` -> {key: value} for those not cached"""
+        ttl = self.ttls.get(endpoint, 0) if ttl is None else ttl
+        keys = list(dict.fromkeys(keys))
+        if not ttl:
+            return loader(keys)
+        cached = self._backend_call(self.backend.get_many, [f'{endpoint}:{key}' for key in keys]) or {}
+        values = {}
+        missing = []
+        for key in keys:
+            value = cached.get(f'{endpoint}:{key}')
+            if value is None:
+                missing.append(key)
+            else:
+                values[key] = value
+        with self._lock:
+            self.hits[endpoint] += len(values)
+            self.misses[endpoint] += len(missing)
+        if not missing:
+            return values
+
+        # Keys another thread is already loading are waited for, the rest loaded here in one call
+        own, waiting = {}, {}
+        with self._lock:
+            for key in missing:
+                full_key = f'{endpoint}:{key}'
+                flight = self._flights.get(full_key)
+                if flight is None:
+                    own[key] = self._flights[full_key] = _Flight()
+                else:
+                    waiting[key] = flight
+            self.coalesced[endpoint] += len(waiting)
+        loaded = {}
+        try:
+            if own:
+                loaded = loader(list(own)) or {}
+                for key, value in loaded.items():
+                    if value is not None:
+                        self._backend_call(self.backend.set, f'{endpoint}:{key}', value, ttl)
+                values.update(loaded)
+        finally:
+            with self._lock:
+                for key in own:
+                    self._flights.pop(f'{endpoint}:{key}', None)
+            for key, flight in own.items():
+                flight.value = loaded.get(key)
+                flight.done.set()
+        for key, flight in waiting.items():
+            if flight.done.wait(FLIGHT_TIMEOUT) and flight.value is not None:
+                values[key] = flight.value
+        return values
+
+    def invalidate(self, endpoint, *keys):
+        self._backend_call(self.backend.delete, *(f'{endpoint}:{key}' for key in keys))
+
+    def stats(self):
+        """Hit, miss and coalesced counts per endpoint in this process"""
+        with self._lock:
+            endpoints = sorted(set(self.hits) | set(self.misses) | set(self.coalesced))
+            stats = {
+                endpoint: {
+                    'hits': self.hits[endpoint],
+                    'misses': self.misses[endpoint],
+                    'coalesced': self.coalesced[endpoint],
+                }
+                for endpoint in endpoints
+            }
+        for counts in stats.values():
+            total = counts['hits'] + counts['misses']
+            counts['hit_ratio'] = round(counts['hits'] / total, 3) if total else None
+        return stats
+
+    def _single_flight(self, endpoint, full_key, load):
+        """Run `load()` once for all threads asking for `full_key` at the same time"""
+        with self._lock:
+            flight = self._flights.get(full_key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[full_key] = _Flight()
+            else:
+                self.coalesced[endpoint] += 1
+        if not leader:
+            if flight.done.wait(FLIGHT_TIMEOUT):
+                if flight.error is not None:
+                    raise flight.error
+                return flight.value
+            return load()  # the leader is stuck; don't wait on it forever
+        try:
+            flight.value = load()
+            return flight.value
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(full_key, None)
+            flight.done.set()
+
+    def _load(self, endpoint, full_key, loader, ttl):
+        """Call `loader()` unless another process is already loading `full_key`, then cache the result"""
+        lock_key = f'lock:{full_key}'
+        locked = self._backend_call(self.backend.add, lock_key, os.getpid(), LOCK_TIMEOUT)
+        if locked is False:
+            value = self._wait_for(full_key, lock_key)
+            if value is not None:
+                with self._lock:
+                    self.coalesced[endpoint] += 1
+                return value
+            # The other process failed or gave up; read for ourselves
+        try:
+            value = loader()
+            if value is not None:
+                self._backend_call(self.backend.set, full_key, value, ttl)
+            return value
+        finally:
+            if locked:
+                self._backend_call(self.backend.delete, lock_key)
+
+    def _wait_for(self, full_key, lock_key):
+        """Poll for the value another process is loading until it appears or its lock goes"""
+        deadline = time.monotonic() + LOCK_TIMEOUT
+        while time.monotonic() < deadline:
+            time.sleep(LOCK_POLL_INTERVAL)
+            value = self._backend_call(self.backend.get, full_key)
+            if value is not None:
+                return value
+            if self._backend_call(self.backend.get, lock_key) is None:
+                return None
+        return None
+
+    def _count(self, endpoint, hit):
+        with self._lock:
+            (self.hits if hit else self.misses)[endpoint] += 1
+
+    def _backend_call(self, method, *args):
+        # A cache that is down or locked only costs the broker call it would have saved
+        try:
+            return method(*args)
+        except Exception as e:
+            print(f"DEBUG: Shared cache {method.__name__} failed: {e}")
+            return None
+
+
+def _create_shared_cache():
+    config = getattr(settings, 'SHARED_CACHE', {})
+    backend = BACKENDS[config.get('BACKEND', 'sqlite')](
+        config.get('LOCATION', os.path.join(settings.BASE_DIR, 'cache', 'shared.sqlite3'))
+    )
+    return SharedCache(backend, getattr(settings, 'SHARED_CACHE_TTLS', {}))
+
+
+# Shared cache for the process
+shared_cache = _create_shared_cache()
@@ -0,0 +1,75 @@
+"""
+Latest evaluation of each strategy, shared between the bot and the web app.
+
+The bot calls publish() after every evaluation. The state goes into the
+shared cache's backend (see shared_cache; it crosses processes and never
+evicts live entries) under one key per strategy, and onto the event bus as
+'strategy_state' for live viewers in this process; viewers in other
+processes are told through event_sequence. snapshot() reads the states of
+many strategies in one cache call, with no broker requests; each state
+says how old it is and whether it is stale, i.e. older than one candle of
+its timeframe plus STALE_GRACE_SECONDS.
+"""
+import time
+from datetime import datetime
+
+from .event_bus import bus
+from .event_sequence import announce
+from .market_hours import TIMEFRAME_MINUTES
+from .shared_cache import shared_cache
+
+KEY_PREFIX = 'strategy_state:'
+
+# Snapshots are dropped from the cache after this many seconds without an update
+STATE_TTL = 24 * 60 * 60
+
+# Slack on top of one candle before a state counts as stale
+STALE_GRACE_SECONDS = 60
+
+
+def state_key(strategy_id):
+    return f'{KEY_PREFIX}{strategy_id}'
+
+
+def publish(strategy, current_price, indicator_value, signal):
+    """Record and announce the result of one evaluation of `strategy`"""
+    setup = strategy.setup
+    state = {
+        'user_id': strategy.user_id,
+        'strategy_id': strategy.id,
+        'symbol': setup.symbol,
+        'indicator': setup.indicator,
+        'timeframe': setup.timeframe,
+        'current_price': current_price,
+        'indicator_value': indicator_value,
+        'indicator_signal': signal,
+        'status': strategy.status,
+        'timestamp': datetime.now().isoformat(),
+        'updated_at': time.time(),
+    }
+    try:
+        shared_cache.backend.set(state_key(strategy.id), state, STATE_TTL)
+    except Exception as e:
+        print(f"❌ Error saving state of strategy {strategy.id}: {e}")
+    bus.publish('strategy_state', state)
+    announce([strategy.user_id], 'strategy_state')
+    return state
+
+
+def snapshot(strategy_ids, now=None):
+    """{strategy id: latest state} for those of `strategy_ids` evaluated recently, with age and staleness"""
+    now = now or time.time()
+    keys = {state_key(strategy_id): strategy_id for strategy_id in strategy_ids}
+    states = {}
+    try:
+        cached = shared_cache.backend.get_many(list(keys))
+    except Exception as e:
+        print(f"❌ Error reading strategy states: {e}")
+        return states
+    for key, state in cached.items():
+        minutes = TIMEFRAME_MINUTES.get(state.get('timeframe')) or 24 * 60
+        age = max(0.0, now - state['updated_at'])
+        state['age_seconds'] = round(age, 1)
+        state['stale'] = age > minutes * 60 + STALE_GRACE_SECONDS
+        states[keys[key]] = state
+    return states
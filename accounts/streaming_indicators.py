@@ -0,0 +1,319 @@
+"""
+Streaming versions of the indicators in accounts.indicators.
+
+Each class keeps its rolling windows and EMA state between calls, so feeding a
+new candle through update() costs O(1) instead of recomputing the whole
+series. Values and signals match the batch *_signal functions for the same
+candles.
+
+The last candle fed may still be forming: the candle store re-fetches the
+latest day and the ring buffer replaces rows with the same timestamp. Feeding
+a candle again at the last timestamp seen with different prices undoes the
+earlier version and applies the new one. Older candles are final.
+"""
+import copy
+import logging
+import math
+from collections import deque
+
+from .indicators import SupertrendState
+
+logger = logging.getLogger(__name__)
+
+# Candle fields compared to tell a revised last candle from a repeat
+CANDLE_FIELDS = ('open', 'high', 'low', 'close', 'volume')
+
+
+class StreamingIndicator:
+    """Base class for indicators updated one candle at a time"""
+    __slots__ = ('value', 'signal', 'last_timestamp', 'last_candle', '_undo')
+
+    def __init__(self):
+        self.value = math.nan
+        self.signal = 'hold'
+        self.last_timestamp = None
+        self.last_candle = None
+        self._undo = None  # state before the last candle, to revise it
+
+    def update(self, candle) -> str:
+        """Add one closed candle (dict with open/high/low/close/volume) and return a signal"""
+        raise NotImplementedError
+
+    def push(self, timestamp, candle) -> str:
+        """Feed one candle newer than the last one seen, or a revision of the last one"""
+        if self.last_timestamp is None or timestamp > self.last_timestamp:
+            self._apply(timestamp, candle)
+        elif timestamp == self.last_timestamp:
+            self._revise(candle)
+        return self.signal
+
+    def prime(self, data) -> str:
+        """Feed every row of an OHLCV DataFrame from the last one seen onwards"""
+        if self.last_timestamp is not None:
+            if self.last_timestamp in data.index:
+                self._revise(data.iloc[data.index.get_loc(self.last_timestamp)].to_dict())
+            data = data[data.index > self.last_timestamp]
+        last = len(data) - 1
+        for i, (timestamp, candle) in enumerate(zip(data.index, data.to_dict('records'))):
+            # Only the newest candle can be revised, so only it needs an undo copy
+            self._apply(timestamp, candle, keep_undo=i == last)
+        return self.signal
+
+    def _apply(self, timestamp, candle, keep_undo=True):
+        self._undo = self._state() if keep_undo else None
+        self.signal = self.update(candle)
+        self.last_timestamp = timestamp
+        self.last_candle = {field: candle.get(field) for field in CANDLE_FIELDS}
+
+    def _revise(self, candle):
+        """Replace the last candle fed with a new version of it"""
+        if all(candle.get(field) == self.last_candle.get(field) for field in CANDLE_FIELDS):
+            return
+        if self._undo is None:
+            logger.warning(f'Cannot revise candle at {self.last_timestamp}, keeping the first version')
+            return
+        for name, value in self._undo.items():
+            setattr(self, name, value)
+        self._apply(self.last_timestamp, candle)
+
+    def _state(self):
+        """Copy of everything update() may change"""
+        names = ['value', 'signal']
+        for cls in type(self).__mro__[:-2]:  # the subclasses below StreamingIndicator
+            names.extend(cls.__dict__.get('__slots__', ()))
+        return {name: copy.deepcopy(getattr(self, name)) for name in names}
+
+
+def _divide(a: float, b: float) -> float:
+    """Divide like pandas does: x/0 is +-inf and 0/0 is NaN"""
+    if b == 0:
+        return math.nan if a == 0 or math.isnan(a) else math.copysign(math.inf, a)
+    return a / b
+
+
+def _crossed(prev_a, prev_b, a, b) -> str:
+    """Return buy when a crosses above b, sell when it crosses below"""
+    if prev_a < prev_b and a > b:
+        return 'buy'
+    elif prev_a > prev_b and a < b:
+        return 'sell'
+    return 'hold'
+
+
+class _RollingMean:
+    """Fixed-window mean with a running sum; NaN until the window is full"""
+    __slots__ = ('window', 'values', 'total')
+
+    def __init__(self, window: int):
+        self.window = window
+        self.values = deque(maxlen=window)
+        self.total = 0.0
+
+    def push(self, x: float) -> float:
+        if len(self.values) == self.window:
+            self.total -= self.values[0]
+        self.values.append(x)
+        self.total += x
+        if len(self.values) < self.window:
+            return math.nan
+        return self.total / self.window
+
+
+class _EMA:
+    """Exponential moving average matching pandas ewm(span, adjust=False)"""
+    __slots__ = ('alpha', 'value')
+
+    def __init__(self, span: int):
+        self.alpha = 2.0 / (span + 1)
+        self.value = None
+
+    def push(self, x: float) -> float:
+        if self.value is None:
+            self.value = x
+        else:
+            self.value = self.alpha * x + (1 - self.alpha) * self.value
+        return self.value
+
+
+class StreamingRSI(StreamingIndicator):
+    """
+    RSI signal:
+    - Buy: RSI rises above 60
+    - Sell: RSI falls below 40
+    """
+    __slots__ = ('prev_close', 'gain', 'loss')
+
+    def __init__(self, period: int = 14):
+        super().__init__()
+        self.prev_close = None
+        self.gain = _RollingMean(period)
+        self.loss = _RollingMean(period)
+
+    def update(self, candle) -> str:
+        close = float(candle['close'])
+        delta = 0.0 if self.prev_close is None else close - self.prev_close
+        self.prev_close = close
+        gain = self.gain.push(max(delta, 0.0))
+        loss = self.loss.push(max(-delta, 0.0))
+        self.value = 100 - _divide(100, 1 + _divide(gain, loss))
+        if self.value > 60:
+            return 'buy'
+        elif self.value < 40:
+            return 'sell'
+        return 'hold'
+
+
+class StreamingMACD(StreamingIndicator):
+    """
+    MACD signal:
+    - Buy: MACD crosses above signal line
+    - Sell: MACD crosses below signal line
+    """
+    __slots__ = ('fast', 'slow', 'signal_line', 'prev_macd', 'prev_signal')
+
+    def __init__(self, fast: int = 12, slow: int = 26, signal: int = 9):
+        super().__init__()
+        self.fast = _EMA(fast)
+        self.slow = _EMA(slow)
+        self.signal_line = _EMA(signal)
+        self.prev_macd = None
+        self.prev_signal = None
+
+    def update(self, candle) -> str:
+        close = float(candle['close'])
+        macd = self.fast.push(close) - self.slow.push(close)
+        signal_line = self.signal_line.push(macd)
+        prev_macd, prev_signal = self.prev_macd, self.prev_signal
+        self.prev_macd, self.prev_signal = macd, signal_line
+        self.value = macd
+        if prev_macd is None:
+            return 'hold'
+        return _crossed(prev_macd, prev_signal, macd, signal_line)
+
+
+class StreamingMovingAverage(StreamingIndicator):
+    """
+    Moving Average signal:
+    - Buy: Price crosses above MA
+    - Sell: Price crosses below MA
+    """
+    __slots__ = ('ma', 'prev_close')
+
+    def __init__(self, window: int = 20):
+        super().__init__()
+        self.ma = _RollingMean(window)
+        self.prev_close = None
+
+    def update(self, candle) -> str:
+        close = float(candle['close'])
+        prev_close, prev_ma = self.prev_close, self.value
+        self.value = self.ma.push(close)
+        self.prev_close = close
+        if prev_close is None:
+            return 'hold'
+        return _crossed(prev_close, prev_ma, close, self.value)
+
+
+class StreamingVWAP(StreamingIndicator):
+    """
+    VWAP signal:
+    - Buy: Price above VWAP
+    - Sell: Price below VWAP
+    """
+    __slots__ = ('price_volume', 'volume')
+
+    def __init__(self):
+        super().__init__()
+        self.price_volume = 0.0
+        self.volume = 0.0
+
+    def update(self, candle) -> str:
+        close = float(candle['close'])
+        volume = float(candle['volume'])
+        self.price_volume += close * volume
+        self.volume += volume
+        self.value = self.price_volume / self.volume if self.volume else math.nan
+        if close > self.value:
+            return 'buy'
+        elif close < self.value:
+            return 'sell'
+        return 'hold'
+
+
+class StreamingADX(StreamingIndicator):
+    """
+    ADX signal:
+    - Buy: +DI crosses above -DI
+    - Sell: -DI crosses above +DI
+    """
+    __slots__ = ('period', 'prev_high', 'prev_low', 'prev_close', 'tr', 'plus_dm', 'minus_dm',
+                 'plus_di', 'minus_di')
+
+    def __init__(self, period: int = 14):
+        super().__init__()
+        self.period = period
+        self.prev_high = None
+        self.prev_low = None
+        self.prev_close = None
+        self.tr = _RollingMean(period)
+        self.plus_dm = _RollingMean(period)
+        self.minus_dm = _RollingMean(period)
+        self.plus_di = math.nan
+        self.minus_di = math.nan
+
+    def update(self, candle) -> str:
+        high = float(candle['high'])
+        low = float(candle['low'])
+        close = float(candle['close'])
+        if self.prev_close is None:
+            atr = self.tr.push(high - low)
+            plus_sum = minus_sum = math.nan
+        else:
+            atr = self.tr.push(max(high - low, abs(high - self.prev_close), abs(low - self.prev_close)))
+            plus_sum = self.plus_dm.push(max(high - self.prev_high, 0.0)) * self.period
+            minus_sum = self.minus_dm.push(abs(low - self.prev_low)) * self.period
+        self.prev_high, self.prev_low, self.prev_close = high, low, close
+
+        prev_plus, prev_minus = self.plus_di, self.minus_di
+        self.plus_di = 100 * _divide(plus_sum, atr)
+        self.minus_di = 100 * _divide(minus_sum, atr)
+        self.value = _divide(abs(self.plus_di - self.minus_di), self.plus_di + self.minus_di) * 100
+        if prev_plus < prev_minus and self.plus_di > self.minus_di:
+            return 'buy'
+        elif prev_minus < prev_plus and self.minus_di > self.plus_di:
+            return 'sell'
+        return 'hold'
+
+
+class StreamingSupertrend(StreamingIndicator):
+    """
+    SuperTrend signal:
+    - Buy: Price above SuperTrend
+    - Sell: Price below SuperTrend
+    """
+    __slots__ = ('state',)
+
+    def __init__(self, period: int = 10, multiplier: float = 3.0):
+        super().__init__()
+        self.state = SupertrendState(period, multiplier)
+
+    def update(self, candle) -> str:
+        close = float(candle['close'])
+        self.value, _ = self.state.update(float(candle['high']), float(candle['low']), close)
+        return self.state.signal(close)
+
+
+STREAMING_INDICATORS = {
+    'RSI': StreamingRSI,
+    'MACD': StreamingMACD,
+    'Moving Average': StreamingMovingAverage,
+    'VWAP': StreamingVWAP,
+    'ADX': StreamingADX,
+    'Supertrend': StreamingSupertrend,
+}
+
+
+def create_streaming_indicator(indicator: str):
+    """Return a fresh streaming indicator for a TradingSetup.indicator name, or None"""
+    indicator_class = STREAMING_INDICATORS.get(indicator)
+    return indicator_class() if indicator_class else None
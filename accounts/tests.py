@@ -1,3 +1,749 @@
-from django.test import TestCase
+import math
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from datetime import date, datetime
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+import pandas as pd
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from . import candle_cache, event_stream, indicator_engine, log_retention, rate_limiter, ring_buffer, strategy_state
+from .candle_aggregator import CandleAggregator
+from .candle_store import resample_candles
+from .indicator_engine import INDICATORS, compute_indicator
+from .log_sink import LogSink
+from .market_hours import IST, candle_start, closed_candles, is_current_candle, next_candle_close
+from .models import BotLog, Strategy, Trade, TradingSetup
+from .shared_cache import SharedCache, SQLiteBackend, shared_cache
+from .streaming_indicators import create_streaming_indicator
+from .upstox_api import TradingBot, UpstoxAPI, request_deadline
+
+
+def make_candles(count, seed=7):
+    """Random-walk OHLCV candles on a 5 minute index"""
+    rng = np.random.default_rng(seed)
+    close = 100 + rng.normal(0, 1, count).cumsum()
+    spread = rng.uniform(0.1, 1.5, count)
+    return pd.DataFrame({
+        'open': close + rng.normal(0, 0.3, count),
+        'high': close + spread,
+        'low': close - spread,
+        'close': close,
+        'volume': rng.integers(1000, 5000, count).astype(float),
+    }, index=pd.date_range('2026-01-05 09:15', periods=count, freq='5min'))
+
+
+class StreamingIndicatorTests(SimpleTestCase):
+    def assertMatchesBatch(self, stream, data, indicator):
+        batch = compute_indicator(indicator, data)
+        expected = float(batch.values[-1])
+        if math.isnan(expected):
+            self.assertTrue(math.isnan(stream.value), indicator)
+        else:
+            self.assertAlmostEqual(stream.value, expected, places=6, msg=indicator)
+        self.assertEqual(stream.signal, batch.signal, indicator)
+
+    def test_matches_batch_when_fed_in_chunks(self):
+        data = make_candles(120)
+        for indicator in INDICATORS:
+            stream = create_streaming_indicator(indicator)
+            for end in (40, 41, 75, 120):
+                stream.prime(data.iloc[:end])
+                self.assertMatchesBatch(stream, data.iloc[:end], indicator)
+
+    def test_matches_batch_when_pushed_one_candle_at_a_time(self):
+        data = make_candles(80)
+        for indicator in INDICATORS:
+            stream = create_streaming_indicator(indicator)
+            for timestamp, candle in zip(data.index, data.to_dict('records')):
+                stream.push(timestamp, candle)
+            self.assertMatchesBatch(stream, data, indicator)
+
+    def test_revised_last_candle_replaces_the_first_version(self):
+        data = make_candles(90)
+        revised = data.copy()
+        revised.iloc[-1, revised.columns.get_loc('close')] += 4.0
+        revised.iloc[-1, revised.columns.get_loc('high')] += 4.0
+        revised.iloc[-1, revised.columns.get_loc('volume')] += 700
+        for indicator in INDICATORS:
+            stream = create_streaming_indicator(indicator)
+            stream.prime(data)
+            stream.prime(revised)
+            self.assertMatchesBatch(stream, revised, indicator)
+
+            # Revised again through push, then the next candle builds on the revision
+            pushed = revised.copy()
+            pushed.iloc[-1, pushed.columns.get_loc('close')] -= 6.0
+            pushed.iloc[-1, pushed.columns.get_loc('low')] -= 6.0
+            stream.push(pushed.index[-1], pushed.iloc[-1].to_dict())
+            self.assertMatchesBatch(stream, pushed, indicator)
+
+            extended = pd.concat([pushed, make_candles(1, seed=3).set_axis(
+                [pushed.index[-1] + pd.Timedelta('5min')])])
+            stream.prime(extended)
+            self.assertMatchesBatch(stream, extended, indicator)
+
+    def test_unrevisable_candle_is_logged_and_kept(self):
+        data = make_candles(40)
+        stream = create_streaming_indicator('RSI')
+        stream.prime(data)
+        value = stream.value
+        stream._undo = None
+        revised = data.iloc[-1].to_dict()
+        revised['close'] += 5.0
+        with self.assertLogs('accounts.streaming_indicators', 'WARNING'):
+            stream.push(data.index[-1], revised)
+        self.assertEqual(stream.value, value)
+
+    def test_repeated_last_candle_is_not_applied_twice(self):
+        data = make_candles(60)
+        for indicator in INDICATORS:
+            stream = create_streaming_indicator(indicator)
+            stream.prime(data)
+            stream.prime(data)
+            stream.push(data.index[-1], data.iloc[-1].to_dict())
+            self.assertMatchesBatch(stream, data, indicator)
+
+
+@override_settings(BOT_LOG_LEVELS={'INFO': 'sample'}, BOT_LOG_SAMPLE_SECONDS=60)
+class LogSinkSamplingTests(SimpleTestCase):
+    def test_routine_rows_are_sampled(self):
+        sink = LogSink()
+        fields = {'user_id': 1, 'log_type': 'INFO', 'details': {'symbol': 'NSE_EQ|X'}}
+        self.assertTrue(sink._admit(dict(fields)))
+        self.assertFalse(sink._admit(dict(fields)))
+
+    def test_order_and_trade_decision_rows_are_kept(self):
+        sink = LogSink()
+        rows = [
+            {'order_type': 'TAKE_PROFIT', 'symbol': 'NSE_EQ|X'},
+            {'order_type': 'STOP_LOSS', 'symbol': 'NSE_EQ|X'},
+            {'trade_direction': 'BUY', 'symbol': 'NSE_EQ|X', 'signal': 'sell'},
+            {'trade_direction': 'BUY', 'symbol': 'NSE_EQ|X', 'signal': 'sell'},
+        ]
+        for details in rows:
+            self.assertTrue(sink._admit({'user_id': 1, 'log_type': 'INFO', 'details': details}))
+
+
+
+class LogSinkTests(SimpleTestCase):
+    def sink(self, **kwargs):
+        sink = LogSink(**kwargs)
+        sink.batches = []
+        sink._write = lambda batch: sink.batches.append(len(batch)) if batch else None
+        return sink
+
+    def row(self, i=0, log_type='TRADE_EXECUTED'):
+        return {'user_id': 1, 'log_type': log_type, 'message': f'row {i}'}
+
+    def test_rows_are_written_in_batches_of_flush_size(self):
+        sink = self.sink(flush_size=3, flush_interval=0.5)
+        for i in range(7):
+            self.assertTrue(sink.log(**self.row(i)))
+        deadline = time.monotonic() + 5
+        while sum(sink.batches) < 7 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        sink.close()
+        self.assertEqual(sink.batches, [3, 3, 1])
+
+    def test_a_full_queue_drops_and_counts_new_rows(self):
+        sink = self.sink(queue_size=3)
+        with mock.patch.object(sink, '_ensure_started'):
+            results = [sink.log(**self.row(i)) for i in range(5)]
+        self.assertEqual(results, [True, True, True, False, False])
+        self.assertEqual(sink.stats()['queued'], 3)
+        self.assertEqual(sink.stats()['dropped'], 2)
+        # Rows keep the time they were logged
+        self.assertTrue(all(log.timestamp for log in list(sink.queue.queue)))
+
+    @override_settings(BOT_LOG_LEVELS={'DATA_FETCH': 'sample', 'INDICATOR_CALC': 'off'}, BOT_LOG_SAMPLE_SECONDS=60)
+    def test_sampling_under_load_keeps_one_row_and_summarises_the_rest(self):
+        sink = self.sink()
+        details = {'symbol': 'NSE_EQ|X'}
+
+        def burst():
+            for _ in range(50):
+                sink.log(user_id=1, log_type='DATA_FETCH', message='fetched', details=details)
+                sink.log(user_id=1, log_type='INDICATOR_CALC', message='calculated', details=details)
+                sink.log(user_id=1, log_type='ERROR', message='failed', details=details)
+
+        with mock.patch.object(sink, '_ensure_started'):
+            threads = [threading.Thread(target=burst) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            queued = [log.log_type for log in list(sink.queue.queue)]
+            self.assertEqual(queued.count('DATA_FETCH'), 1)
+            self.assertEqual(queued.count('INDICATOR_CALC'), 0)
+            self.assertEqual(queued.count('ERROR'), 400)
+            self.assertEqual(sink.stats()['suppressed'], 399 + 400)
+
+            sink._summarize(force=True)
+        summary = list(sink.queue.queue)[-1]
+        self.assertEqual(summary.log_type, 'INFO')
+        self.assertEqual(summary.details['suppressed'], {'DATA_FETCH': 399, 'INDICATOR_CALC': 400})
+        self.assertEqual(sink.stats()['suppressed'], 0)
+
+class ResampleCandlesTests(SimpleTestCase):
+    def test_minute_candles_group_into_session_aligned_candles(self):
+        candles = [
+            ['2026-10-16T09:08:00+05:30', 9, 9, 9, 9, 5],  # pre-open, dropped
+            ['2026-10-16T09:15:00+05:30', 10, 11, 9, 10.5, 100],
+            ['2026-10-16T09:19:00+05:30', 10.5, 12, 10, 11, 50],
+            ['2026-10-16T09:20:00+05:30', 11, 11.5, 10.8, 11.2, 30],
+        ]
+        self.assertEqual(resample_candles(candles, '5m'), [
+            ['2026-10-16T09:15:00+05:30', 10, 12, 9, 11, 150],
+            ['2026-10-16T09:20:00+05:30', 11, 11.5, 10.8, 11.2, 30],
+        ])
+
+
+class CandleCacheTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = self.settings(CANDLE_CACHE_DIR=directory.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_append_replaces_the_tail_in_place(self):
+        data = make_candles(30)
+        candle_cache.write('NSE_EQ|X', '5m', data.iloc[:20])
+        revised = data.iloc[19:].copy()
+        revised.iloc[0, revised.columns.get_loc('close')] += 1.0
+        candle_cache.append('NSE_EQ|X', '5m', revised)
+
+        expected = pd.concat([data.iloc[:19], revised])
+        cached = candle_cache.load('NSE_EQ|X', '5m')
+        self.assertEqual(len(cached), 30)
+        self.assertTrue((cached.index == expected.index.tz_localize('UTC')).all())
+        np.testing.assert_array_equal(cached['close'].to_numpy(), expected['close'].to_numpy())
+        np.testing.assert_array_equal(candle_cache.load('NSE_EQ|X', '5m', limit=5)['volume'].to_numpy(),
+                                      expected['volume'].to_numpy()[-5:])
+
+    def test_append_that_replaces_more_rows_than_it_adds(self):
+        data = make_candles(20)
+        candle_cache.write('NSE_EQ|X', '5m', data)
+        candle_cache.append('NSE_EQ|X', '5m', data.iloc[10:13])
+        cached = candle_cache.load('NSE_EQ|X', '5m')
+        self.assertEqual(len(cached), 13)
+        np.testing.assert_array_equal(cached['close'].to_numpy(), data['close'].to_numpy()[:13])
+
+    def test_append_needs_a_cached_history(self):
+        candle_cache.append('NSE_EQ|X', '5m', make_candles(3))
+        self.assertIsNone(candle_cache.load('NSE_EQ|X', '5m'))
+
+
+class RingBufferTests(SimpleTestCase):
+    def test_growing_keeps_the_same_buffer_and_its_rows(self):
+        data = make_candles(60)
+        buffer = ring_buffer.get_buffer('TEST|GROW', '5m', 20, seed=lambda: data.iloc[:40].tail(20))
+        for timestamp, row in zip(data.index[40:45], data.iloc[40:45].itertuples(index=False)):
+            buffer.append(timestamp, row.open, row.high, row.low, row.close, row.volume)
+
+        grown = ring_buffer.get_buffer('TEST|GROW', '5m', 50, seed=lambda: data.iloc[:40].tail(50))
+        self.assertIs(grown, buffer)
+        self.assertIs(ring_buffer.find_buffer('TEST|GROW', '5m'), buffer)
+        self.assertEqual(buffer.capacity, 50)
+        frame = buffer.frame()
+        self.assertEqual(len(frame), 45)
+        np.testing.assert_array_equal(frame['close'].to_numpy(), data['close'].to_numpy()[:45])
+
+        # Appends after growing land in the buffer everyone holds
+        row = data.iloc[45]
+        buffer.append(data.index[45], row.open, row.high, row.low, row.close, row.volume)
+        self.assertEqual(ring_buffer.find_buffer('TEST|GROW', '5m').frame(1)['close'].iloc[0], row.close)
+
+
+def ist(*args):
+    return datetime(*args, tzinfo=IST)
+
+
+@override_settings(MARKET_HOLIDAYS=['2026-10-20'])
+class MarketHoursTests(SimpleTestCase):
+    # 2026-10-16 is a Friday and 2026-10-20, a Tuesday, is a holiday
+
+    def test_candle_start_is_aligned_to_the_open(self):
+        self.assertEqual(candle_start('1h', ist(2026, 10, 16, 9, 15)), ist(2026, 10, 16, 9, 15))
+        self.assertEqual(candle_start('1h', ist(2026, 10, 16, 10, 14)), ist(2026, 10, 16, 9, 15))
+        self.assertEqual(candle_start('15m', ist(2026, 10, 16, 15, 29)), ist(2026, 10, 16, 15, 15))
+        self.assertEqual(candle_start('1d', ist(2026, 10, 16, 12, 0)), ist(2026, 10, 16, 9, 15))
+
+    def test_candle_start_is_none_outside_the_session(self):
+        self.assertIsNone(candle_start('5m', ist(2026, 10, 16, 9, 14)))
+        self.assertIsNone(candle_start('5m', ist(2026, 10, 16, 15, 30)))
+        self.assertIsNone(candle_start('5m', ist(2026, 10, 17, 11, 0)))  # Saturday
+        self.assertIsNone(candle_start('5m', ist(2026, 10, 20, 11, 0)))  # holiday
+
+    def test_next_candle_close_within_the_session(self):
+        self.assertEqual(next_candle_close('5m', ist(2026, 10, 16, 9, 15)), ist(2026, 10, 16, 9, 20))
+        self.assertEqual(next_candle_close('5m', ist(2026, 10, 16, 9, 19, 59)), ist(2026, 10, 16, 9, 20))
+        self.assertEqual(next_candle_close('5m', ist(2026, 10, 16, 9, 20)), ist(2026, 10, 16, 9, 25))
+        self.assertEqual(next_candle_close('1h', ist(2026, 10, 16, 15, 0)), ist(2026, 10, 16, 15, 15))
+        # The last hourly candle is cut short by the close
+        self.assertEqual(next_candle_close('1h', ist(2026, 10, 16, 15, 15)), ist(2026, 10, 16, 15, 30))
+        self.assertEqual(next_candle_close('1d', ist(2026, 10, 16, 10, 0)), ist(2026, 10, 16, 15, 30))
+
+    def test_next_candle_close_before_the_open(self):
+        self.assertEqual(next_candle_close('15m', ist(2026, 10, 16, 8, 0)), ist(2026, 10, 16, 9, 30))
+
+    def test_next_candle_close_skips_weekends_and_holidays(self):
+        # Friday after the close: Saturday and Sunday are skipped
+        self.assertEqual(next_candle_close('5m', ist(2026, 10, 16, 15, 30)), ist(2026, 10, 19, 9, 20))
+        # Monday after the close: Tuesday is a holiday
+        self.assertEqual(next_candle_close('1d', ist(2026, 10, 19, 16, 0)), ist(2026, 10, 21, 15, 30))
+
+    def test_closed_candles_drop_the_one_just_opened(self):
+        data = make_candles(4).set_axis(pd.date_range('2026-10-16 09:15', periods=4, freq='5min', tz=IST))
+        # Checked two seconds after the 09:30 close: the 09:30 candle is still forming
+        closed = closed_candles(data, '5m', ist(2026, 10, 16, 9, 30, 2))
+        self.assertEqual(list(closed.index), list(data.index[:3]))
+        # After the session every candle is closed
+        self.assertEqual(len(closed_candles(data, '5m', ist(2026, 10, 16, 15, 30, 2))), 4)
+
+        daily = make_candles(3).set_axis(pd.date_range('2026-10-14', periods=3, freq='D', tz=IST))
+        self.assertEqual(len(closed_candles(daily, '1d', ist(2026, 10, 16, 11, 0))), 2)
+        self.assertEqual(len(closed_candles(daily, '1d', ist(2026, 10, 16, 15, 30, 2))), 3)
+
+    def test_is_current_candle(self):
+        now = ist(2026, 10, 16, 10, 7)
+        self.assertTrue(is_current_candle('5m', ist(2026, 10, 16, 10, 5), now))
+        self.assertFalse(is_current_candle('5m', ist(2026, 10, 16, 10, 0), now))
+        self.assertTrue(is_current_candle('1D', ist(2026, 10, 16, 0, 0), now))
+        self.assertFalse(is_current_candle('1D', ist(2026, 10, 15, 0, 0), now))
+        self.assertFalse(is_current_candle('5m', ist(2026, 10, 16, 15, 25), ist(2026, 10, 16, 18, 0)))
+
+
+def make_strategy(user, status='RUNNING', **setup_fields):
+    setup = TradingSetup.objects.create(
+        user=user, name='Test setup', indicator='RSI', timeframe='5m', exchange='NSE',
+        type='EQ', market='CASH', symbol='NSE_EQ|X', quantity=2, **setup_fields
+    )
+    return Strategy.objects.create(user=user, name='Test strategy', setup=setup, status=status)
+
+
+@mock.patch('accounts.upstox_api.bot_log')
+class RunStrategyTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='trader')
+        self.strategy = make_strategy(self.user)
+        self.bot = TradingBot(self.user)
+        self.bot.generate_signal = mock.Mock(return_value='buy')
+        self.bot.execute_trade = mock.Mock()
+
+    def test_running_strategy_orders_and_saves_its_signal(self, bot_log):
+        self.bot.run_strategy(self.strategy, make_candles(30), price=101.5)
+        self.bot.execute_trade.assert_called_once()
+        self.strategy.refresh_from_db()
+        self.assertEqual((self.strategy.status, self.strategy.last_signal), ('RUNNING', 'buy'))
+
+    def test_strategy_stopped_since_it_was_loaded_does_not_order(self, bot_log):
+        Strategy.objects.filter(pk=self.strategy.pk).update(status='STOPPED')
+        self.bot.run_strategy(self.strategy, make_candles(30), price=101.5)
+        self.bot.execute_trade.assert_not_called()
+        self.strategy.refresh_from_db()
+        self.assertEqual((self.strategy.status, self.strategy.last_signal), ('STOPPED', None))
+
+    def test_saving_the_signal_keeps_a_stop_made_meanwhile(self, bot_log):
+        def stop(*args, **kwargs):
+            Strategy.objects.filter(pk=self.strategy.pk).update(status='STOPPED')
+        self.bot.execute_trade.side_effect = stop
+        self.bot.run_strategy(self.strategy, make_candles(30), price=101.5)
+        self.strategy.refresh_from_db()
+        self.assertEqual((self.strategy.status, self.strategy.last_signal), ('STOPPED', 'buy'))
+
+
+class RealTimeStreamTests(SimpleTestCase):
+    def setUp(self):
+        from real_time_trading_bot import RealTimeTradingBot
+        self.bot = RealTimeTradingBot()
+        self.symbol = f'NSE_EQ|{self._testMethodName}'
+        setup = TradingSetup(symbol=self.symbol, indicator='RSI', timeframe='5m')
+        self.strategy = Strategy(id=1, name='Test strategy', setup=setup)
+
+    def test_synthetic_frame_is_never_fed_to_the_streams(self):
+        synthetic = make_candles(30)
+        synthetic.attrs['synthetic'] = True
+        self.assertIsNone(self.bot._calculate_indicator(self.strategy, synthetic))
+        self.assertNotIn((self.symbol, '5m', 'RSI'), indicator_engine._streams)
+
+    def test_stream_restarts_when_timestamps_become_timezone_aware(self):
+        naive = make_candles(30)
+        self.bot._calculate_indicator(self.strategy, naive)
+        aware = make_candles(40, seed=9).tz_localize('Asia/Kolkata').tz_convert('UTC')
+        result = self.bot._calculate_indicator(self.strategy, aware)
+        self.assertEqual(result.signal, compute_indicator('RSI', aware).signal)
+        self.assertEqual(indicator_engine._streams[(self.symbol, '5m', 'RSI')].last_timestamp, aware.index[-1])
+
+    def test_views_read_the_bot_stream_for_the_same_candles(self):
+        data = make_candles(60)
+        streamed = self.bot._calculate_indicator(self.strategy, data)
+        with mock.patch.object(indicator_engine, 'compute_indicator') as compute:
+            result = indicator_engine.get_indicator(self.symbol, '5m', 'RSI', data)
+        compute.assert_not_called()
+        self.assertEqual((result.value, result.signal), (streamed.value, streamed.signal))
+        self.assertAlmostEqual(result.value, float(compute_indicator('RSI', data).values[-1]), places=6)
+
+        # A newer candle the stream has not seen is computed
+        newer = pd.concat([data, make_candles(1, seed=3).set_axis([data.index[-1] + pd.Timedelta('5min')])])
+        with mock.patch.object(indicator_engine, 'compute_indicator', wraps=compute_indicator) as compute:
+            indicator_engine.get_indicator(self.symbol, '5m', 'RSI', newer)
+        compute.assert_called_once()
+
+
+class SharedCacheTestCase(SimpleTestCase):
+    """Points the shared cache at a fresh SQLite file for each test"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.backend = SQLiteBackend(f'{directory.name}/shared.sqlite3')
+        patcher = mock.patch.object(shared_cache, 'backend', self.backend)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+
+def add_in_process(path, key, results):
+    results.put(SQLiteBackend(path).add(key, os.getpid(), 10))
+
+
+class SharedCacheCoalescingTests(SharedCacheTestCase):
+    def test_concurrent_misses_share_one_read(self):
+        cache = SharedCache(self.backend, {'ltp': 5})
+        release = threading.Event()
+        loads = []
+
+        def load():
+            loads.append(1)
+            release.wait(5)
+            return {'ltp': 101.5}
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(cache.fetch('ltp', 'NSE_EQ|X', load)))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        deadline = time.monotonic() + 5
+        while cache.stats().get('ltp', {}).get('coalesced', 0) < 7 and time.monotonic() < deadline:
+            time.sleep(0.001)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(loads), 1)
+        self.assertEqual(results, [{'ltp': 101.5}] * 8)
+        self.assertEqual(cache.stats()['ltp']['coalesced'], 7)
+
+    def test_add_takes_a_lock_in_one_process_only(self):
+        context = multiprocessing.get_context('fork')
+        results = context.Queue()
+        processes = [
+            context.Process(target=add_in_process, args=(self.backend.path, 'lock:ltp:NSE_EQ|X', results))
+            for _ in range(6)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        self.assertEqual(sorted(results.get(timeout=5) for _ in processes), [False] * 5 + [True])
+
+    def test_waits_for_the_read_another_process_holds_the_lock_for(self):
+        cache = SharedCache(self.backend, {'ltp': 5})
+        other = SQLiteBackend(self.backend.path)
+        other.add('lock:ltp:NSE_EQ|X', 'other', 10)
+        threading.Timer(0.1, other.set, args=('ltp:NSE_EQ|X', {'ltp': 99.0}, 5)).start()
+        load = mock.Mock(return_value={'ltp': 1.0})
+        self.assertEqual(cache.fetch('ltp', 'NSE_EQ|X', load), {'ltp': 99.0})
+        load.assert_not_called()
+        self.assertEqual(cache.stats()['ltp']['coalesced'], 1)
+
+    def test_reads_for_itself_when_the_other_process_gives_up(self):
+        cache = SharedCache(self.backend, {'ltp': 5})
+        other = SQLiteBackend(self.backend.path)
+        other.add('lock:ltp:NSE_EQ|X', 'other', 10)
+        threading.Timer(0.1, other.delete, args=('lock:ltp:NSE_EQ|X',)).start()
+        self.assertEqual(cache.fetch('ltp', 'NSE_EQ|X', lambda: {'ltp': 1.0}), {'ltp': 1.0})
+        self.assertEqual(self.backend.get('ltp:NSE_EQ|X'), {'ltp': 1.0})
+
+class StrategyStateTests(SharedCacheTestCase):
+    def test_every_published_state_is_kept(self):
+        setup = TradingSetup(symbol='NSE_EQ|X', indicator='RSI', timeframe='5m')
+        for strategy_id in range(1, 501):
+            strategy = Strategy(id=strategy_id, user_id=1, name='Test strategy', setup=setup, status='RUNNING')
+            strategy_state.publish(strategy, 101.5, 55.0, 'hold')
+        states = strategy_state.snapshot(range(1, 501))
+        self.assertEqual(len(states), 500)
+        self.assertEqual(states[250]['indicator_value'], 55.0)
+        self.assertFalse(states[250]['stale'])
+
+
+class EventStreamCatchUpTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='viewer')
+        self.ids = [
+            BotLog.objects.create(user=self.user, log_type='INFO', message=f'log {i}').id for i in range(5)
+        ]
+        BotLog.objects.create(user=User.objects.create(username='other'), log_type='INFO', message='not mine')
+
+    def frame_ids(self, frames):
+        return [int(frame.split('\n')[0][len('id: '):]) for frame in frames if frame.startswith('id: ')]
+
+    def test_catch_up_resumes_after_the_last_id(self):
+        stream = event_stream.EventStream(self.user.id, since_id=self.ids[1])
+        frames = stream._log_frames()
+        self.assertEqual(self.frame_ids(frames), self.ids[2:])
+        self.assertTrue(all('event: bot_log' in frame for frame in frames))
+        self.assertEqual(stream.last_id, self.ids[-1])
+        self.assertEqual(stream._log_frames(), [])
+
+    @mock.patch.object(event_stream, 'CATCHUP_LIMIT', 2)
+    def test_capped_catch_up_asks_the_client_to_resync(self):
+        stream = event_stream.EventStream(self.user.id, since_id=self.ids[0])
+        frames = stream._log_frames()
+        self.assertTrue(frames[0].startswith('event: resync'))
+        self.assertEqual(self.frame_ids(frames), self.ids[-2:])
+
+        # A catch-up that fits sends no resync
+        stream = event_stream.EventStream(self.user.id, since_id=self.ids[2])
+        frames = stream._log_frames()
+        self.assertEqual(self.frame_ids(frames), self.ids[3:])
+        self.assertFalse(any('event: resync' in frame for frame in frames))
+
+
+
+class LogRetentionTests(TestCase):
+    today = date(2026, 3, 20)
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(BOT_LOG_ARCHIVE_DIR=directory.name, BOT_LOG_RETENTION_DAYS={'default': 30})
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.user = User.objects.create(username='archiver')
+        self.old_day = date(2026, 2, 10)
+        for i in range(3):
+            self.log(f'old {i}', datetime(2026, 2, 10, 10, i, tzinfo=IST))
+        self.log('recent', datetime(2026, 3, 19, 10, 0, tzinfo=IST))
+
+    def log(self, message, timestamp):
+        return BotLog.objects.create(
+            user=self.user, log_type='INFO', message=message, details={'price': 101.5}, timestamp=timestamp
+        )
+
+    def test_compacted_rows_can_be_read_back(self):
+        self.assertEqual(log_retention.compact(self.today), {self.old_day: 3})
+        self.assertEqual(list(BotLog.objects.values_list('message', flat=True)), ['recent'])
+        rows = list(log_retention.read_archive(self.old_day))
+        self.assertEqual([row['message'] for row in rows], ['old 0', 'old 1', 'old 2'])
+        self.assertEqual(rows[0]['details'], {'price': 101.5})
+        self.assertEqual(rows[0]['user_id'], self.user.id)
+
+        # A later run appends to the day's archive
+        self.log('late arrival', datetime(2026, 2, 10, 15, 0, tzinfo=IST))
+        log_retention.compact(self.today)
+        self.assertEqual(len(list(log_retention.read_archive(self.old_day))), 4)
+
+    def test_rerun_after_a_failed_delete_archives_each_row_once(self):
+        with mock.patch.object(log_retention.transaction, 'atomic', side_effect=RuntimeError('killed')):
+            with self.assertRaises(RuntimeError):
+                log_retention.compact(self.today)
+        self.assertEqual(BotLog.objects.count(), 4)
+
+        self.assertEqual(log_retention.compact(self.today), {})
+        self.assertEqual(BotLog.objects.count(), 1)
+        self.assertEqual(len(list(log_retention.read_archive(self.old_day))), 3)
+
+    def test_failed_write_leaves_the_archive_untouched(self):
+        log_retention.compact(self.today)
+        self.log('late arrival', datetime(2026, 2, 10, 15, 0, tzinfo=IST))
+        with mock.patch.object(log_retention.json, 'dumps', side_effect=RuntimeError('disk full')):
+            with self.assertRaises(RuntimeError):
+                log_retention.compact(self.today)
+        self.assertEqual(len(list(log_retention.read_archive(self.old_day))), 3)
+        self.assertFalse(os.path.exists(log_retention.temp_archive_path(self.old_day)))
+        self.assertEqual(BotLog.objects.count(), 2)
+
+class CandleAggregatorTests(SimpleTestCase):
+    def setUp(self):
+        self.aggregator = CandleAggregator(bus=mock.Mock())
+        self.aggregator.timeframes = {'NSE_EQ|X': ('5m', '1d')}
+
+    def tick(self, *when, ltp=100.0):
+        self.aggregator.on_tick({'instrument_key': 'NSE_EQ|X', 'ltp': ltp, 'ltq': 10, 'timestamp': ist(*when)})
+
+    def test_bars_are_stamped_like_stored_candles(self):
+        self.tick(2026, 10, 16, 9, 15, 3, ltp=100.0)
+        self.tick(2026, 10, 16, 9, 19, 59, ltp=102.0)
+        self.assertEqual(self.aggregator.forming[('NSE_EQ|X', '5m')][0], ist(2026, 10, 16, 9, 15))
+        # Daily bars at midnight IST, like Upstox's daily candles, not at the 09:15 open
+        self.assertEqual(self.aggregator.forming[('NSE_EQ|X', '1d')][0], ist(2026, 10, 16))
+
+        self.aggregator.close_due(ist(2026, 10, 16, 15, 30))
+        closed = [call.args[1] for call in self.aggregator.bus.publish.call_args_list]
+        self.assertEqual([(bar['timeframe'], bar['timestamp']) for bar in closed], [
+            ('5m', ist(2026, 10, 16, 9, 15)),
+            ('1d', ist(2026, 10, 16)),
+        ])
+        self.assertEqual((closed[1]['open'], closed[1]['close'], closed[1]['volume']), (100.0, 102.0, 20))
+
+
+@mock.patch('accounts.upstox_api.bot_log')
+class ExecuteTradeTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='trader')
+        self.strategy = make_strategy(self.user)
+        self.bot = TradingBot(self.user)
+        self.bot.upstox.access_token = 'token'
+        self.bot.upstox.place_order = mock.Mock(return_value={'status': 'success', 'data': {'order_id': 'ORD1'}})
+
+    def test_without_a_price_the_order_is_priced_at_the_ltp(self, bot_log):
+        # Upstox keys quote data by instrument, so the LTP must be read per symbol
+        self.bot.upstox.get_live_quotes = mock.Mock(return_value={'NSE_EQ|X': {'ltp': 101.5}})
+        trade = self.bot.execute_trade(self.strategy.setup, 'buy')
+        self.assertEqual(trade.price, Decimal('101.50'))
+        self.assertEqual(trade.total_amount, Decimal('203.00'))
+
+    def test_no_order_without_a_price(self, bot_log):
+        self.bot.upstox.get_live_quotes = mock.Mock(return_value={})
+        self.assertIsNone(self.bot.execute_trade(self.strategy.setup, 'buy'))
+        self.bot.upstox.place_order.assert_not_called()
+        self.assertFalse(Trade.objects.exists())
+
+    def test_order_is_sent_before_the_trade_row_is_written(self, bot_log):
+        rows_at_order = []
+        response = self.bot.upstox.place_order.return_value
+        self.bot.upstox.place_order.side_effect = lambda **order: rows_at_order.append(Trade.objects.count()) or response
+        trade = self.bot.execute_trade(self.strategy.setup, 'buy', price=101.5)
+        self.assertEqual(rows_at_order, [0])
+        self.assertEqual((trade.status, trade.upstox_order_id), ('EXECUTED', 'ORD1'))
+        self.assertEqual(bot_log.call_args.kwargs['log_type'], 'TRADE_EXECUTED')
+
+    def test_rejected_order_is_recorded_as_failed(self, bot_log):
+        self.bot.upstox.place_order.return_value = {'status': 'error', 'errors': [{'message': 'Insufficient funds'}]}
+        self.assertIsNone(self.bot.execute_trade(self.strategy.setup, 'buy', price=101.5))
+        trade = Trade.objects.get()
+        self.assertEqual((trade.status, trade.upstox_order_id), ('FAILED', None))
+        self.assertEqual(bot_log.call_args.kwargs['log_type'], 'TRADE_FAILED')
+
+    def test_placed_order_that_cannot_be_recorded_is_logged_with_its_id(self, bot_log):
+        with mock.patch.object(Trade.objects, 'create', side_effect=RuntimeError('database is locked')):
+            self.assertIsNone(self.bot.execute_trade(self.strategy.setup, 'buy', price=101.5))
+        self.bot.upstox.place_order.assert_called_once()
+        fields = bot_log.call_args.kwargs
+        self.assertEqual(fields['log_type'], 'TRADE_EXECUTED')
+        self.assertIn('placed (Order ID: ORD1) but not recorded', fields['message'])
+        self.assertEqual(fields['details']['record_error'], 'database is locked')
+
+
+class FakeClock:
+    def __init__(self, now):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+    monotonic = time
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class RateLimiterTests(SharedCacheTestCase):
+    def limiter(self, limits, order_reserve=0.0):
+        return rate_limiter.RateLimiter(self.backend, limits, order_reserve)
+
+    def test_no_burst_across_a_window_edge(self):
+        limiter = self.limiter({'data': {'second': 5}})
+        clock = FakeClock(1000.95)
+        with mock.patch.object(rate_limiter, 'time', clock):
+            for _ in range(5):
+                self.assertEqual(limiter._take('A', 'data', False), 0)
+            # A fixed window would start over at 1001.0
+            clock.now = 1001.05
+            self.assertAlmostEqual(limiter._take('A', 'data', False), 0.95)
+            clock.now = 1002.0
+            self.assertEqual(limiter._take('A', 'data', False), 0)
+
+    def test_acquire_waits_for_the_window_to_slide(self):
+        limiter = self.limiter({'data': {'second': 2, 'minute': 100}})
+        clock = FakeClock(2000.0)
+        with mock.patch.object(rate_limiter, 'time', clock):
+            waits = [limiter.acquire('A', 'data') for _ in range(6)]
+        self.assertEqual(waits[:2], [0.0, 0.0])
+        # Two requests per rolling second
+        self.assertGreaterEqual(clock.now - 2000.0, 2.0)
+        self.assertEqual(limiter.stats()['data']['requests'], 6)
+
+    def test_order_reads_leave_the_reserve_to_orders(self):
+        limiter = self.limiter({'order': {'second': 10}}, order_reserve=0.3)
+        with mock.patch.object(rate_limiter, 'time', FakeClock(3000.0)):
+            self.assertEqual([limiter._take('A', 'order', False) for _ in range(7)], [0] * 7)
+            self.assertGreater(limiter._take('A', 'order', False), 0)
+            self.assertEqual([limiter._take('A', 'order', True) for _ in range(3)], [0] * 3)
+            self.assertGreater(limiter._take('A', 'order', True), 0)
+
+    def test_retry_after_blocks_the_group_for_the_account(self):
+        limiter = self.limiter({'data': {'second': 50}})
+        clock = FakeClock(4000.0)
+        with mock.patch.object(rate_limiter, 'time', clock):
+            self.assertEqual(limiter.throttle('A', 'data', '2'), 2.0)
+            self.assertAlmostEqual(limiter._take('A', 'data', False), 2.0)
+            self.assertEqual(limiter._take('B', 'data', False), 0)
+            self.assertGreaterEqual(limiter.acquire('A', 'data'), 2.0)
+        self.assertEqual(limiter.stats()['data']['throttled'], 1)
+
+    def test_reads_wait_for_the_accounts_waiting_orders(self):
+        limiter = self.limiter({'order': {'second': 1}})
+        limiter.acquire('A', 'order', priority=True)
+        finished = []
+        order = threading.Thread(target=lambda: finished.append(('order', limiter.acquire('A', 'order', priority=True))))
+        order.start()
+        while not limiter._priority_waiting[('A', 'order')]:
+            time.sleep(0.001)
+        # Another account is not held back by A's waiting order
+        self.assertEqual(limiter.acquire('B', 'order'), 0.0)
+        limiter.acquire('A', 'order')
+        finished.append(('read', None))
+        order.join()
+        self.assertEqual([name for name, _ in finished], ['order', 'read'])
+
+    def test_acquire_gives_up_at_the_deadline(self):
+        limiter = self.limiter({'data': {'second': 1}})
+        clock = FakeClock(5000.0)
+        with mock.patch.object(rate_limiter, 'time', clock):
+            self.assertEqual(limiter.acquire('A', 'data', deadline=5000.5), 0.0)
+            self.assertIsNone(limiter.acquire('A', 'data', deadline=5000.5))
+            # Turned away without sleeping or taking a slot
+            self.assertEqual(clock.now, 5000.0)
+            self.assertGreaterEqual(limiter.acquire('A', 'data', deadline=5002.0), 0.9)
+        self.assertEqual(limiter.stats()['data']['expired'], 1)
+        self.assertEqual(limiter.stats()['data']['requests'], 2)
+
+    def test_gateway_retries_stop_at_the_request_deadline(self):
+        api = UpstoxAPI()
+        clock = FakeClock(6000.0)
+        session = mock.Mock()
+        session.request.return_value = mock.Mock(status_code=503, headers={})
+        token = request_deadline.set(6001.0)
+        try:
+            with mock.patch('accounts.upstox_api.time', clock), \
+                    mock.patch('accounts.upstox_api.get_session', return_value=session), \
+                    mock.patch('accounts.upstox_api.rate_limiter') as limiter:
+                limiter.acquire.return_value = 0.0
+                response = api._get('https://api.upstox.com/v2/market-quote/ltp')
+        finally:
+            request_deadline.reset(token)
+        self.assertEqual(response.status_code, 503)
+        # Backoff of 0.5s then 1s: the second retry would end after the deadline
+        self.assertEqual(session.request.call_count, 2)
+        self.assertEqual(clock.now, 6000.5)
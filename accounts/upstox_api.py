@@ -1,9 +1,97 @@
 import requests
+import contextvars
 import json
+import threading
 import time
 from datetime import datetime, timedelta
 from decimal import Decimal
-from .models import BrokerageIntegration, Trade, MarketData, BotLog
+from urllib.parse import quote
+from django.utils import timezone
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from .models import BrokerageIntegration, Trade, MarketData, Strategy
+from .candle_store import CandleStore, MIN_ANALYSIS_CANDLES, parse_candle_timestamp, resample_candles
+from .market_hours import IST, TIMEFRAME_MINUTES
+from .log_sink import bot_log
+from .shared_cache import shared_cache
+from .rate_limiter import rate_limiter
+
+# Upstox accepts at most this many instrument keys per market-quote call
+LTP_BATCH_SIZE = 500
+
+# (connect, read) timeouts in seconds for each kind of endpoint
+TIMEOUTS = {
+    'auth': (3.05, 10),
+    'account': (3.05, 10),
+    'data': (3.05, 15),
+    'order': (3.05, 5),
+}
+
+# Upstox v2 candle interval fetched for each TradingSetup timeframe. Upstox only serves
+# 1minute, 30minute and day candles (plus week and month); other timeframes are built
+# from the smaller candles by grouping them into session-aligned candles.
+UPSTOX_INTERVALS = {
+    '1m': '1minute',
+    '5m': '1minute',
+    '15m': '1minute',
+    '30m': '30minute',
+    '1h': '30minute',
+    '1d': 'day',
+    '1D': 'day',
+}
+
+# Minutes per candle of the Upstox intervals that have today's candles on the intraday endpoint
+INTRADAY_INTERVALS = {'1minute': 1, '30minute': 30}
+
+# How long an instrument whose candles Upstox rejected is not asked again (seconds)
+REJECTED_CANDLES_TTL = 5 * 60
+
+# (symbol, interval) -> time until which its candles are not requested
+_rejected_candles = {}
+
+# Keep-alive connections held open per session
+POOL_SIZE = 20
+
+# Times a request throttled with a 429 is sent again once the limit allows
+THROTTLE_RETRIES = 1
+
+# Times a GET that hit a gateway error or a read timeout is sent again by _request, with
+# exponential backoff from GATEWAY_BACKOFF seconds. Each attempt takes a rate limit token.
+# POSTs are never retried on a response: a resent order could fill twice.
+GATEWAY_RETRIES = 3
+GATEWAY_BACKOFF = 0.5
+GATEWAY_ERRORS = (500, 502, 503, 504)
+
+# Epoch time by which the running check needs its answers (the scheduler sets it to the
+# group's next candle deadline). Rate limit waits and retries that would run past it are
+# given up, so a worker thread never sleeps through the next check. Orders ignore it.
+request_deadline = contextvars.ContextVar('request_deadline', default=None)
+
+# urllib3 only retries GET connections that never reached Upstox, which cost no rate limit
+RETRY = Retry(
+    total=3,
+    connect=3,
+    read=0,
+    status=0,
+    backoff_factor=0.5,
+    allowed_methods=frozenset(['GET']),
+    raise_on_status=False,
+)
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+def get_session(access_token=None):
+    """Return the pooled keep-alive session shared by every client using this token"""
+    with _sessions_lock:
+        session = _sessions.get(access_token)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE, max_retries=RETRY)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _sessions[access_token] = session
+        return session
 
 class UpstoxAPI:
     def __init__(self, user=None):
@@ -33,6 +121,70 @@ class UpstoxAPI:
             'Accept': 'application/json'
         }
     
+    def _request(self, method, url, endpoint='data', **kwargs):
+        """
+        Send a request on the shared session; returns None if the connection failed or timed
+        out, or if request_deadline passed before it could be sent
+        """
+        kwargs.setdefault('headers', self._get_headers())
+        kwargs.setdefault('timeout', TIMEOUTS[endpoint])
+        group = 'order' if endpoint == 'order' else 'data'
+        # Placing and cancelling orders take the priority lane
+        priority = group == 'order' and method == 'POST'
+        deadline = None if priority else request_deadline.get()
+        throttled = failed = 0
+        response = None
+        while True:
+            if rate_limiter.acquire(self._account_key(), group, priority, deadline) is None:
+                print(f"DEBUG: {method} {url} given up: no rate limit slot before the next check")
+                return response
+            try:
+                response = get_session(self.access_token).request(method, url, **kwargs)
+            except requests.ReadTimeout as e:
+                print(f"DEBUG: {method} {url} failed: {e}")
+                if method != 'GET' or failed >= GATEWAY_RETRIES:
+                    return None
+                response = None
+            except requests.RequestException as e:
+                print(f"DEBUG: {method} {url} failed: {e}")
+                return None
+            
+            if response is not None and response.status_code == 429:
+                if throttled >= THROTTLE_RETRIES:
+                    return response
+                throttled += 1
+                retry_after = rate_limiter.throttle(self._account_key(), group, response.headers.get('Retry-After'))
+                print(f"⚠️ Upstox rate limit hit on {url}; holding {group} requests for {retry_after:.1f}s")
+                # A throttled request was rejected unprocessed, so even an order can be sent again
+                continue
+            
+            if response is not None and (method != 'GET' or response.status_code not in GATEWAY_ERRORS):
+                return response
+            if failed >= GATEWAY_RETRIES:
+                return response
+            delay = GATEWAY_BACKOFF * 2 ** failed
+            try:
+                delay = max(delay, float(response.headers.get('Retry-After')))
+            except (AttributeError, TypeError, ValueError):
+                pass
+            if deadline is not None and time.time() + delay > deadline:
+                print(f"DEBUG: Not retrying {method} {url}: the next check is due first")
+                return response
+            failed += 1
+            print(f"DEBUG: Retrying {method} {url} in {delay:.1f}s ({failed}/{GATEWAY_RETRIES})")
+            time.sleep(delay)
+    
+    def _get(self, url, endpoint='data', **kwargs):
+        return self._request('GET', url, endpoint, **kwargs)
+    
+    def _post(self, url, endpoint='data', **kwargs):
+        return self._request('POST', url, endpoint, **kwargs)
+    
+    @staticmethod
+    def _json(response):
+        """Decode a successful response, None otherwise"""
+        return response.json() if response is not None and response.status_code == 200 else None
+    
     def refresh_access_token(self):
         """Refresh access token using refresh token"""
         integration = BrokerageIntegration.objects.filter(
@@ -51,112 +203,75 @@ class UpstoxAPI:
             "grant_type": "refresh_token"
         }
         
-        response = requests.post(url, data=data)
-        if response.status_code == 200:
+        response = self._post(url, 'auth', data=data, headers={'Accept': 'application/json'})
+        if response is not None and response.status_code == 200:
             token_data = response.json()
             integration.access_token = token_data.get('access_token')
             integration.refresh_token = token_data.get('refresh_token')
             integration.token_expiry = datetime.now() + timedelta(seconds=token_data.get('expires_in', 3600))
             integration.save()
             
+            # Drop the pool bound to the old token
+            with _sessions_lock:
+                _sessions.pop(self.access_token, None)
             self.access_token = integration.access_token
             self.refresh_token = integration.refresh_token
             return True
         return False
     
+    def _account_key(self):
+        """Identifies this account in the shared cache and the rate limiter"""
+        return self.user.pk if self.user else 'anonymous'
+    
     def get_profile(self):
         """Get user profile"""
         url = f"{self.base_url}/user/profile"
-        response = requests.get(url, headers=self._get_headers())
-        return response.json() if response.status_code == 200 else None
+        return shared_cache.fetch('profile', self._account_key(), lambda: self._json(self._get(url, 'account')))
     
     def get_holdings(self):
         """Get current holdings"""
         url = f"{self.base_url}/portfolio/long-term-holdings"
-        response = requests.get(url, headers=self._get_headers())
-        return response.json() if response.status_code == 200 else None
+        return shared_cache.fetch('holdings', self._account_key(), lambda: self._json(self._get(url, 'account')))
     
     def get_margins(self):
         """Get available margins"""
         url = f"{self.base_url}/user/get-margins"
-        response = requests.get(url, headers=self._get_headers())
-        return response.json() if response.status_code == 200 else None
+        return shared_cache.fetch('margins', self._account_key(), lambda: self._json(self._get(url, 'account')))
     
-    def get_market_data(self, symbol, interval='1D'):
-        """Get historical market data"""
-        # Try different symbol formats and endpoints
-        # Remove exchange prefix if present
-        clean_symbol = symbol.replace('NSE_EQ|', '').replace('BSE_EQ|', '')
-        
-        # Try different API versions and endpoints
-        endpoints_to_try = [
-            # v2 API endpoints
-            f"{self.base_url}/historical-candle/{symbol}/{interval}",
-            f"{self.base_url}/historical-candle/{symbol}",
-            f"{self.base_url}/historical-candle/{symbol}/1day",
-            f"{self.base_url}/historical-candle/{symbol}/1D",
-            f"{self.base_url}/historical-candle/{clean_symbol}/{interval}",
-            f"{self.base_url}/historical-candle/{clean_symbol}",
-            f"{self.base_url}/historical-candle/{clean_symbol}/1day",
-            f"{self.base_url}/historical-candle/{clean_symbol}/1D",
-            
-            # Try v1 API endpoints
-            "https://api.upstox.com/v1/historical-candle/{symbol}/{interval}",
-            "https://api.upstox.com/v1/historical-candle/{symbol}",
-            "https://api.upstox.com/v1/historical-candle/{clean_symbol}/{interval}",
-            "https://api.upstox.com/v1/historical-candle/{clean_symbol}",
-        ]
-        
-        # Add required parameters
-        params = {
-            'api-version': '2.0'
-        }
+    def get_market_data(self, symbol, interval='1D', from_date=None):
+        """Get candles for a TradingSetup timeframe, by default for the last 30 days or from from_date"""
+        today = timezone.localdate(timezone=IST)
+        start_date = from_date or today - timedelta(days=30)
         
-        # Add date range for historical data (last 30 days)
-        from datetime import datetime, timedelta
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=30)
-        
-        params['from'] = start_date.strftime('%Y-%m-%d')
-        params['to'] = end_date.strftime('%Y-%m-%d')
-        
-        for url in endpoints_to_try:
-            print(f"DEBUG: Trying endpoint: {url}")
-            print(f"DEBUG: With params: {params}")
-            
-            response = requests.get(url, headers=self._get_headers(), params=params)
-            
-            print(f"DEBUG: Response status: {response.status_code}")
-            print(f"DEBUG: Response content: {response.text[:200]}...")
-            
-            if response.status_code == 200:
-                return response.json()
-            elif response.status_code == 404:
-                print(f"DEBUG: 404 for endpoint: {url}")
-                continue
-            else:
-                print(f"DEBUG: Error {response.status_code} for endpoint: {url}")
-                continue
+        # Candles other processes fetched moments ago are reused
+        candles = shared_cache.fetch(
+            'candles',
+            f"{symbol}|{interval}|{start_date:%Y-%m-%d}|{today:%Y-%m-%d}",
+            lambda: self._get_historical(symbol, interval, start_date, today),
+        )
+        if candles is not None:
+            return candles
         
-        print(f"DEBUG: All endpoints failed for symbol: {symbol}")
+        print(f"DEBUG: No candles from Upstox for symbol: {symbol}")
         
         # Fallback: Try to get at least current price data
         print(f"DEBUG: Attempting fallback to live quote for {symbol}")
-        live_quote = self.get_live_quote(symbol)
-        if live_quote:
-            print(f"DEBUG: Got live quote as fallback: {live_quote}")
+        ltp = (self.get_live_quotes([symbol]).get(symbol) or {}).get('ltp')
+        if ltp:
+            print(f"DEBUG: Got live price as fallback: {ltp}")
             # Create minimal historical data from live quote
             # This is not ideal but provides some data for testing
             return {
                 'status': 'success',
+                'source': 'live_quote',
                 'data': {
                     'candles': [
                         [
                             int(datetime.now().timestamp()),
-                            float(live_quote.get('data', {}).get('ltp', 0)),
-                            float(live_quote.get('data', {}).get('ltp', 0)),
-                            float(live_quote.get('data', {}).get('ltp', 0)),
-                            float(live_quote.get('data', {}).get('ltp', 0)),
+                            float(ltp),
+                            float(ltp),
+                            float(ltp),
+                            float(ltp),
                             0  # volume not available in live quote
                         ]
                     ]
@@ -165,8 +280,57 @@ class UpstoxAPI:
         
         return None
     
+    def _get_historical(self, symbol, interval, start_date, today):
+        """
+        Candles from start_date to now in the Upstox response format, newest first, or None.
+        
+        Past days come from /historical-candle/{key}/{interval}/{to}/{from}, today's
+        from /historical-candle/intraday/{key}/{interval}; a start of today only
+        needs the intraday call.
+        """
+        upstox_interval = UPSTOX_INTERVALS.get(interval, interval)
+        cache_key = (symbol, upstox_interval)
+        if _rejected_candles.get(cache_key, 0) > time.time():
+            return None
+        instrument = quote(symbol, safe='')
+        
+        urls = []
+        if start_date < today or upstox_interval not in INTRADAY_INTERVALS:
+            urls.append(
+                f"{self.base_url}/historical-candle/{instrument}/{upstox_interval}"
+                f"/{today:%Y-%m-%d}/{start_date:%Y-%m-%d}"
+            )
+        if upstox_interval in INTRADAY_INTERVALS:
+            urls.append(f"{self.base_url}/historical-candle/intraday/{instrument}/{upstox_interval}")
+        
+        candles = {}
+        for url in urls:
+            print(f"DEBUG: Fetching candles: {url}")
+            response = self._get(url)
+            if response is None:
+                return None
+            if response.status_code != 200:
+                print(f"DEBUG: Error {response.status_code} for {url}: {response.text[:200]}")
+                if response.status_code in (400, 404):
+                    # Unknown instrument or interval; don't ask again for a while
+                    _rejected_candles[cache_key] = time.time() + REJECTED_CANDLES_TTL
+                return None
+            # Later URLs are newer, so today's intraday candles replace any overlap
+            for candle in (response.json().get('data') or {}).get('candles') or []:
+                candles[candle[0]] = candle
+        
+        rows = sorted(candles.values(), key=lambda candle: parse_candle_timestamp(candle[0]))
+        minutes = TIMEFRAME_MINUTES.get(interval)
+        if minutes and minutes != INTRADAY_INTERVALS.get(upstox_interval):
+            rows = resample_candles(rows, interval)
+        return {'status': 'success', 'data': {'candles': rows[::-1]}}
+    
     def get_live_quote(self, symbol):
         """Get live quote for a symbol"""
+        return shared_cache.fetch('quote', symbol, lambda: self._fetch_live_quote(symbol))
+    
+    def _fetch_live_quote(self, symbol):
+        """Ask the API for a live quote, trying each parameter format it has accepted"""
         url = f"{self.base_url}/market-quote/ltp"
         
         # Try different parameter formats
@@ -179,9 +343,11 @@ class UpstoxAPI:
         
         for params in params_to_try:
             print(f"DEBUG: Trying live quote with params: {params}")
-            response = requests.get(url, headers=self._get_headers(), params=params)
+            response = self._get(url, params=params)
             
-            if response.status_code == 200:
+            if response is None:
+                continue
+            elif response.status_code == 200:
                 print(f"DEBUG: Live quote success with params: {params}")
                 return response.json()
             else:
@@ -189,6 +355,47 @@ class UpstoxAPI:
         
         return None
     
+    def get_live_quotes(self, symbols):
+        """
+        Get last traded prices for many instruments with one request per
+        LTP_BATCH_SIZE keys. Returns {instrument_key: {'ltp': price, ...}};
+        instruments the API did not price are left out. Prices cached by any
+        process within the last second are not requested again.
+        """
+        return shared_cache.fetch_many('ltp', symbols, self._fetch_live_quotes)
+    
+    def _fetch_live_quotes(self, symbols):
+        url = f"{self.base_url}/market-quote/ltp"
+        symbols = list(dict.fromkeys(symbols))
+        quotes = {}
+        
+        for start in range(0, len(symbols), LTP_BATCH_SIZE):
+            batch = symbols[start:start + LTP_BATCH_SIZE]
+            response = self._get(url, params={'instrument_key': ','.join(batch)})
+            if response is None:
+                continue
+            elif response.status_code != 200:
+                print(f"DEBUG: Bulk live quote failed for {len(batch)} instruments: {response.status_code} - {response.text[:100]}")
+                continue
+            
+            # Response keys use 'EXCHANGE:TRADINGSYMBOL'; map back to the requested instrument key
+            for response_key, quote in (response.json().get('data') or {}).items():
+                instrument_key = quote.get('instrument_token') or response_key.replace(':', '|')
+                if instrument_key not in batch:
+                    trading_symbol = response_key.split(':')[-1]
+                    instrument_key = next((s for s in batch if s.split('|')[-1] == trading_symbol), instrument_key)
+                quotes[instrument_key] = dict(quote, ltp=quote.get('last_price', quote.get('ltp', 0)))
+        
+        return quotes
+
+    def get_market_feed_url(self):
+        """Get a single-use authorized websocket URL for the market data feed"""
+        data = self._json(self._get(f"{self.base_url}/feed/market-data-feed/authorize"))
+        if not data:
+            return None
+        feed = data.get('data') or {}
+        return feed.get('authorized_redirect_uri') or feed.get('authorizedRedirectUri')
+
     def place_order(self, symbol, quantity, side, order_type='MARKET', price=None):
         """Place an order"""
         url = f"{self.base_url}/order/place"
@@ -205,8 +412,9 @@ class UpstoxAPI:
         if price and order_type == 'LIMIT':
             order_data["price"] = price
         
-        response = requests.post(url, headers=self._get_headers(), json=order_data)
-        return response.json() if response.status_code == 200 else None
+        response = self._json(self._post(url, 'order', json=order_data))
+        self._invalidate_account()
+        return response
     
     def get_order_status(self, order_id):
         """Get order status"""
@@ -214,8 +422,9 @@ class UpstoxAPI:
         params = {
             'order_id': order_id
         }
-        response = requests.get(url, headers=self._get_headers(), params=params)
-        return response.json() if response.status_code == 200 else None
+        return shared_cache.fetch(
+            'order_status', order_id, lambda: self._json(self._get(url, 'order', params=params))
+        )
     
     def cancel_order(self, order_id):
         """Cancel an order"""
@@ -223,14 +432,21 @@ class UpstoxAPI:
         data = {
             "order_id": order_id
         }
-        response = requests.post(url, headers=self._get_headers(), json=data)
-        return response.json() if response.status_code == 200 else None
+        response = self._json(self._post(url, 'order', json=data))
+        self._invalidate_account()
+        shared_cache.invalidate('order_status', order_id)
+        return response
+    
+    def _invalidate_account(self):
+        """Forget cached account data an order may have changed"""
+        account = self._account_key()
+        for endpoint in ('margins', 'holdings', 'order_history'):
+            shared_cache.invalidate(endpoint, account)
     
     def get_order_history(self):
         """Get order history"""
         url = f"{self.base_url}/order/history"
-        response = requests.get(url, headers=self._get_headers())
-        return response.json() if response.status_code == 200 else None
+        return shared_cache.fetch('order_history', self._account_key(), lambda: self._json(self._get(url, 'order')))
     
     def search_instruments(self, query):
         """Search for instruments"""
@@ -238,20 +454,31 @@ class UpstoxAPI:
         params = {
             'query': query
         }
-        response = requests.get(url, headers=self._get_headers(), params=params)
-        return response.json() if response.status_code == 200 else None
+        return shared_cache.fetch('instruments', query, lambda: self._json(self._get(url, params=params)))
+
+def group_strategies_by_instrument(strategies):
+    """Group strategies by (symbol, timeframe) so market data is fetched once per group"""
+    groups = {}
+    for strategy in strategies:
+        key = (strategy.setup.symbol, strategy.setup.timeframe)
+        groups.setdefault(key, []).append(strategy)
+    return groups
 
 class TradingBot:
     def __init__(self, user=None):
         self.upstox = UpstoxAPI(user)
         self.user = user
+        self.candles = CandleStore(self.upstox)
     
-    def get_market_data_for_analysis(self, symbol, interval='1D', days=30):
-        """Get market data for technical analysis using Upstox API - Real-time only"""
+    def get_market_data_for_analysis(self, symbol, interval='1D', days=30, current_price=None):
+        """Get market data for technical analysis from the instrument's ring buffer, topped
+        up with the missing tail from Upstox through the candle store. Falls back to a
+        frame built from the live price when no history is available. Pass current_price
+        when the LTP was already fetched in a bulk quote."""
         try:
             # Check if Upstox API is available
             if not self.upstox.access_token:
-                BotLog.objects.create(
+                bot_log(
                     user=self.user,
                     log_type='ERROR',
                     message=f"❌ No Upstox API access token available for {symbol}",
@@ -263,12 +490,36 @@ class TradingBot:
                 )
                 return None
             
-            # Get live quote for current price
-            live_quote = self.upstox.get_live_quote(symbol)
-            current_price = 0
+            # Serve real history from the local candle store when we have enough of it
+            try:
+                self.candles.sync(symbol, interval, days)
+                df = self.candles.get_frame(symbol, interval)
+            except Exception as e:
+                print(f"DEBUG: Candle store unavailable for {symbol}: {e}")
+                df = None
             
-            if live_quote and live_quote.get('data'):
-                current_price = float(live_quote.get('data', {}).get('ltp', 0))
+            if df is not None and len(df) >= MIN_ANALYSIS_CANDLES:
+                bot_log(
+                    user=self.user,
+                    log_type='DATA_FETCH',
+                    message=f"✅ Candle history ready for {symbol} - Last close: ₹{df['close'].iloc[-1]:.2f}",
+                    details={
+                        'symbol': symbol,
+                        'interval': interval,
+                        'source': 'Candle store',
+                        'current_price': float(df['close'].iloc[-1]),
+                        'data_points': len(df),
+                        'mode': 'history'
+                    }
+                )
+                return df
+            
+            # Get live quote for current price unless the caller already has it
+            if current_price:
+                current_price = float(current_price)
+            else:
+                # The quote response is keyed by instrument, so read it through get_live_prices
+                current_price = self.get_live_prices([symbol]).get(symbol, 0)
             
             # If live quote doesn't work, try to get price from holdings
             if current_price == 0:
@@ -285,11 +536,11 @@ class TradingBot:
                             break
             
             if current_price == 0:
-                BotLog.objects.create(
+                bot_log(
                     user=self.user,
                     log_type='ERROR',
                     message=f"❌ Cannot get price for {symbol} from live quote or holdings",
-                    details={'symbol': symbol, 'interval': interval, 'live_quote': live_quote}
+                    details={'symbol': symbol, 'interval': interval}
                 )
                 return None
             
@@ -326,9 +577,11 @@ class TradingBot:
             df = pd.DataFrame(data_points)
             df.set_index('timestamp', inplace=True)
             df = df.sort_index()  # Sort by time
+            # Made-up candles on naive timestamps; long-lived indicator state must never be fed these
+            df.attrs['synthetic'] = True
             
             # Log successful data fetch
-            BotLog.objects.create(
+            bot_log(
                 user=self.user,
                 log_type='DATA_FETCH',
                 message=f"✅ Real-time data prepared for {symbol} - Current price: ₹{current_price:.2f}",
@@ -346,7 +599,7 @@ class TradingBot:
             
         except Exception as e:
             # Log the error
-            BotLog.objects.create(
+            bot_log(
                 user=self.user,
                 log_type='ERROR',
                 message=f"❌ Error preparing real-time data for {symbol}: {str(e)}",
@@ -360,17 +613,15 @@ class TradingBot:
             print(f"Error preparing real-time data: {e}")
             return None
     
-    def generate_signal(self, setup):
-        """Generate trading signal based on setup"""
-        from .indicators import (
-            rsi_signal, macd_signal, moving_average_signal,
-            vwap_signal, adx_signal, supertrend_signal
-        )
+    def generate_signal(self, setup, data=None):
+        """Generate trading signal based on setup, reusing already fetched market data if given"""
+        from .indicator_engine import INDICATORS, get_indicator
         
         # Get market data
-        data = self.get_market_data_for_analysis(setup.symbol, setup.timeframe)
         if data is None:
-            BotLog.objects.create(
+            data = self.get_market_data_for_analysis(setup.symbol, setup.timeframe)
+        if data is None:
+            bot_log(
                 user=self.user,
                 log_type='ERROR',
                 message=f"❌ Cannot generate signal for {setup.symbol} - No market data available",
@@ -379,7 +630,7 @@ class TradingBot:
             return None
         
         # Log indicator calculation start
-        BotLog.objects.create(
+        bot_log(
             user=self.user,
             log_type='INDICATOR_CALC',
             message=f"📈 Calculating {setup.indicator} for {setup.symbol} ({setup.timeframe})",
@@ -394,44 +645,22 @@ class TradingBot:
         
         try:
             # Generate signal based on indicator
-            if setup.indicator == 'RSI':
-                signal = rsi_signal(data['close'] if 'close' in data.columns else data['Close'])
-            elif setup.indicator == 'MACD':
-                signal = macd_signal(data['close'] if 'close' in data.columns else data['Close'])
-            elif setup.indicator == 'Moving Average':
-                signal = moving_average_signal(data['close'] if 'close' in data.columns else data['Close'])
-            elif setup.indicator == 'VWAP':
-                signal = vwap_signal(
-                    data['close'] if 'close' in data.columns else data['Close'],
-                    data['volume'] if 'volume' in data.columns else data['Volume']
-                )
-            elif setup.indicator == 'ADX':
-                signal = adx_signal(
-                    data['high'] if 'high' in data.columns else data['High'],
-                    data['low'] if 'low' in data.columns else data['Low'],
-                    data['close'] if 'close' in data.columns else data['Close']
-                )
-            elif setup.indicator == 'Supertrend':
-                signal = supertrend_signal(
-                    data['high'] if 'high' in data.columns else data['High'],
-                    data['low'] if 'low' in data.columns else data['Low'],
-                    data['close'] if 'close' in data.columns else data['Close']
-                )
-            else:
-                BotLog.objects.create(
+            if setup.indicator not in INDICATORS:
+                bot_log(
                     user=self.user,
                     log_type='ERROR',
                     message=f"❌ Unknown indicator: {setup.indicator} for {setup.symbol}",
-                    details={'symbol': setup.symbol, 'indicator': setup.indicator, 'available_indicators': ['RSI', 'MACD', 'Moving Average', 'VWAP', 'ADX', 'Supertrend']}
+                    details={'symbol': setup.symbol, 'indicator': setup.indicator, 'available_indicators': INDICATORS}
                 )
                 return None
+            signal = get_indicator(setup.symbol, setup.timeframe, setup.indicator, data).signal
             
             # Get latest price for logging
             latest_price = float(data['close'].iloc[-1] if 'close' in data.columns else data['Close'].iloc[-1])
             latest_volume = int(data['volume'].iloc[-1] if 'volume' in data.columns else data['Volume'].iloc[-1])
             
             # Log signal generation
-            BotLog.objects.create(
+            bot_log(
                 user=self.user,
                 log_type='SIGNAL_GENERATED',
                 message=f"🎯 Generated {signal.upper()} signal for {setup.symbol} using {setup.indicator}",
@@ -449,7 +678,7 @@ class TradingBot:
             return signal
             
         except Exception as e:
-            BotLog.objects.create(
+            bot_log(
                 user=self.user,
                 log_type='ERROR',
                 message=f"❌ Error calculating {setup.indicator} for {setup.symbol}: {str(e)}",
@@ -464,11 +693,19 @@ class TradingBot:
             print(f"Error generating signal: {e}")
             return None
     
-    def execute_trade(self, setup, signal, strategy=None):
-        """Execute trade based on signal with optional take profit and stop loss"""
+    def execute_trade(self, setup, signal, strategy=None, price=None, signal_at=None):
+        """
+        Execute trade based on signal with optional take profit and stop loss.
+        
+        `price` is the price the signal was evaluated at; when given no quote is
+        fetched before ordering. `signal_at` is the time.perf_counter() reading
+        taken when the signal was produced, for the signal-to-order latency.
+        The order goes out first; the Trade row and logs are written after it.
+        """
+        started = time.perf_counter()
         if not self.upstox.access_token:
             # Log error - no access token
-            BotLog.objects.create(
+            bot_log(
                 user=self.user,
                 log_type='ERROR',
                 message=f"No Upstox access token available for {setup.symbol}",
@@ -479,7 +716,7 @@ class TradingBot:
         # Check trade direction restrictions
         if setup.trade_direction == 'BUY' and signal == 'sell':
             # Log skipped trade - sell signal but only buy allowed
-            BotLog.objects.create(
+            bot_log(
                 user=self.user,
                 log_type='INFO',
                 message=f"⏸️ Skipped SELL signal for {setup.symbol} - Strategy is set to BUY only",
@@ -493,7 +730,7 @@ class TradingBot:
             return None
         elif setup.trade_direction == 'SELL' and signal == 'buy':
             # Log skipped trade - buy signal but only sell allowed
-            BotLog.objects.create(
+            bot_log(
                 user=self.user,
                 log_type='INFO',
                 message=f"⏸️ Skipped BUY signal for {setup.symbol} - Strategy is set to SELL only",
@@ -506,20 +743,6 @@ class TradingBot:
             )
             return None
         
-        # Get current price
-        quote = self.upstox.get_live_quote(setup.symbol)
-        if not quote:
-            # Log error - no quote
-            BotLog.objects.create(
-                user=self.user,
-                log_type='ERROR',
-                message=f"Failed to get live quote for {setup.symbol}",
-                details={'symbol': setup.symbol, 'signal': signal}
-            )
-            return None
-        
-        current_price = Decimal(str(quote.get('data', {}).get('ltp', 0)))
-        
         # Determine trade type
         if signal == 'buy':
             trade_type = 'BUY'
@@ -528,37 +751,28 @@ class TradingBot:
         else:
             return None
         
+        # Reuse the evaluation price; only look it up when the caller has none
+        if price is None:
+            price = self.get_live_prices([setup.symbol]).get(setup.symbol)
+            if not price:
+                # Log error - no quote
+                bot_log(
+                    user=self.user,
+                    log_type='ERROR',
+                    message=f"Failed to get live quote for {setup.symbol}",
+                    details={'symbol': setup.symbol, 'signal': signal}
+                )
+                return None
+        current_price = Decimal(str(price))
+        
         # Calculate total amount
         total_amount = current_price * setup.quantity
         
-        # Log trade execution attempt
-        BotLog.objects.create(
-            user=self.user,
-            log_type='TRADE_EXECUTED',
-            message=f"Attempting to execute {trade_type} order for {setup.quantity} {setup.symbol} at ₹{current_price}",
-            details={
-                'symbol': setup.symbol,
-                'trade_type': trade_type,
-                'quantity': setup.quantity,
-                'price': float(current_price),
-                'total_amount': float(total_amount),
-                'signal': signal
-            }
-        )
-        
-        # Create trade record
-        trade = Trade.objects.create(
-            user=self.user,
-            setup=setup,
-            symbol=setup.symbol,
-            trade_type=trade_type,
-            quantity=setup.quantity,
-            price=current_price,
-            total_amount=total_amount,
-            status='PENDING'
-        )
-        
-        # Place order with Upstox
+        # Place order with Upstox before anything is written
+        sent_at = time.perf_counter()
+        signal_at = signal_at or started
+        order_response = None
+        error = None
         try:
             order_response = self.upstox.place_order(
                 symbol=setup.symbol,
@@ -566,72 +780,114 @@ class TradingBot:
                 side=trade_type.lower(),
                 order_type='MARKET'
             )
-            
-            if order_response and 'data' in order_response:
-                trade.upstox_order_id = order_response['data'].get('order_id')
-                trade.status = 'EXECUTED'
-                trade.executed_at = datetime.now()
-                trade.save()
-                
-                # Log successful trade
-                BotLog.objects.create(
-                    user=self.user,
-                    log_type='TRADE_EXECUTED',
-                    message=f"✅ Successfully executed {trade_type} order for {setup.quantity} {setup.symbol} at ₹{current_price}",
-                    details={
-                        'symbol': setup.symbol,
-                        'trade_type': trade_type,
-                        'quantity': setup.quantity,
-                        'price': float(current_price),
-                        'total_amount': float(total_amount),
-                        'order_id': trade.upstox_order_id,
-                        'signal': signal
-                    }
-                )
-                
-                # Set up take profit and stop loss orders if strategy has them configured
-                if strategy and (strategy.take_profit_percentage or strategy.stop_loss_percentage):
-                    self.setup_risk_management_orders(trade, strategy, current_price)
-                
-                return trade
-            else:
-                trade.status = 'FAILED'
-                trade.save()
-                
-                # Log failed trade
-                BotLog.objects.create(
-                    user=self.user,
-                    log_type='TRADE_FAILED',
-                    message=f"❌ Failed to execute {trade_type} order for {setup.symbol} - Invalid response from Upstox",
-                    details={
-                        'symbol': setup.symbol,
-                        'trade_type': trade_type,
-                        'quantity': setup.quantity,
-                        'price': float(current_price),
-                        'response': order_response
-                    }
-                )
-                return None
-                
         except Exception as e:
-            trade.status = 'FAILED'
-            trade.save()
+            error = e
+            print(f"Error executing trade: {e}")
+        latency = {
+            'signal_to_order_ms': round((sent_at - signal_at) * 1000, 2),
+            'order_round_trip_ms': round((time.perf_counter() - sent_at) * 1000, 2),
+        }
+        print(f"⏱️ {trade_type} {setup.symbol}: signal to order {latency['signal_to_order_ms']}ms, "
+              f"order round trip {latency['order_round_trip_ms']}ms")
+        
+        placed = error is None and order_response and 'data' in order_response
+        order_id = order_response['data'].get('order_id') if placed else None
+        
+        # Record the trade with its outcome in one write
+        try:
+            trade = Trade.objects.create(
+                user=self.user,
+                setup=setup,
+                symbol=setup.symbol,
+                trade_type=trade_type,
+                quantity=setup.quantity,
+                price=current_price,
+                total_amount=total_amount,
+                status='EXECUTED' if placed else 'FAILED',
+                upstox_order_id=order_id,
+                executed_at=datetime.now() if placed else None
+            )
+        except Exception as e:
+            print(f"Error recording trade: {e}")
+            # The order may be live at the broker; keep its id in the logs at least
+            bot_log(
+                user=self.user,
+                log_type='TRADE_EXECUTED' if placed else 'TRADE_FAILED',
+                message=(
+                    f"⚠️ {trade_type} order for {setup.quantity} {setup.symbol} placed (Order ID: {order_id}) but not recorded: {str(e)}"
+                    if placed else
+                    f"❌ Failed to execute {trade_type} order for {setup.symbol} and could not record it: {str(e)}"
+                ),
+                details={
+                    'symbol': setup.symbol,
+                    'trade_type': trade_type,
+                    'quantity': setup.quantity,
+                    'price': float(current_price),
+                    'order_id': order_id,
+                    'response': order_response,
+                    'error': str(error) if error is not None else None,
+                    'record_error': str(e),
+                    'signal': signal,
+                    **latency
+                }
+            )
+            return None
+        
+        if placed:
+            # Log successful trade
+            bot_log(
+                user=self.user,
+                log_type='TRADE_EXECUTED',
+                message=f"✅ Successfully executed {trade_type} order for {setup.quantity} {setup.symbol} at ₹{current_price}",
+                details={
+                    'symbol': setup.symbol,
+                    'trade_type': trade_type,
+                    'quantity': setup.quantity,
+                    'price': float(current_price),
+                    'total_amount': float(total_amount),
+                    'order_id': trade.upstox_order_id,
+                    'signal': signal,
+                    **latency
+                }
+            )
             
+            # Set up take profit and stop loss orders if strategy has them configured
+            if strategy and (strategy.take_profit_percentage or strategy.stop_loss_percentage):
+                self.setup_risk_management_orders(trade, strategy, current_price)
+            
+            return trade
+        
+        if error is not None:
             # Log error
-            BotLog.objects.create(
+            bot_log(
                 user=self.user,
                 log_type='TRADE_FAILED',
-                message=f"❌ Error executing {trade_type} order for {setup.symbol}: {str(e)}",
+                message=f"❌ Error executing {trade_type} order for {setup.symbol}: {str(error)}",
                 details={
                     'symbol': setup.symbol,
                     'trade_type': trade_type,
                     'quantity': setup.quantity,
                     'price': float(current_price),
-                    'error': str(e)
+                    'error': str(error),
+                    **latency
                 }
             )
-            print(f"Error executing trade: {e}")
-            return None
+        else:
+            # Log failed trade
+            bot_log(
+                user=self.user,
+                log_type='TRADE_FAILED',
+                message=f"❌ Failed to execute {trade_type} order for {setup.symbol} - Invalid response from Upstox",
+                details={
+                    'symbol': setup.symbol,
+                    'trade_type': trade_type,
+                    'quantity': setup.quantity,
+                    'price': float(current_price),
+                    'response': order_response,
+                    **latency
+                }
+            )
+        return None
     
     def setup_risk_management_orders(self, trade, strategy, entry_price):
         """Set up take profit and stop loss orders"""
@@ -653,7 +909,7 @@ class TradingBot:
                 )
                 
                 if tp_order_response and 'data' in tp_order_response:
-                    BotLog.objects.create(
+                    bot_log(
                         user=self.user,
                         log_type='INFO',
                         message=f"🎯 Take profit order placed for {trade.symbol} at ₹{take_profit_price:.2f}",
@@ -682,7 +938,7 @@ class TradingBot:
                 )
                 
                 if sl_order_response and 'data' in sl_order_response:
-                    BotLog.objects.create(
+                    bot_log(
                         user=self.user,
                         log_type='INFO',
                         message=f"🛑 Stop loss order placed for {trade.symbol} at ₹{stop_loss_price:.2f}",
@@ -696,7 +952,7 @@ class TradingBot:
                     )
                     
         except Exception as e:
-            BotLog.objects.create(
+            bot_log(
                 user=self.user,
                 log_type='ERROR',
                 message=f"❌ Failed to set up risk management orders for {trade.symbol}: {str(e)}",
@@ -707,13 +963,30 @@ class TradingBot:
             )
             print(f"Error setting up risk management orders: {e}")
     
-    def run_strategy(self, strategy):
-        """Run a trading strategy"""
+    def get_live_prices(self, symbols):
+        """Price a whole watchlist with bulk LTP calls, returning {symbol: ltp}"""
+        if not self.upstox.access_token or not symbols:
+            return {}
+        try:
+            quotes = self.upstox.get_live_quotes(symbols)
+        except Exception as e:
+            print(f"Error fetching bulk live quotes: {e}")
+            return {}
+        return {symbol: float(quote['ltp']) for symbol, quote in quotes.items() if quote.get('ltp')}
+    
+    def is_still_running(self, strategy):
+        """Re-read a strategy's status; the scheduler's rows can be a minute old and the user may have stopped it"""
+        return Strategy.objects.filter(pk=strategy.pk, status='RUNNING').exists()
+    
+    def run_strategy(self, strategy, data=None, price=None):
+        """Run a trading strategy, optionally on market data shared with other strategies.
+        `price` is the LTP the data was prepared with; an order is priced at it, or at a
+        fresh quote when it is not given."""
         if strategy.status != 'RUNNING':
             return
         
         # Log strategy check
-        BotLog.objects.create(
+        bot_log(
             user=self.user,
             strategy=strategy,
             log_type='INFO',
@@ -727,18 +1000,25 @@ class TradingBot:
         )
         
         # Generate signal
-        signal = self.generate_signal(strategy.setup)
+        signal = self.generate_signal(strategy.setup, data)
+        signal_at = time.perf_counter()
         if signal:
+            if not self.is_still_running(strategy):
+                print(f"⏹️ Strategy {strategy.name} was stopped; ignoring its {signal.upper()} signal")
+                return
+            
+            # Execute trade if signal is buy or sell, before anything is saved
+            if signal in ['buy', 'sell']:
+                self.execute_trade(strategy.setup, signal, strategy, price=price, signal_at=signal_at)
+            
             strategy.last_signal = signal
             strategy.last_check = datetime.now()
-            strategy.save()
+            # Only the check results; a full save would write the loaded status back over a stop
+            strategy.save(update_fields=['last_signal', 'last_check'])
             
-            # Execute trade if signal is buy or sell
-            if signal in ['buy', 'sell']:
-                self.execute_trade(strategy.setup, signal, strategy)
-            else:
+            if signal not in ['buy', 'sell']:
                 # Log hold signal
-                BotLog.objects.create(
+                bot_log(
                     user=self.user,
                     strategy=strategy,
                     log_type='INFO',
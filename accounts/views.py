@@ -2,26 +2,40 @@ from django.shortcuts import render, redirect
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.db.models import Count, OuterRef, Q, Subquery, Sum
+from asgiref.sync import sync_to_async
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition
 from .models import SignIn, BrokerageIntegration, TradingSetup, Trade, Strategy, MarketData, BotLog
 from .upstox_api import UpstoxAPI, TradingBot
-from .indicators import (
-    rsi_signal, macd_signal, moving_average_signal,
-    vwap_signal, adx_signal, supertrend_signal
-)
+from .indicator_engine import INDICATORS, get_indicator
+from .log_sink import log_event
+from .event_stream import EventStream
+from . import strategy_state
+from .shared_cache import shared_cache
+from .rate_limiter import rate_limiter
+from . import candle_cache
+from .market_hours import is_current_candle
 import json
-import pandas as pd
 from datetime import datetime
 from decimal import Decimal
 
-def calculate_atr(high: pd.Series, low: pd.Series, close: pd.Series, period: int = 14) -> pd.Series:
-    """Calculate Average True Range"""
-    tr1 = high - low
-    tr2 = (high - close.shift()).abs()
-    tr3 = (low - close.shift()).abs()
-    tr = pd.concat([tr1, tr2, tr3], axis=1).max(axis=1)
-    return tr.rolling(window=period).mean()
+# Candles needed before an indicator reading is shown instead of a neutral value
+INDICATOR_WARMUP = {'RSI': 14, 'MACD': 26, 'Moving Average': 20}
+
+# Rows per page for the cursor-paged log API and trade history
+LOG_PAGE_SIZE = 100
+MAX_LOG_PAGE_SIZE = 500
+TRADE_PAGE_SIZE = 50
+
+def _cursor_param(request, name):
+    """Positive integer query parameter, or None when missing or malformed"""
+    try:
+        value = int(request.GET.get(name, ''))
+    except ValueError:
+        return None
+    return value if value > 0 else None
 
 def signin(request):
     if request.method == 'POST':
@@ -591,10 +605,15 @@ def api_get_market_data(request):
     if request.method == 'POST':
         data = json.loads(request.body)
         symbol = data.get('symbol')
+        interval = data.get('interval', '1D')
         
         if symbol:
-            bot = TradingBot(request.user)
-            market_data = bot.get_market_data_for_analysis(symbol)
+            # Serve cached candles straight from the on-disk store while they include the
+            # forming candle; otherwise the candle store fetches what is missing first
+            market_data = candle_cache.load(symbol, interval, limit=20)
+            if market_data is None or not is_current_candle(interval, market_data.index[-1]):
+                bot = TradingBot(request.user)
+                market_data = bot.get_market_data_for_analysis(symbol, interval)
             
             if market_data is not None:
                 return JsonResponse({
@@ -633,28 +652,40 @@ def api_generate_signal(request):
     
     return JsonResponse({'success': False, 'error': 'Invalid request method'})
 
+def _bot_logs_etag(request):
+    """ETag for a bot log request: the user's newest log id plus the cursor asked for"""
+    if not request.user.is_authenticated:
+        return None
+    latest_id = BotLog.objects.filter(user=request.user).order_by('-id').values_list('id', flat=True).first()
+    cursor = '-'.join(str(_cursor_param(request, name) or 0) for name in ('since_id', 'after_id', 'limit'))
+    return f'{latest_id or 0}-{cursor}'
+
 @csrf_exempt
+@login_required
+@condition(etag_func=_bot_logs_etag)
 def api_get_bot_logs(request):
-    """API endpoint to get real-time bot logs - No authentication required"""
+    """API endpoint to get real-time bot logs of the logged-in user"""
     if request.method == 'GET':
-        # Get all logs (no user filter)
-        logs = BotLog.objects.all().order_by('-timestamp')[:100]
-        
-        log_data = []
-        for log in logs:
-            log_data.append({
-                'id': log.id,
-                'log_type': log.log_type,
-                'message': log.message,
-                'details': log.details,
-                'timestamp': log.timestamp.strftime('%Y-%m-%d %H:%M:%S'),
-                'strategy_name': log.strategy.name if log.strategy else None
-            })
+        # Newest first, one page at a time.
+        # ?since_id=<id> returns only rows newer than the last one the client has;
+        # ?after_id=<id> continues below the last row of the previous page.
+        limit = min(_cursor_param(request, 'limit') or LOG_PAGE_SIZE, MAX_LOG_PAGE_SIZE)
+        logs = BotLog.objects.filter(user=request.user).select_related('strategy').order_by('-id')
+        since_id = _cursor_param(request, 'since_id')
+        after_id = _cursor_param(request, 'after_id')
+        if since_id:
+            logs = logs.filter(id__gt=since_id)
+        if after_id:
+            logs = logs.filter(id__lt=after_id)
+        logs = list(logs[:limit])
         
         return JsonResponse({
             'success': True,
-            'logs': log_data,
-            'total_logs': BotLog.objects.count()
+            'logs': [log_event(log) for log in logs],
+            'latest_id': logs[0].id if logs else since_id,
+            # With since_id, a full page means older new rows were left out
+            'next_after_id': logs[-1].id if len(logs) == limit and not since_id else None,
+            'truncated': bool(since_id) and len(logs) == limit
         })
     
     return JsonResponse({'success': False, 'error': 'Invalid request method'})
@@ -683,11 +714,11 @@ def api_clear_logs(request):
                     'message': f'All logs cleared successfully ({deleted_count} logs deleted)'
                 })
             else:
-                # Keep only last 1000 logs (original behavior)
-                total_logs = BotLog.objects.count()
-                if total_logs > 1000:
-                    logs_to_delete = BotLog.objects.all().order_by('timestamp')[:total_logs - 1000]
-                    deleted_count = logs_to_delete.delete()[0]
+                # Keep only the last 1000 logs: find the id of the 1000th newest row
+                # and delete everything older in one indexed range delete
+                cutoff_id = BotLog.objects.order_by('-id').values_list('id', flat=True)[999:1000].first()
+                if cutoff_id is not None and BotLog.objects.filter(id__lt=cutoff_id).exists():
+                    deleted_count = BotLog.objects.filter(id__lt=cutoff_id).delete()[0]
                     return JsonResponse({
                         'success': True,
                         'message': f'Old logs cleared successfully ({deleted_count} logs deleted)'
@@ -706,6 +737,28 @@ def api_clear_logs(request):
     
     return JsonResponse({'success': False, 'error': 'Invalid request method'})
 
+async def api_event_stream(request):
+    """Server-Sent Events stream of the logged-in user's bot logs and strategy states"""
+    if request.method != 'GET':
+        return JsonResponse({'success': False, 'error': 'Invalid request method'})
+    # A stream would tie up a WSGI worker for good; 204 tells EventSource to stop, so the page polls instead
+    if not hasattr(request, 'scope'):
+        return HttpResponse(status=204)
+    user_id = await sync_to_async(lambda: request.user.id if request.user.is_authenticated else None)()
+    if user_id is None:
+        return HttpResponse(status=401)
+    
+    # A reconnecting EventSource sends the id of the last log it received
+    try:
+        since_id = int(request.headers.get('Last-Event-ID') or request.GET.get('since_id') or 0)
+    except ValueError:
+        since_id = 0
+    
+    response = StreamingHttpResponse(EventStream(user_id, since_id).events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # keep proxies from buffering the stream
+    return response
+
 @csrf_exempt
 @login_required
 def api_get_strategy_data(request):
@@ -729,95 +782,19 @@ def api_get_strategy_data(request):
                 indicator_signal = None
                 
                 try:
-                    if strategy.setup.indicator == 'RSI':
-                        # Calculate RSI manually
-                        if len(market_data) >= 14:
-                            delta = market_data['close'].diff()
-                            gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
-                            loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
-                            rs = gain / loss
-                            rsi = 100 - (100 / (1 + rs))
-                            indicator_value = rsi.iloc[-1]
-                            # Handle NaN values
-                            if pd.isna(indicator_value):
+                    setup = strategy.setup
+                    if setup.indicator in INDICATORS:
+                        result = get_indicator(setup.symbol, setup.timeframe, setup.indicator, market_data)
+                        indicator_value = result.value
+                        indicator_signal = result.signal
+                        # Show a neutral reading while the indicator is still warming up
+                        if indicator_value is None or len(market_data) < INDICATOR_WARMUP.get(setup.indicator, 0):
+                            if setup.indicator == 'RSI':
                                 indicator_value = 50.0
-                        else:
-                            # If not enough data, use a simple calculation
-                            indicator_value = 50.0  # Neutral RSI
-                        indicator_signal = rsi_signal(market_data['close'])
-                    elif strategy.setup.indicator == 'MACD':
-                        # Calculate MACD manually
-                        if len(market_data) >= 26:
-                            ema_fast = market_data['close'].ewm(span=12, adjust=False).mean()
-                            ema_slow = market_data['close'].ewm(span=26, adjust=False).mean()
-                            macd = ema_fast - ema_slow
-                            indicator_value = macd.iloc[-1]
-                            # Handle NaN values
-                            if pd.isna(indicator_value):
+                            elif setup.indicator == 'MACD':
                                 indicator_value = 0.0
-                        else:
-                            indicator_value = 0.0  # Neutral MACD
-                        indicator_signal = macd_signal(market_data['close'])
-                    elif strategy.setup.indicator == 'Moving Average':
-                        # Calculate Moving Average manually
-                        if len(market_data) >= 20:
-                            ma = market_data['close'].rolling(window=20).mean()
-                            indicator_value = ma.iloc[-1]
-                            # Handle NaN values
-                            if pd.isna(indicator_value):
-                                indicator_value = market_data['close'].iloc[-1]
-                        else:
-                            indicator_value = market_data['close'].iloc[-1]  # Use current price
-                        indicator_signal = moving_average_signal(market_data['close'])
-                    elif strategy.setup.indicator == 'VWAP':
-                        # Calculate VWAP manually
-                        vwap = (market_data['close'] * market_data['volume']).cumsum() / market_data['volume'].cumsum()
-                        indicator_value = vwap.iloc[-1]
-                        indicator_signal = vwap_signal(market_data['close'], market_data['volume'])
-                    elif strategy.setup.indicator == 'ADX':
-                        # Calculate ADX manually
-                        plus_dm = market_data['high'].diff()
-                        minus_dm = market_data['low'].diff().abs()
-                        plus_dm[plus_dm < 0] = 0
-                        minus_dm[minus_dm < 0] = 0
-                        tr1 = market_data['high'] - market_data['low']
-                        tr2 = (market_data['high'] - market_data['close'].shift()).abs()
-                        tr3 = (market_data['low'] - market_data['close'].shift()).abs()
-                        tr = pd.concat([tr1, tr2, tr3], axis=1).max(axis=1)
-                        atr = tr.rolling(window=14).mean()
-                        plus_di = 100 * (plus_dm.rolling(window=14).sum() / atr)
-                        minus_di = 100 * (minus_dm.rolling(window=14).sum() / atr)
-                        adx = ((plus_di - minus_di).abs() / (plus_di + minus_di)) * 100
-                        indicator_value = adx.iloc[-1]
-                        indicator_signal = adx_signal(market_data['high'], market_data['low'], market_data['close'])
-                    elif strategy.setup.indicator == 'Supertrend':
-                        # Calculate Supertrend manually
-                        atr = calculate_atr(market_data['high'], market_data['low'], market_data['close'])
-                        upper_band = ((market_data['high'] + market_data['low']) / 2) + (3.0 * atr)
-                        lower_band = ((market_data['high'] + market_data['low']) / 2) - (3.0 * atr)
-                        supertrend = pd.Series(index=market_data['close'].index, dtype=float)
-                        direction = pd.Series(index=market_data['close'].index, dtype=int)
-                        
-                        for i in range(10, len(market_data['close'])):
-                            if market_data['close'].iloc[i] > upper_band.iloc[i-1]:
-                                direction.iloc[i] = 1
-                            elif market_data['close'].iloc[i] < lower_band.iloc[i-1]:
-                                direction.iloc[i] = -1
-                            else:
-                                direction.iloc[i] = direction.iloc[i-1]
-                                
-                            if direction.iloc[i] == 1 and lower_band.iloc[i] < lower_band.iloc[i-1]:
-                                lower_band.iloc[i] = lower_band.iloc[i-1]
-                            if direction.iloc[i] == -1 and upper_band.iloc[i] > upper_band.iloc[i-1]:
-                                upper_band.iloc[i] = upper_band.iloc[i-1]
-                                
-                            if direction.iloc[i] == 1:
-                                supertrend.iloc[i] = lower_band.iloc[i]
-                            else:
-                                supertrend.iloc[i] = upper_band.iloc[i]
-                        
-                        indicator_value = supertrend.iloc[-1]
-                        indicator_signal = supertrend_signal(market_data['high'], market_data['low'], market_data['close'])
+                            elif setup.indicator == 'Moving Average':
+                                indicator_value = current_price
                         
                 except Exception as e:
                     print(f"Error calculating indicator: {e}")
@@ -872,20 +849,92 @@ def api_get_strategy_data(request):
     
     return JsonResponse({'success': False, 'error': 'Invalid request method'})
 
+@login_required
+def api_strategies_state(request):
+    """API endpoint with the latest state of all the user's strategies, from the bot's snapshots"""
+    if request.method != 'GET':
+        return JsonResponse({'success': False, 'error': 'Invalid request method'})
+    
+    last_logs = BotLog.objects.filter(strategy=OuterRef('pk')).order_by('-timestamp').values('id')[:1]
+    strategies = list(
+        Strategy.objects.filter(user=request.user)
+        .select_related('setup')
+        .annotate(last_log_id=Subquery(last_logs))
+        .order_by('-created_at')
+    )
+    states = strategy_state.snapshot([strategy.id for strategy in strategies])
+    logs = BotLog.objects.in_bulk([strategy.last_log_id for strategy in strategies if strategy.last_log_id])
+    
+    data = []
+    for strategy in strategies:
+        state = states.get(strategy.id, {})
+        last_log = logs.get(strategy.last_log_id)
+        data.append({
+            'strategy_id': strategy.id,
+            'symbol': strategy.setup.symbol,
+            'indicator': strategy.setup.indicator,
+            'status': strategy.status,
+            'last_signal': strategy.last_signal,
+            'current_price': state.get('current_price'),
+            'indicator_value': state.get('indicator_value'),
+            'indicator_signal': state.get('indicator_signal'),
+            'timestamp': state.get('timestamp'),
+            'age_seconds': state.get('age_seconds'),
+            'stale': state.get('stale', True),
+            'last_log': {
+                'message': last_log.message,
+                'timestamp': last_log.timestamp.isoformat(),
+                'log_type': last_log.log_type
+            } if last_log else None,
+        })
+    
+    return JsonResponse({
+        'success': True,
+        'strategies': data,
+        'generated_at': datetime.now().isoformat()
+    })
+
+@login_required
+def api_cache_stats(request):
+    """API endpoint with this web process's shared Upstox cache and rate limiter counters"""
+    return JsonResponse({
+        'success': True,
+        'stats': shared_cache.stats(),
+        'rate_limits': rate_limiter.stats()
+    })
+
 @login_required
 def trade_history(request):
     """View trade history"""
-    trades = Trade.objects.filter(user=request.user).order_by('-created_at')
-    
-    # Calculate statistics
-    total_trades = trades.count()
-    executed_trades = trades.filter(status='EXECUTED')
-    total_volume = sum(trade.total_amount for trade in executed_trades)
+    user_trades = Trade.objects.filter(user=request.user)
+    
+    # Calculate statistics in the database rather than loading every trade
+    stats = user_trades.aggregate(
+        total_trades=Count('id'),
+        executed_trades=Count('id', filter=Q(status='EXECUTED')),
+        pending_trades=Count('id', filter=Q(status='PENDING')),
+        total_volume=Sum('total_amount', filter=Q(status='EXECUTED')),
+    )
+    
+    # One page, newest first; ?after_id=<id> continues below that trade
+    trades = user_trades.select_related('setup').order_by('-created_at', '-id')
+    after_id = _cursor_param(request, 'after_id')
+    if after_id:
+        cursor = user_trades.filter(id=after_id).values('created_at', 'id').first()
+        if cursor:
+            trades = trades.filter(
+                Q(created_at__lt=cursor['created_at']) |
+                Q(created_at=cursor['created_at'], id__lt=cursor['id'])
+            )
+    trades = list(trades[:TRADE_PAGE_SIZE])
     
     context = {
         'trades': trades,
-        'total_trades': total_trades,
-        'total_volume': total_volume,
+        'total_trades': stats['total_trades'],
+        'executed_trades': stats['executed_trades'],
+        'pending_trades': stats['pending_trades'],
+        'total_volume': stats['total_volume'] or 0,
+        'next_after_id': trades[-1].id if len(trades) == TRADE_PAGE_SIZE else None,
     }
     return render(request, 'trade_history.html', context)
 
@@ -101,23 +101,23 @@ def supertrend_signal(high: pd.Series, low: pd.Series, close: pd.Series, period:
     - Buy: Price closes above SuperTrend line and SuperTrend flips below price
     - Sell: Price closes below SuperTrend line and SuperTrend flips above price
     """
-    hl2 = (high + low) / 2
-    atr = (high - low).rolling(window=period).mean()
-    upperband = hl2 + (multiplier * atr)
-    lowerband = hl2 - (multiplier * atr)
-    supertrend = pd.Series(index=close.index)
-    direction = pd.Series(index=close.index)
-    supertrend.iloc[0] = upperband.iloc[0]
-    direction.iloc[0] = 1
-    for i in range(1, len(close)):
-        if close.iloc[i-1] <= supertrend.iloc[i-1]:
-            supertrend.iloc[i] = min(upperband.iloc[i], supertrend.iloc[i-1])
+    hl2 = ((high + low) / 2).to_numpy(dtype=np.float64)
+    atr = (high - low).rolling(window=period).mean().to_numpy(dtype=np.float64)
+    upperband = (hl2 + (multiplier * atr)).tolist()
+    lowerband = (hl2 - (multiplier * atr)).tolist()
+    closes = close.to_numpy(dtype=np.float64).tolist()
+    supertrend = [upperband[0]]
+    direction = [1]
+    for i in range(1, len(closes)):
+        if closes[i-1] <= supertrend[i-1]:
+            st = min(upperband[i], supertrend[i-1])
         else:
-            supertrend.iloc[i] = max(lowerband.iloc[i], supertrend.iloc[i-1])
-        direction.iloc[i] = 1 if close.iloc[i] > supertrend.iloc[i] else -1
-    if direction.iloc[-2] == -1 and direction.iloc[-1] == 1:
+            st = max(lowerband[i], supertrend[i-1])
+        supertrend.append(st)
+        direction.append(1 if closes[i] > st else -1)
+    if direction[-2] == -1 and direction[-1] == 1:
         return 'buy'
-    elif direction.iloc[-2] == 1 and direction.iloc[-1] == -1:
+    elif direction[-2] == 1 and direction[-1] == -1:
         return 'sell'
     else:
         return 'hold'
@@ -81,6 +81,38 @@ DATABASES = {
     }
 }
 
+# Cache for Upstox reads shared by the web workers and bot processes (accounts/shared_cache.py);
+# it also holds the bot's strategy state snapshots and event stream counters.
+# 'sqlite' keeps it in a local file; 'redis' needs the redis package and a redis:// LOCATION.
+SHARED_CACHE = {
+    'BACKEND': 'sqlite',
+    'LOCATION': BASE_DIR / 'cache' / 'shared.sqlite3',
+}
+
+# Seconds each kind of Upstox read is reused; 0 or missing reads through every time
+SHARED_CACHE_TTLS = {
+    'ltp': 1,
+    'quote': 1,
+    'candles': 15,
+    'order_status': 2,
+    'order_history': 5,
+    'margins': 10,
+    'holdings': 30,
+    'profile': 10 * 60,
+    'instruments': 60 * 60,
+}
+
+# Upstox request allowance per account (accounts/rate_limiter.py), shared by every process.
+# 'order' covers the order endpoints, 'data' everything else.
+UPSTOX_RATE_LIMITS = {
+    'data': {'second': 50, 'minute': 500},
+    'order': {'second': 50, 'minute': 500},
+}
+
+# Share of each order window kept for placing and cancelling orders; status and history
+# reads cannot use it
+UPSTOX_ORDER_RESERVE = 0.2
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
@@ -127,6 +159,53 @@ STATICFILES_DIRS = [
 ]
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
+# On-disk OHLCV columns per instrument and interval (accounts/candle_cache.py)
+CANDLE_CACHE_DIR = BASE_DIR / 'candle_cache'
+
+# NSE trading holidays ('YYYY-MM-DD'); the strategy scheduler does not run on these days.
+# Update from the exchange's yearly holiday circular. Holidays falling on a weekend are left out.
+MARKET_HOLIDAYS = [
+    # 2026
+    '2026-01-26',  # Republic Day
+    '2026-03-03',  # Holi
+    '2026-03-26',  # Shri Ram Navami
+    '2026-03-31',  # Shri Mahavir Jayanti
+    '2026-04-03',  # Good Friday
+    '2026-04-14',  # Dr. Baba Saheb Ambedkar Jayanti
+    '2026-05-01',  # Maharashtra Day
+    '2026-05-28',  # Bakri Id
+    '2026-06-26',  # Muharram
+    '2026-09-14',  # Ganesh Chaturthi
+    '2026-10-02',  # Mahatma Gandhi Jayanti
+    '2026-10-20',  # Dussehra
+    '2026-11-10',  # Diwali Balipratipada
+    '2026-11-24',  # Prakash Gurpurb Sri Guru Nanak Dev
+    '2026-12-25',  # Christmas
+]
+
+# BotLog verbosity per log type (accounts/log_sink.py): 'all' keeps every row, 'sample' keeps
+# one row per type, strategy and symbol every BOT_LOG_SAMPLE_SECONDS, 'off' keeps none.
+# Skipped rows are counted and written as periodic summaries. Signals, trades, errors and
+# rows about orders or trade decisions are always kept in full.
+BOT_LOG_LEVELS = {
+    'DATA_FETCH': 'sample',
+    'INDICATOR_CALC': 'sample',
+    'INFO': 'sample',
+}
+BOT_LOG_SAMPLE_SECONDS = 60
+BOT_LOG_SUMMARY_SECONDS = 300
+
+# Days each BotLog type stays in the database before `manage.py archive_bot_logs` moves it
+# into a daily gzip archive, and days the archives themselves are kept
+BOT_LOG_RETENTION_DAYS = {
+    'DATA_FETCH': 2,
+    'INDICATOR_CALC': 2,
+    'INFO': 7,
+    'default': 30,
+}
+BOT_LOG_ARCHIVE_DIR = BASE_DIR / 'log_archive'
+BOT_LOG_ARCHIVE_DAYS = 90
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.1/ref/settings/#default-auto-field
 
@@ -20,7 +20,8 @@ from django.conf.urls.static import static
 from accounts.views import (
     signin, login, logout, dashboard, brokerage_integration, upstox_callback, capture_upstox_code,
     trading_setup, order_execution_monitoring, create_strategy, delete_trading_setup, update_strategy,
-    api_get_market_data, api_generate_signal, api_get_bot_logs, api_clear_logs, api_get_strategy_data,
+    api_get_market_data, api_generate_signal, api_get_bot_logs, api_clear_logs, api_event_stream,
+    api_get_strategy_data, api_strategies_state, api_cache_stats,
     trade_history, portfolio, debug_brokerage
 )
 
@@ -47,7 +48,10 @@ urlpatterns = [
     path('api/generate-signal/', api_generate_signal, name='api_generate_signal'),
     path('api/bot-logs/', api_get_bot_logs, name='api_bot_logs'),
     path('api/clear-logs/', api_clear_logs, name='api_clear_logs'),
+    path('api/stream/', api_event_stream, name='api_event_stream'),
     path('api/strategy-data/', api_get_strategy_data, name='api_strategy_data'),
+    path('api/strategies/state/', api_strategies_state, name='api_strategies_state'),
+    path('api/cache-stats/', api_cache_stats, name='api_cache_stats'),
     
     # Debug endpoints
     path('debug/brokerage/', debug_brokerage, name='debug_brokerage'),
@@ -6,6 +6,7 @@ No data storage - pure real-time analysis and trading
 """
 
 import os
+import asyncio
 import django
 import time
 import threading
@@ -15,12 +16,19 @@ from datetime import datetime, timedelta
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'bot.settings')
 django.setup()
 
-from accounts.models import Strategy, TradingSetup, BotLog, Trade
+from accounts.models import Strategy, TradingSetup, Trade
 from accounts.upstox_api import TradingBot
-from accounts.indicators import (
-    rsi_signal, macd_signal, moving_average_signal,
-    vwap_signal, adx_signal, supertrend_signal
-)
+from accounts import indicator_engine
+from accounts.scheduler import StrategyScheduler
+from accounts.market_feed import MarketFeedClient
+from accounts.candle_aggregator import CandleAggregator
+from accounts.market_hours import closed_candles
+from accounts.event_bus import bus
+from accounts.log_sink import bot_log, log_sink
+from accounts import strategy_state
+
+# Feed prices older than this are re-fetched over REST (seconds)
+TICK_MAX_AGE = 5
 
 class RealTimeTradingBot:
     def __init__(self, user=None):
@@ -29,6 +37,12 @@ class RealTimeTradingBot:
         self.running = False
         self.monitoring_thread = None
         self.last_signals = {}  # Track last signals to avoid duplicate trades
+        self.scheduler = None
+        self.market_feed = None
+        self.tick_prices = {}  # instrument_key -> (ltp, received_at) from the market feed
+        self.aggregator = CandleAggregator()
+        self._unsubscribe_ticks = None
+        self._unsubscribe_bars = None
         
     def start_monitoring(self):
         """Start real-time price monitoring"""
@@ -37,11 +51,24 @@ class RealTimeTradingBot:
             return
             
         self.running = True
+        self.scheduler = StrategyScheduler(
+            self._load_strategies,
+            self._check_group,
+            prefetch=self._price_groups,
+        )
+        # Stream prices over the market feed; the scheduler falls back to REST quotes without it
+        self._unsubscribe_ticks = bus.subscribe('tick', self._on_tick)
+        # Bars built from the feed update the streaming indicators as each candle closes
+        self.aggregator.start()
+        self._unsubscribe_bars = bus.subscribe('bar_closed', self._on_bar_closed)
+        self.market_feed = MarketFeedClient(self.trading_bot.upstox, user=self.user)
+        if not self.trading_bot.upstox.access_token or not self.market_feed.start():
+            self.market_feed = None
         self.monitoring_thread = threading.Thread(target=self._monitor_prices)
         self.monitoring_thread.daemon = True
         self.monitoring_thread.start()
         
-        BotLog.objects.create(
+        bot_log(
             user=self.user,
             log_type='STRATEGY_START',
             message='🚀 Real-time trading bot started',
@@ -49,85 +76,128 @@ class RealTimeTradingBot:
         )
         
         print("🚀 Real-time trading bot started")
-        print("📊 Monitoring prices continuously...")
+        print("📊 Checking each strategy when its candle closes during market hours...")
         print("💡 No data will be saved - pure real-time analysis")
         
     def stop_monitoring(self):
         """Stop real-time price monitoring"""
         self.running = False
+        if self.scheduler:
+            self.scheduler.stop()
+        if self.market_feed:
+            self.market_feed.stop()
+        if self._unsubscribe_ticks:
+            self._unsubscribe_ticks()
+        if self._unsubscribe_bars:
+            self._unsubscribe_bars()
+        self.aggregator.stop()
         if self.monitoring_thread:
             self.monitoring_thread.join(timeout=5)
             
-        BotLog.objects.create(
+        bot_log(
             user=self.user,
             log_type='STRATEGY_STOP',
             message='🛑 Real-time trading bot stopped',
             details={'mode': 'real-time'}
         )
+        log_sink.flush()
         
         print("🛑 Real-time trading bot stopped")
         
     def _monitor_prices(self):
-        """Main monitoring loop"""
-        while self.running:
-            try:
-                # Get active strategies
-                active_strategies = Strategy.objects.filter(
-                    user=self.user, 
-                    status='RUNNING'
-                )
-                
-                if not active_strategies:
-                    print("⏸️ No active strategies found")
-                    time.sleep(30)  # Check every 30 seconds
-                    continue
-                
-                print(f"🔍 Monitoring {active_strategies.count()} active strategies...")
-                
-                # Check each strategy
-                for strategy in active_strategies:
-                    self._check_strategy(strategy)
-                
-                # Wait before next check (adjust frequency as needed)
-                time.sleep(10)  # Check every 10 seconds
-                
-            except Exception as e:
-                print(f"❌ Error in monitoring loop: {e}")
-                BotLog.objects.create(
-                    user=self.user,
-                    log_type='ERROR',
-                    message=f'❌ Monitoring error: {str(e)}',
-                    details={'error': str(e)}
-                )
-                time.sleep(30)  # Wait longer on error
+        """Main monitoring loop: run the asyncio scheduler until stopped"""
+        try:
+            asyncio.run(self.scheduler.run())
+        except Exception as e:
+            print(f"❌ Error in monitoring loop: {e}")
+            bot_log(
+                user=self.user,
+                log_type='ERROR',
+                message=f'❌ Monitoring error: {str(e)}',
+                details={'error': str(e)}
+            )
+            
+    def _load_strategies(self):
+        """Running strategies for this user; the aggregator builds bars for exactly these"""
+        strategies = list(Strategy.objects.filter(user=self.user, status='RUNNING').select_related('setup'))
+        self.aggregator.track(strategies)
+        return strategies
+        
+    def _on_bar_closed(self, bar):
+        """Feed a closed bar to the shared indicators of the strategies on its (symbol, timeframe)"""
+        strategies = self.scheduler.groups.get((bar['instrument_key'], bar['timeframe']), []) if self.scheduler else []
+        for indicator in {strategy.setup.indicator for strategy in strategies}:
+            indicator_engine.push_candle(bar['instrument_key'], bar['timeframe'], indicator, bar['timestamp'], bar)
+        
+    def _on_tick(self, tick):
+        """Remember the latest streamed price per instrument"""
+        self.tick_prices[tick['instrument_key']] = (tick['ltp'], time.time())
+        
+    def _price_groups(self, keys):
+        """Price due symbols from fresh feed ticks, and the rest with one bulk quote"""
+        prices = {}
+        now = time.time()
+        for symbol, _ in keys:
+            ltp, received_at = self.tick_prices.get(symbol, (None, 0))
+            if ltp and now - received_at <= TICK_MAX_AGE:
+                prices[symbol] = ltp
+        missing = [symbol for symbol, _ in keys if symbol not in prices]
+        if missing:
+            prices.update(self.trading_bot.get_live_prices(missing))
+        return prices
+        
+    def _check_group(self, key, strategies, prices):
+        """Build market data once for a (symbol, timeframe) group and check each strategy on it"""
+        symbol, timeframe = key
+        # Close bars whose candle ended without a later tick, so their indicators are current
+        self.aggregator.close_due()
+        data = self.trading_bot.get_market_data_for_analysis(
+            symbol, timeframe, current_price=(prices or {}).get(symbol)
+        )
+        if data is None:
+            return
+        data = closed_candles(data, timeframe)
+        if data.empty:
+            return
+        for strategy in strategies:
+            self._check_strategy(strategy, data, (prices or {}).get(symbol))
                 
-    def _check_strategy(self, strategy):
-        """Check a single strategy for trading signals"""
+    def _check_strategy(self, strategy, data, price=None):
+        """Check a single strategy for trading signals against shared market data; `price` is
+        the symbol's tick or bulk-quote LTP, since the last candle may be an older one"""
         try:
             setup = strategy.setup
             symbol = setup.symbol
             
-            # Get current price data
-            data = self.trading_bot.get_market_data_for_analysis(symbol, setup.timeframe)
-            if data is None:
-                return
-                
-            current_price = float(data['close'].iloc[-1])
+            current_price = float(price) if price else float(data['close'].iloc[-1])
             
             # Calculate indicator signal
-            signal = self._calculate_indicator_signal(setup, data)
-            if not signal:
-                return
-                
+            result = self._calculate_indicator(strategy, data)
+            signal = result.signal if result is not None else None
+            signal_at = time.perf_counter()
+            
             # Check if signal changed (avoid duplicate trades)
-            last_signal = self.last_signals.get(strategy.id)
-            if last_signal == signal:
-                return  # Same signal, no action needed
-                
-            self.last_signals[strategy.id] = signal
+            is_new = bool(signal) and self.last_signals.get(strategy.id) != signal
+            
+            # Send the order before anything is published or persisted
+            order = None
+            if is_new:
+                if signal in ['buy', 'sell'] and not self.trading_bot.is_still_running(strategy):
+                    print(f"⏹️ Strategy {strategy.name} was stopped; ignoring its {signal.upper()} signal")
+                    return
+                self.last_signals[strategy.id] = signal
+                if signal in ['buy', 'sell']:
+                    if not price:
+                        # No LTP came with this check; price the order at a fresh quote
+                        current_price = self.trading_bot.get_live_prices([symbol]).get(symbol, current_price)
+                    order = self._place_order(strategy, signal, signal_at)
+            
+            self._publish_state(strategy, current_price, result)
+            if not is_new:
+                return
             
             # Log signal
-            BotLog.objects.create(
+            bot_log(
                 user=self.user,
                 strategy=strategy,
                 log_type='SIGNAL_GENERATED',
@@ -144,13 +214,12 @@ class RealTimeTradingBot:
             
             print(f"🎯 {signal.upper()} signal for {symbol} at ₹{current_price:.2f}")
             
-            # Execute trade if signal is buy or sell
-            if signal in ['buy', 'sell']:
-                self._execute_trade(strategy, signal, current_price)
+            if order is not None:
+                self._record_trade(strategy, signal, current_price, *order)
                 
         except Exception as e:
             print(f"❌ Error checking strategy {strategy.name}: {e}")
-            BotLog.objects.create(
+            bot_log(
                 user=self.user,
                 strategy=strategy,
                 log_type='ERROR',
@@ -158,130 +227,161 @@ class RealTimeTradingBot:
                 details={'error': str(e)}
             )
             
-    def _calculate_indicator_signal(self, setup, data):
-        """Calculate indicator signal based on setup"""
+    def _calculate_indicator(self, strategy, data):
+        """Calculate the strategy's indicator on the stream shared through the indicator engine,
+        feeding only candles not seen on earlier checks; returns an IndicatorResult or None"""
+        setup = strategy.setup
+        if data.attrs.get('synthetic'):
+            # Placeholder candles from the live price: no signal until real history is available
+            print(f"⏸️ No candle history for {setup.symbol} yet, not evaluating {strategy.name}")
+            return None
         try:
-            indicator = setup.indicator
-            
-            if indicator == 'RSI':
-                return rsi_signal(data['close'])
-            elif indicator == 'MACD':
-                return macd_signal(data['close'])
-            elif indicator == 'Moving Average':
-                return moving_average_signal(data['close'])
-            elif indicator == 'VWAP':
-                return vwap_signal(data['close'], data['volume'])
-            elif indicator == 'ADX':
-                return adx_signal(data['high'], data['low'], data['close'])
-            elif indicator == 'Supertrend':
-                return supertrend_signal(data['high'], data['low'], data['close'])
-            else:
-                print(f"❌ Unknown indicator: {indicator}")
-                return None
+            result = indicator_engine.stream_indicator(setup.symbol, setup.timeframe, setup.indicator, data)
+            if result is None:
+                print(f"❌ Unknown indicator: {setup.indicator}")
+            return result
                 
         except Exception as e:
             print(f"❌ Error calculating {setup.indicator}: {e}")
             return None
             
-    def _execute_trade(self, strategy, signal, current_price):
-        """Execute trade based on signal"""
-        try:
-            setup = strategy.setup
-            symbol = setup.symbol
-            
-            # Determine trade type
-            trade_type = 'BUY' if signal == 'buy' else 'SELL'
+    def _publish_state(self, strategy, current_price, result):
+        """Snapshot the result of an evaluation for the monitoring page"""
+        value = result.value if result is not None else None
+        strategy_state.publish(
+            strategy,
+            current_price,
+            round(value, 2) if value is not None else None,
+            result.signal if result is not None else None,
+        )
             
-            # Calculate total amount
-            total_amount = current_price * setup.quantity
+    def _place_order(self, strategy, signal, signal_at):
+        """Send a market order for a signal straight away; returns (response, error, latency)"""
+        setup = strategy.setup
+        trade_type = 'BUY' if signal == 'buy' else 'SELL'
+        sent_at = time.perf_counter()
+        order_response = None
+        error = None
+        try:
+            order_response = self.trading_bot.upstox.place_order(
+                symbol=setup.symbol,
+                quantity=setup.quantity,
+                side=trade_type.lower(),
+                order_type='MARKET'
+            )
+        except Exception as e:
+            error = e
+        latency = {
+            'signal_to_order_ms': round((sent_at - signal_at) * 1000, 2),
+            'order_round_trip_ms': round((time.perf_counter() - sent_at) * 1000, 2),
+        }
+        print(f"⏱️ {trade_type} {setup.symbol}: signal to order {latency['signal_to_order_ms']}ms, "
+              f"order round trip {latency['order_round_trip_ms']}ms")
+        return order_response, error, latency
+        
+    def _record_trade(self, strategy, signal, current_price, order_response, error, latency):
+        """Persist and log an order already sent by _place_order"""
+        setup = strategy.setup
+        symbol = setup.symbol
+        
+        # Determine trade type
+        trade_type = 'BUY' if signal == 'buy' else 'SELL'
+        
+        # Calculate total amount
+        total_amount = current_price * setup.quantity
+        
+        placed = error is None and order_response and 'data' in order_response
+        order_id = order_response['data'].get('order_id') if placed else None
+        try:
+            # Create trade record with its outcome
+            trade = Trade.objects.create(
+                user=self.user,
+                setup=setup,
+                symbol=symbol,
+                trade_type=trade_type,
+                quantity=setup.quantity,
+                price=current_price,
+                total_amount=total_amount,
+                status='EXECUTED' if placed else 'FAILED',
+                upstox_order_id=order_id,
+                executed_at=datetime.now() if placed else None
+            )
+        except Exception as e:
+            print(f"❌ Error recording trade: {e}")
+            bot_log(
+                user=self.user,
+                strategy=strategy,
+                log_type='TRADE_EXECUTED' if placed else 'TRADE_FAILED',
+                message=(
+                    f'⚠️ {trade_type} {setup.quantity} {symbol} placed (Order ID: {order_id}) but not recorded: {str(e)}'
+                    if placed else
+                    f'❌ Trade execution failed and could not be recorded: {str(e)}'
+                ),
+                details={
+                    'order_id': order_id,
+                    'symbol': symbol,
+                    'trade_type': trade_type,
+                    'quantity': setup.quantity,
+                    'price': current_price,
+                    'signal': signal,
+                    'response': order_response,
+                    'error': str(error) if error is not None else None,
+                    'record_error': str(e),
+                    'mode': 'real-time',
+                    **latency
+                }
+            )
+            return
             
-            # Log trade execution
-            BotLog.objects.create(
+        if placed:
+            bot_log(
                 user=self.user,
                 strategy=strategy,
                 log_type='TRADE_EXECUTED',
-                message=f'💰 Executing {trade_type} order for {setup.quantity} {symbol} at ₹{current_price:.2f}',
+                message=f'✅ {trade_type} {setup.quantity} {symbol} at ₹{current_price:.2f} - Order ID: {trade.upstox_order_id}',
                 details={
+                    'order_id': trade.upstox_order_id,
                     'symbol': symbol,
                     'trade_type': trade_type,
                     'quantity': setup.quantity,
                     'price': current_price,
                     'total_amount': total_amount,
                     'signal': signal,
-                    'mode': 'real-time'
+                    'mode': 'real-time',
+                    **latency
                 }
             )
             
-            print(f"💰 Executing {trade_type} order for {setup.quantity} {symbol} at ₹{current_price:.2f}")
-            
-            # Create trade record
-            trade = Trade.objects.create(
+            print(f"✅ Trade executed successfully - Order ID: {trade.upstox_order_id}")
+        elif error is not None:
+            print(f"❌ Error executing trade: {error}")
+            bot_log(
                 user=self.user,
-                setup=setup,
-                symbol=symbol,
-                trade_type=trade_type,
-                quantity=setup.quantity,
-                price=current_price,
-                total_amount=total_amount,
-                status='PENDING'
-            )
-            
-            # Execute with Upstox API
-            order_response = self.trading_bot.upstox.place_order(
-                symbol=symbol,
-                quantity=setup.quantity,
-                side=trade_type.lower(),
-                order_type='MARKET'
+                strategy=strategy,
+                log_type='TRADE_FAILED',
+                message=f'❌ Trade execution error: {str(error)}',
+                details={
+                    'symbol': symbol,
+                    'trade_type': trade_type,
+                    'error': str(error),
+                    **latency
+                }
             )
-            
-            if order_response and 'data' in order_response:
-                trade.upstox_order_id = order_response['data'].get('order_id')
-                trade.status = 'EXECUTED'
-                trade.executed_at = datetime.now()
-                trade.save()
-                
-                BotLog.objects.create(
-                    user=self.user,
-                    strategy=strategy,
-                    log_type='TRADE_EXECUTED',
-                    message=f'✅ Trade executed successfully - Order ID: {trade.upstox_order_id}',
-                    details={
-                        'order_id': trade.upstox_order_id,
-                        'symbol': symbol,
-                        'trade_type': trade_type,
-                        'quantity': setup.quantity,
-                        'price': current_price
-                    }
-                )
-                
-                print(f"✅ Trade executed successfully - Order ID: {trade.upstox_order_id}")
-            else:
-                trade.status = 'FAILED'
-                trade.save()
-                
-                BotLog.objects.create(
-                    user=self.user,
-                    strategy=strategy,
-                    log_type='TRADE_FAILED',
-                    message=f'❌ Trade execution failed',
-                    details={
-                        'symbol': symbol,
-                        'trade_type': trade_type,
-                        'response': order_response
-                    }
-                )
-                
-                print(f"❌ Trade execution failed")
-                
-        except Exception as e:
-            print(f"❌ Error executing trade: {e}")
-            BotLog.objects.create(
+        else:
+            bot_log(
                 user=self.user,
                 strategy=strategy,
                 log_type='TRADE_FAILED',
-                message=f'❌ Trade execution error: {str(e)}',
-                details={'error': str(e)}
+                message=f'❌ Trade execution failed',
+                details={
+                    'symbol': symbol,
+                    'trade_type': trade_type,
+                    'response': order_response,
+                    **latency
+                }
             )
+            
+            print(f"❌ Trade execution failed")
 
 def start_real_time_bot(user=None):
     """Start the real-time trading bot"""
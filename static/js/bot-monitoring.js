@@ -4,25 +4,60 @@ class BotMonitor {
         this.logContainer = document.getElementById('bot-logs-container');
         this.logCount = document.getElementById('log-count');
         this.lastLogId = 0;
+        this.logs = [];
+        this.maxLogs = 100;
         this.autoRefresh = true;
-        this.refreshInterval = 5000; // 5 seconds
+        this.refreshInterval = 5000; // 5 seconds, when the event stream is unavailable
+        this.eventSource = null;
+        this.pollTimer = null;
         
         this.init();
     }
     
     init() {
-        // Load initial logs
-        this.loadLogs();
+        // Load initial logs, then follow new ones as the server pushes them
+        this.loadLogs().then(() => this.connectStream());
         
-        // Set up auto-refresh
-        setInterval(() => {
+        // Add event listeners
+        this.addEventListeners();
+    }
+    
+    connectStream() {
+        if (!window.EventSource) {
+            this.startPolling();
+            return;
+        }
+        this.eventSource = new EventSource(`/api/stream/?since_id=${this.lastLogId}`);
+        this.eventSource.addEventListener('bot_log', (e) => {
+            this.mergeLogs([JSON.parse(e.data)], false);
+            this.updateLogCount(this.logs.length);
+        });
+        this.eventSource.addEventListener('strategy_state', (e) => {
+            document.dispatchEvent(new CustomEvent('strategy-state', { detail: JSON.parse(e.data) }));
+        });
+        this.eventSource.onerror = () => {
+            // Closed for good (e.g. the server cannot stream): fall back to polling
+            if (this.eventSource && this.eventSource.readyState === EventSource.CLOSED) {
+                this.eventSource = null;
+                this.startPolling();
+            }
+        };
+    }
+    
+    disconnectStream() {
+        if (this.eventSource) {
+            this.eventSource.close();
+            this.eventSource = null;
+        }
+    }
+    
+    startPolling() {
+        if (this.pollTimer) return;
+        this.pollTimer = setInterval(() => {
             if (this.autoRefresh) {
                 this.loadLogs();
             }
         }, this.refreshInterval);
-        
-        // Add event listeners
-        this.addEventListeners();
     }
     
     addEventListeners() {
@@ -32,8 +67,13 @@ class BotMonitor {
             autoRefreshToggle.addEventListener('change', (e) => {
                 this.autoRefresh = e.target.checked;
                 if (this.autoRefresh) {
+                    // Catch up on what was missed, then resume the stream
+                    if (!this.pollTimer) {
+                        this.loadLogs().then(() => this.connectStream());
+                    }
                     this.showNotification('Auto-refresh enabled', 'info');
                 } else {
+                    this.disconnectStream();
                     this.showNotification('Auto-refresh disabled', 'info');
                 }
             });
@@ -58,12 +98,17 @@ class BotMonitor {
     
     async loadLogs() {
         try {
-            const response = await fetch('/api/bot-logs/');
+            // After the first load only ask for logs newer than the newest one shown
+            const url = this.lastLogId ? `/api/bot-logs/?since_id=${this.lastLogId}` : '/api/bot-logs/';
+            const response = await fetch(url, { cache: 'no-cache' });
+            if (response.status === 304) {
+                return;
+            }
             const data = await response.json();
             
             if (data.success) {
-                this.updateLogsDisplay(data.logs);
-                this.updateLogCount(data.total_logs);
+                this.mergeLogs(data.logs, data.truncated);
+                this.updateLogCount(this.logs.length);
             } else {
                 console.error('Failed to load logs:', data.error);
             }
@@ -72,6 +117,15 @@ class BotMonitor {
         }
     }
     
+    mergeLogs(logs, truncated) {
+        const fresh = logs.filter(log => log.id > this.lastLogId);
+        // A truncated delta skipped some rows, so start the list over from it
+        this.logs = truncated ? fresh : fresh.concat(this.logs).slice(0, this.maxLogs);
+        if (fresh.length > 0 || this.logs.length === 0) {
+            this.updateLogsDisplay(this.logs);
+        }
+    }
+    
     updateLogsDisplay(logs) {
         if (!this.logContainer) return;
         
@@ -183,6 +237,8 @@ class BotMonitor {
             
             if (data.success) {
                 this.showNotification('All logs cleared successfully', 'success');
+                this.logs = [];
+                this.lastLogId = 0;
                 this.loadLogs(); // Reload logs
             } else {
                 this.showNotification('Failed to clear logs: ' + data.error, 'error');
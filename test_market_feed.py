@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+"""
+Test script for the market data feed client.
+
+Starts a local stand-in for the Upstox feed that replays recorded ticks as
+JSON frames, connects MarketFeedClient to it and checks that:
+1. The client subscribes to its instruments on connect
+2. Replayed ticks are decoded and published on the event bus
+3. Dropping an instrument sends an unsubscribe request
+"""
+
+import os
+import sys
+import json
+import time
+import base64
+import hashlib
+import socket
+import struct
+import threading
+import django
+
+# Setup Django
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'bot.settings')
+django.setup()
+
+from accounts.event_bus import EventBus
+from accounts.market_feed import MarketFeedClient, websocket
+
+WEBSOCKET_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+# Recorded ltpc updates, in the shape of the decoded Upstox FeedResponse
+RECORDED_TICKS = [
+    {'type': 'live_feed', 'feeds': {'NSE_EQ|INE002A01018': {'ltpc': {'ltp': 2950.5, 'ltt': '1729054800000', 'ltq': '10', 'cp': 2940.0}}}},
+    {'type': 'live_feed', 'feeds': {'NSE_EQ|INE467B01029': {'ltpc': {'ltp': 4102.0, 'ltt': '1729054801000', 'ltq': '3', 'cp': 4090.0}}}},
+    {'type': 'live_feed', 'feeds': {
+        'NSE_EQ|INE002A01018': {'ltpc': {'ltp': 2951.25, 'ltt': '1729054802000', 'ltq': '25', 'cp': 2940.0}},
+        'NSE_EQ|INE467B01029': {'ltpc': {'ltp': 4101.5, 'ltt': '1729054802000', 'ltq': '7', 'cp': 4090.0}},
+    }},
+]
+
+
+class ReplayFeedServer:
+    """Minimal websocket server that replays RECORDED_TICKS to each subscriber"""
+
+    def __init__(self):
+        self.sock = socket.socket()
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.listen(1)
+        self.url = f'ws://127.0.0.1:{self.sock.getsockname()[1]}/feed'
+        self.requests = []
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self):
+        conn, _ = self.sock.accept()
+        request = b''
+        while b'\r\n\r\n' not in request:
+            request += conn.recv(4096)
+        headers = dict(
+            line.split(': ', 1) for line in request.decode().split('\r\n')[1:] if ': ' in line
+        )
+        accept = base64.b64encode(
+            hashlib.sha1((headers['Sec-WebSocket-Key'] + WEBSOCKET_GUID).encode()).digest()
+        ).decode()
+        conn.sendall(
+            b'HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n'
+            + f'Sec-WebSocket-Accept: {accept}\r\n\r\n'.encode()
+        )
+
+        while True:
+            opcode, payload = self._read_frame(conn)
+            if opcode is None or opcode == 0x8:
+                break
+            if opcode not in (0x1, 0x2):
+                continue
+            message = json.loads(payload)
+            self.requests.append(message)
+            if message['method'] == 'sub':
+                keys = set(message['data']['instrumentKeys'])
+                for recorded in RECORDED_TICKS:
+                    feeds = {k: v for k, v in recorded['feeds'].items() if k in keys}
+                    if feeds:
+                        self._send_frame(conn, json.dumps(dict(recorded, feeds=feeds)).encode())
+        conn.close()
+
+    @staticmethod
+    def _recv_exact(conn, size):
+        data = b''
+        while len(data) < size:
+            chunk = conn.recv(size - len(data))
+            if not chunk:
+                return None
+            data += chunk
+        return data
+
+    def _read_frame(self, conn):
+        header = self._recv_exact(conn, 2)
+        if header is None:
+            return None, None
+        opcode, length = header[0] & 0x0F, header[1] & 0x7F
+        if length == 126:
+            length = struct.unpack('>H', self._recv_exact(conn, 2))[0]
+        elif length == 127:
+            length = struct.unpack('>Q', self._recv_exact(conn, 8))[0]
+        mask = self._recv_exact(conn, 4)
+        payload = self._recv_exact(conn, length) or b''
+        return opcode, bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+
+    @staticmethod
+    def _send_frame(conn, payload):
+        header = bytes([0x81])
+        if len(payload) < 126:
+            header += bytes([len(payload)])
+        else:
+            header += bytes([126]) + struct.pack('>H', len(payload))
+        conn.sendall(header + payload)
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def test_market_feed():
+    """Replay recorded ticks through MarketFeedClient and check the bus output"""
+
+    print("🧪 Testing Market Feed Client")
+    print("=" * 50)
+
+    if websocket is None:
+        print("❌ websocket-client is not installed")
+        return False
+
+    server = ReplayFeedServer()
+    bus = EventBus()
+    ticks = []
+    bus.subscribe('tick', ticks.append)
+
+    client = MarketFeedClient(None, bus=bus, url=server.url, follow_strategies=False)
+    client.sync_subscriptions({'NSE_EQ|INE002A01018', 'NSE_EQ|INE467B01029'})
+    client.start()
+
+    # Test 1: subscription on connect
+    print("\n1. Subscribing on connect...")
+    if not wait_for(lambda: server.requests):
+        print("❌ Client never subscribed")
+        return False
+    subscribed = set(server.requests[0]['data']['instrumentKeys'])
+    print(f"✅ Subscribed to {sorted(subscribed)} in mode {server.requests[0]['data']['mode']}")
+
+    # Test 2: replayed ticks reach the bus
+    print("\n2. Receiving replayed ticks...")
+    expected = sum(len(recorded['feeds']) for recorded in RECORDED_TICKS)
+    if not wait_for(lambda: len(ticks) >= expected):
+        print(f"❌ Expected {expected} ticks, got {len(ticks)}")
+        return False
+    for tick in ticks:
+        print(f"   {tick['instrument_key']}: ₹{tick['ltp']} x {tick['ltq']} at {tick['timestamp']}")
+    last = ticks[-1]
+    assert last['instrument_key'] == 'NSE_EQ|INE467B01029' and last['ltp'] == 4101.5 and last['ltq'] == 7
+    print(f"✅ {len(ticks)} ticks published on the bus")
+
+    # Test 3: unsubscribe when an instrument is no longer needed
+    print("\n3. Dropping an instrument...")
+    client.sync_subscriptions({'NSE_EQ|INE002A01018'})
+    if not wait_for(lambda: server.requests[-1]['method'] == 'unsub'):
+        print("❌ No unsubscribe request sent")
+        return False
+    print(f"✅ Unsubscribed from {server.requests[-1]['data']['instrumentKeys']}")
+
+    client.stop()
+    print("\n🎉 Market feed test completed")
+    return True
+
+
+if __name__ == "__main__":
+    sys.exit(0 if test_market_feed() else 1)